@@ -1,8 +1,11 @@
 import logging
 
 from flask import Flask
+from sqlakeyset import InvalidPage
+from werkzeug.exceptions import UnprocessableEntity
 
 from app.extensions import api, db, jwt, migrate
+from app.json_provider import init_json_provider
 from app.middleware.request_logger import RequestLogger
 from config import config
 
@@ -31,7 +34,7 @@ def _setup_sentry(dsn, env="production"):
     )
 
 
-def _configure_logging(env):
+def _configure_logging(env, settings):
     logging.basicConfig(
         level=logging.INFO,
         format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
@@ -39,7 +42,7 @@ def _configure_logging(env):
     )
 
     if env in ("preview", "production"):
-        sentry_dsn = getattr(config[env], "SENTRY_DSN", None)
+        sentry_dsn = getattr(settings, "SENTRY_DSN", None)
         if not sentry_dsn:
             logging.warning("Could not setup sentry. SENTRY_DSN not found.")
             return
@@ -48,12 +51,26 @@ def _configure_logging(env):
         logging.info(f"Sentry initialized for {env}")
 
 
+def _invalid_page(error):
+    # a cursor marker that does not fit the query's ordering, answered like the
+    # cursor validation errors of PaginationArgs
+    error = UnprocessableEntity()
+    error.data = {"messages": {"query": {"cursor": ["Invalid cursor"]}}}
+    return api.handle_http_exception(error)
+
+
 def create_app(env="development", **kwargs):
+    settings = config[env](**kwargs)
     # Use app.logger for logging
-    _configure_logging(env)
+    _configure_logging(env, settings)
 
     app = Flask(__name__)
-    app.config.from_object(config[env](**kwargs))
+    app.config.from_object(settings)
+
+    from app.admin import init_admins
+
+    init_admins(app)
+    init_json_provider(app)
     app.url_map.strict_slashes = False
 
     if app.config.get("LOG_REQUESTS"):
@@ -64,6 +81,37 @@ def create_app(env="development", **kwargs):
     migrate.init_app(app, db)
     jwt.init_app(app)
     api.init_app(app)
+    app.register_error_handler(InvalidPage, _invalid_page)
+
+    if app.config.get("ADMISSION_CONTROL"):
+        from app.middleware.admission import AdmissionControl
+
+        AdmissionControl(app)
+
+    if app.config.get("SLOW_QUERY_THRESHOLD_MS") is not None:
+        from app.middleware.slow_query_logger import SlowQueryLogger
+
+        SlowQueryLogger(app)
+
+    if app.config.get("REQUEST_TIMEOUT") is not None:
+        from app.middleware.timeouts import RequestTimeouts
+
+        RequestTimeouts(app)
+
+    if app.config.get("SEARCH_ANALYTICS"):
+        from app.search_analytics import SearchAnalytics
+
+        SearchAnalytics(app)
+
+    if app.config.get("CATALOG_CACHE"):
+        from app.cache import CatalogCache
+
+        CatalogCache(app)
+
+    if app.config.get("COMPRESS_RESPONSES"):
+        from app.middleware.compression import Compression
+
+        Compression(app)
 
     # register blueprints
     from app.routes.auth import bp as auth_bp
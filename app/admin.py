@@ -0,0 +1,45 @@
+import functools
+
+from email_validator import EmailNotValidError
+from flask import current_app
+from flask_jwt_extended import get_jwt_identity, jwt_required
+from flask_smorest import abort
+
+from app import db
+from app.models import User
+
+
+def init_admins(app):
+    """Normalize ADMIN_EMAILS once, failing at startup on an invalid entry."""
+    admins = set()
+    for email in app.config.get("ADMIN_EMAILS", ()):
+        try:
+            admins.add(User._normalize_email(email.strip()))
+        except EmailNotValidError as ex:
+            raise ValueError(f"Invalid email in ADMIN_EMAILS: {email!r}") from ex
+
+    # Store on app for easy access (Flask extension pattern)
+    app.extensions["admin_emails"] = frozenset(admins)
+
+
+def is_admin(user):
+    """Whether the user's email is in ADMIN_EMAILS, compared normalized."""
+    return user.email_normalized in current_app.extensions["admin_emails"]
+
+
+def admin_required(view):
+    """jwt_required() for users listed in ADMIN_EMAILS, others get 403.
+
+    There are no roles yet, so operational endpoints are limited to an allow-list.
+    Place above the flask-smorest decorators, like jwt_required().
+    """
+
+    @functools.wraps(view)
+    @jwt_required()
+    def wrapper(*args, **kwargs):
+        user = db.session.get(User, int(get_jwt_identity()))
+        if user is None or not is_admin(user):
+            abort(403, message="Admin access required")
+        return view(*args, **kwargs)
+
+    return wrapper
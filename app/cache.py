@@ -0,0 +1,229 @@
+import os
+import select
+import threading
+import time
+from collections import OrderedDict
+from itertools import chain
+
+from flask import Flask, current_app
+from sqlalchemy import event, inspect
+
+from app import db
+from app.models import Category, Product, Subcategory
+
+
+class LocalCache:
+    """Thread-safe LRU cache with a TTL, local to one worker process."""
+
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # bumped by every eviction, see set()
+        self.generation = 0
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, generation):
+        """Store `value`, unless something was evicted since `generation` was read.
+
+        Read the generation before loading the value. An eviction in between means the
+        loaded value may predate the write that caused it, so it is not stored.
+        """
+        with self._lock:
+            if generation != self.generation:
+                return
+
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def evict(self, key):
+        with self._lock:
+            self.generation += 1
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+
+class CatalogCache:
+    """Per-worker cache of catalog entities, invalidated across workers by Postgres.
+
+    Committed writes to cached models send a NOTIFY with "<table>:<id>" on
+    CATALOG_CACHE_CHANNEL. Every worker listens on that channel from a background
+    thread with its own connection and evicts the entry. CATALOG_CACHE_TTL bounds
+    staleness should a notification ever get lost.
+    """
+
+    MODELS = {model.__tablename__: model for model in (Category, Product, Subcategory)}
+    _RECONNECT_DELAY = 5  # seconds
+    _POLL_TIMEOUT = 5  # seconds, how often the listener checks its connection
+
+    def __init__(self, app: Flask):
+        self.app = app
+        self.channel = app.config.get("CATALOG_CACHE_CHANNEL", "catalog_changes")
+        self.cache = LocalCache(
+            ttl=app.config.get("CATALOG_CACHE_TTL", 60),
+            max_entries=app.config.get("CATALOG_CACHE_MAX_ENTRIES", 10000),
+        )
+
+        # set while the listener is subscribed
+        self.listening = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+        if not event.contains(db.session, "after_flush", _notify_changes):
+            event.listen(db.session, "after_flush", _notify_changes)
+            event.listen(db.session, "after_commit", _evict_committed)
+            event.listen(db.session, "after_rollback", _discard_changes)
+
+        # Store instance on app for easy access (Flask extension pattern)
+        app.extensions["catalog_cache"] = self
+
+    def get(self, model, id):
+        """Column values of the `model` row with `id`, from the cache or the database.
+
+        Returns a dict the model's output schema can dump, or aborts with 404.
+        """
+        self._ensure_listener()
+
+        key = (model.__tablename__, id)
+        if (values := self.cache.get(key)) is not None:
+            return values
+
+        generation = self.cache.generation
+        entity = model.query.get_or_404(id)
+        # generated columns such as search_vector are internal, and large
+        values = {
+            attr.key: getattr(entity, attr.key)
+            for attr in inspect(model).column_attrs
+            if attr.columns[0].computed is None
+        }
+        self.cache.set(key, values, generation)
+        return values
+
+    def _ensure_listener(self):
+        # Start lazily, and again in a forked worker, since threads do not survive fork
+        if self._thread is not None and self._pid == os.getpid():
+            return
+
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._listen, name="catalog-cache-listener", daemon=True
+            )
+            self._thread.start()
+
+    def _listen(self):
+        while True:
+            try:
+                self._listen_once()
+            except Exception:
+                self.app.logger.exception("Catalog cache listener failed, reconnecting")
+
+            # notifications may have been missed while disconnected
+            self.cache.clear()
+            time.sleep(self._RECONNECT_DELAY)
+
+    def _listen_once(self):
+        with self.app.app_context():
+            # detached, so the long-lived connection does not hold a pool slot
+            connection = db.engine.raw_connection()
+            dbapi_connection = connection.driver_connection
+            connection.detach()
+
+        try:
+            dbapi_connection.autocommit = True
+            cursor = dbapi_connection.cursor()
+            cursor.execute(f'LISTEN "{self.channel}"')
+            # entries cached before LISTEN could have missed their notification
+            self.cache.clear()
+            self.listening.set()
+
+            while True:
+                readable, _, _ = select.select(
+                    [dbapi_connection], [], [], self._POLL_TIMEOUT
+                )
+                if not readable:
+                    # a quiet channel could also be a dead connection, check it
+                    cursor.execute("SELECT 1")
+                dbapi_connection.poll()
+                while dbapi_connection.notifies:
+                    notify = dbapi_connection.notifies.pop(0)
+                    self._evict_payload(notify.payload)
+        finally:
+            self.listening.clear()
+            connection.close()
+
+    def _evict_payload(self, payload):
+        entity_type, _, id = payload.partition(":")
+        if entity_type in self.MODELS and id.isdigit():
+            self.cache.evict((entity_type, int(id)))
+
+
+def get_cached_or_404(model, id):
+    """model.query.get_or_404, served from the catalog cache when it is enabled."""
+    catalog_cache = current_app.extensions.get("catalog_cache")
+    if catalog_cache is None:
+        return model.query.get_or_404(id)
+    return catalog_cache.get(model, id)
+
+
+def _changed_keys(session):
+    return {
+        (obj.__tablename__, obj.id)
+        for obj in chain(session.dirty, session.deleted)
+        if obj.__tablename__ in CatalogCache.MODELS
+    }
+
+
+def _notify_changes(session, flush_context):
+    # new, dirty and deleted still hold the pre-flush state here
+    keys = _changed_keys(session)
+    if not keys:
+        return
+
+    catalog_cache = current_app.extensions.get("catalog_cache")
+    if catalog_cache is None:
+        return
+
+    # delivered by Postgres on commit, and dropped on rollback
+    connection = session.connection()
+    for entity_type, id in keys:
+        connection.exec_driver_sql(
+            "SELECT pg_notify(%s, %s)", (catalog_cache.channel, f"{entity_type}:{id}")
+        )
+    session.info.setdefault("catalog_cache_keys", set()).update(keys)
+
+
+def _evict_committed(session):
+    # the local listener evicts as well, this covers reads right after the commit
+    keys = session.info.pop("catalog_cache_keys", ())
+    if keys and (catalog_cache := current_app.extensions.get("catalog_cache")):
+        for key in keys:
+            catalog_cache.cache.evict(key)
+
+
+def _discard_changes(session):
+    session.info.pop("catalog_cache_keys", None)
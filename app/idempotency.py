@@ -0,0 +1,133 @@
+import functools
+import hashlib
+
+from flask import Response, current_app, make_response, request
+from flask_jwt_extended import get_jwt_identity
+from flask_smorest import abort
+from sqlalchemy import delete, func, update
+from sqlalchemy.dialects.postgresql import insert
+
+from app import db
+from app.middleware.timeouts import past_deadline
+from app.models import IdempotencyKey
+
+HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+
+def _request_hash():
+    digest = hashlib.sha256(f"{request.method} {request.path}\n".encode("utf-8"))
+    digest.update(request.get_data())
+    return digest.hexdigest()
+
+
+def _claim(identity, key, request_hash):
+    """Insert a pending row for the key, or take over one whose claim expired.
+
+    Returns the time of the claim, None if the key is already taken.
+    """
+    ttl = current_app.config["IDEMPOTENCY_KEY_TTL"]
+    claim_timeout = current_app.config["IDEMPOTENCY_CLAIM_TIMEOUT"]
+    db.session.execute(
+        delete(IdempotencyKey).where(IdempotencyKey.created_at < func.now() - ttl)
+    )
+    stmt = insert(IdempotencyKey).values(
+        user_identity=identity, key=key, request_hash=request_hash
+    )
+    claimed_at = db.session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[IdempotencyKey.user_identity, IdempotencyKey.key],
+            set_={"request_hash": stmt.excluded.request_hash, "created_at": func.now()},
+            # still pending after the claim timeout, the request died without
+            # releasing the key
+            where=IdempotencyKey.status_code.is_(None)
+            & (IdempotencyKey.created_at < func.now() - claim_timeout),
+        ).returning(IdempotencyKey.created_at)
+    ).scalar()
+    # commit now, so concurrent retries see the pending row
+    db.session.commit()
+    return claimed_at
+
+
+def _own_claim(identity, key, claimed_at):
+    # the claim is gone if it expired and another request took the key over
+    return (
+        (IdempotencyKey.user_identity == identity)
+        & (IdempotencyKey.key == key)
+        & (IdempotencyKey.created_at == claimed_at)
+    )
+
+
+def _release(identity, key, claimed_at):
+    # also when the request timed out, or the key stays pending for the claim timeout
+    with past_deadline():
+        db.session.execute(
+            delete(IdempotencyKey).where(_own_claim(identity, key, claimed_at))
+        )
+        db.session.commit()
+
+
+def _replay(stored, request_hash):
+    if stored.request_hash != request_hash:
+        abort(422, message="Idempotency-Key was already used for a different request")
+    if stored.status_code is None:
+        abort(409, message="Request with this Idempotency-Key is still in progress")
+
+    response = Response(
+        stored.response_body, status=stored.status_code, mimetype="application/json"
+    )
+    response.headers[REPLAYED_HEADER] = "true"
+    return response
+
+
+def idempotent(view):
+    """Answer retries of a write carrying an Idempotency-Key header from storage.
+
+    The first successful response is stored per user and key for
+    IDEMPOTENCY_KEY_TTL, and retries get it back without running the view again.
+    Error responses are not stored, so a failed request can be retried with the same
+    key. A key still pending after IDEMPOTENCY_CLAIM_TIMEOUT belongs to a request that
+    died, and a retry takes it over. Place below @jwt_required() and above the
+    flask-smorest decorators, so the user is known and the serialized response can be
+    stored.
+    """
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None:
+            return view(*args, **kwargs)
+        if not 0 < len(key) <= IdempotencyKey.key.type.length:
+            abort(422, message=f"{HEADER} must be 1 to 255 characters")
+
+        identity = get_jwt_identity()
+        request_hash = _request_hash()
+        while (claimed_at := _claim(identity, key, request_hash)) is None:
+            # taken: replay it, or claim again if it was released in the meantime
+            if stored := db.session.get(IdempotencyKey, (identity, key)):
+                return _replay(stored, request_hash)
+
+        try:
+            response = make_response(view(*args, **kwargs))
+        except BaseException:
+            db.session.rollback()
+            _release(identity, key, claimed_at)
+            raise
+
+        if response.status_code < 400:
+            # the write is committed, so store the response even past the deadline
+            with past_deadline():
+                db.session.execute(
+                    update(IdempotencyKey)
+                    .where(_own_claim(identity, key, claimed_at))
+                    .values(
+                        status_code=response.status_code,
+                        response_body=response.get_data(as_text=True),
+                    )
+                )
+                db.session.commit()
+        else:
+            _release(identity, key, claimed_at)
+        return response
+
+    return wrapper
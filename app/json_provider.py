@@ -0,0 +1,50 @@
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider encoding with orjson, several times faster than the stdlib encoder.
+
+    Datetimes are encoded natively as RFC 3339. Types orjson does not know go through
+    DefaultJSONProvider.default, and calls with json.dumps / json.loads arguments, like
+    the indented output in debug mode, fall back to the stdlib provider.
+    """
+
+    def _dumps(self, obj, option=0):
+        option |= orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option)
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return self._dumps(obj).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+
+        # bytes straight into the response, without decoding to str and back
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            self._dumps(obj, orjson.OPT_APPEND_NEWLINE), mimetype=self.mimetype
+        )
+
+
+def init_json_provider(app: Flask):
+    """Use OrjsonProvider if orjson is installed, else keep Flask's stdlib provider."""
+    if orjson is None:
+        app.logger.info("orjson not installed, using the stdlib JSON provider")
+        return
+    app.json = OrjsonProvider(app)
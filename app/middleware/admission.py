@@ -0,0 +1,113 @@
+import threading
+from collections import Counter
+
+from flask import Flask, g, request
+from marshmallow import fields
+from werkzeug.exceptions import ServiceUnavailable
+
+from app import db
+from app.extensions import api
+
+
+class AdmissionControl:
+    """Sheds low priority requests fast while the worker is saturated.
+
+    The worker is saturated while ADMISSION_POOL_THRESHOLD of the connection pool is
+    checked out, or ADMISSION_MAX_IN_FLIGHT requests are in flight. Requests to the
+    endpoints in ADMISSION_LOW_PRIORITY, and full collection streams (?all=true), then
+    answer 503 with Retry-After instead of queueing for a connection for up to
+    pool_timeout. Everything else, like auth and catalog reads, is still admitted, and
+    gets the connections the shed requests would have waited for.
+
+    Counts are per worker, like the pool itself, and shed requests are counted by
+    endpoint and reason for the metrics endpoint.
+    """
+
+    def __init__(self, app: Flask):
+        self.app = app
+        self.pool_threshold = app.config.get("ADMISSION_POOL_THRESHOLD", 0.8)
+        self.max_in_flight = app.config.get("ADMISSION_MAX_IN_FLIGHT", 32)
+        self.low_priority = frozenset(app.config.get("ADMISSION_LOW_PRIORITY", ()))
+        self.retry_after = app.config.get("ADMISSION_RETRY_AFTER", 2)
+
+        # the pool does not expose its limit, so take it from the engine options,
+        # defaulting like QueuePool
+        engine_options = app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {})
+        max_overflow = engine_options.get("max_overflow", 10)
+        # a negative max_overflow lets the pool grow without limit
+        self.pool_capacity = (
+            engine_options.get("pool_size", 5) + max_overflow
+            if max_overflow >= 0
+            else None
+        )
+
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.shed = Counter()
+
+        app.before_request(self._before_request)
+        app.teardown_request(self._teardown_request)
+
+        # Store instance on app for easy access (Flask extension pattern)
+        app.extensions["admission_control"] = self
+
+    def _pool_usage(self):
+        """(checked out, capacity) of the engine's pool, capacity None if unbounded."""
+        pool = db.engine.pool
+        # only QueuePool bounds connections, NullPool and the like have no capacity
+        if not hasattr(pool, "checkedout"):
+            return None, None
+        return pool.checkedout(), self.pool_capacity
+
+    def _saturation(self):
+        """Why the worker is saturated, None if it is not."""
+        checked_out, capacity = self._pool_usage()
+        if capacity and checked_out >= capacity * self.pool_threshold:
+            return "pool"
+        if self.max_in_flight is not None and self.in_flight >= self.max_in_flight:
+            return "in_flight"
+        return None
+
+    def _is_low_priority(self):
+        if request.endpoint in self.low_priority:
+            return True
+        return request.args.get("all") in fields.Boolean.truthy
+
+    def _before_request(self):
+        if self._is_low_priority():
+            reason = self._saturation()
+            if reason is not None:
+                with self._lock:
+                    self.shed[request.endpoint, reason] += 1
+                error = ServiceUnavailable()
+                error.data = {
+                    "message": "Server is busy, try again later",
+                    "headers": {"Retry-After": str(self.retry_after)},
+                }
+                return api.handle_http_exception(error)
+
+        with self._lock:
+            self.in_flight += 1
+        g.admitted = True
+
+    def _teardown_request(self, exc):
+        # after a streamed body too, stream_with_context keeps the request until then
+        if g.pop("admitted", False):
+            with self._lock:
+                self.in_flight -= 1
+
+    def metrics(self):
+        checked_out, capacity = self._pool_usage()
+        with self._lock:
+            shed = [
+                {"endpoint": endpoint, "reason": reason, "count": count}
+                for (endpoint, reason), count in sorted(self.shed.items())
+            ]
+            return {
+                "in_flight": self.in_flight,
+                "pool_checked_out": checked_out,
+                "pool_capacity": capacity,
+                "saturated": self._saturation() is not None,
+                "shed_total": sum(self.shed.values()),
+                "shed": shed,
+            }
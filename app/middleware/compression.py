@@ -0,0 +1,119 @@
+import hashlib
+import zlib
+
+from flask import Flask, Response, request
+from werkzeug.wsgi import ClosingIterator
+
+from app.cache import LocalCache
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class Compression:
+    """Compresses responses with brotli or gzip, as negotiated with Accept-Encoding.
+
+    Bodies under COMPRESS_MIN_SIZE bytes are sent as they are, compressing them costs
+    more than it saves. Streamed responses are compressed chunk by chunk while they
+    are generated. Compressed bodies are kept in a small per-worker LRU keyed by a
+    digest of the uncompressed body, so a payload served repeatedly, like a cached
+    catalog entity, is only compressed once.
+
+    brotli is optional, without the package only gzip is offered.
+    """
+
+    COMPRESSIBLE_TYPES = ("application/json", "text/")
+
+    def __init__(self, app: Flask):
+        self.app = app
+        self.min_size = app.config.get("COMPRESS_MIN_SIZE", 1024)
+        self.gzip_level = app.config.get("COMPRESS_GZIP_LEVEL", 6)
+        self.brotli_quality = app.config.get("COMPRESS_BROTLI_QUALITY", 4)
+        # larger bodies are compressed on every request rather than cached
+        self.cache_max_size = app.config.get("COMPRESS_CACHE_MAX_SIZE", 256 * 1024)
+        self.cache = LocalCache(
+            ttl=app.config.get("COMPRESS_CACHE_TTL", 300),
+            max_entries=app.config.get("COMPRESS_CACHE_MAX_ENTRIES", 512),
+        )
+
+        # in order of preference when the client accepts both with the same quality
+        self.encodings = ("br", "gzip") if brotli is not None else ("gzip",)
+
+        app.after_request(self._after_request)
+
+        # Store instance on app for easy access (Flask extension pattern)
+        app.extensions["compression"] = self
+
+    def _after_request(self, response: Response):
+        if not self._is_compressible(response):
+            return response
+
+        # the body depends on Accept-Encoding from here on, compressed or not
+        response.vary.add("Accept-Encoding")
+
+        encoding = request.accept_encodings.best_match(self.encodings)
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            chunks = response.response
+            # closing the response closes the wrapped generator too, like an
+            # uncompressed stream would be
+            response.response = ClosingIterator(
+                self._compress_stream(response.iter_encoded(), encoding),
+                getattr(chunks, "close", None),
+            )
+            response.headers.pop("Content-Length", None)
+        else:
+            body = response.get_data()
+            if len(body) < self.min_size:
+                return response
+            response.set_data(self._compress_body(body, encoding))
+
+        response.content_encoding = encoding
+        return response
+
+    def _is_compressible(self, response: Response):
+        return (
+            request.method != "HEAD"
+            and 200 <= response.status_code < 300
+            and response.status_code != 204
+            and not response.direct_passthrough
+            and "Content-Encoding" not in response.headers
+            and "no-transform" not in response.headers.get("Cache-Control", "")
+            and response.mimetype.startswith(self.COMPRESSIBLE_TYPES)
+        )
+
+    def _compress_body(self, body, encoding):
+        if len(body) > self.cache_max_size:
+            return self.compress(body, encoding)
+
+        key = (hashlib.blake2b(body, digest_size=16).digest(), encoding)
+        if (compressed := self.cache.get(key)) is not None:
+            return compressed
+
+        generation = self.cache.generation
+        compressed = self.compress(body, encoding)
+        self.cache.set(key, compressed, generation)
+        return compressed
+
+    def compress(self, body, encoding):
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return zlib.compress(body, self.gzip_level, wbits=31)
+
+    def _compress_stream(self, chunks, encoding):
+        if encoding == "br":
+            compressor = brotli.Compressor(quality=self.brotli_quality)
+            compress, finish = compressor.process, compressor.finish
+        else:
+            compressor = zlib.compressobj(self.gzip_level, zlib.DEFLATED, 31)
+            compress, finish = compressor.compress, compressor.flush
+
+        for chunk in chunks:
+            # the compressor buffers small chunks, only yield once it emits output
+            if compressed := compress(chunk):
+                yield compressed
+        yield finish()
@@ -1,5 +1,7 @@
 import json
+import re
 import time
+import uuid
 from urllib.parse import parse_qs, urlparse
 
 from flask import Flask, Request, Response, g, request
@@ -15,9 +17,13 @@ class RequestLogger:
         # Store instance on app for easy access (Flask extension pattern)
         app.extensions["request_logger"] = self
 
+    _REQUEST_ID_HEADER = "X-Request-ID"
+    _MAX_REQUEST_ID_LENGTH = 64
+
     def _before_request(self):
         g.log_start_time = time.perf_counter()
         g.log_emitted = False
+        g.request_id = RequestLogger._request_id()
 
     def _after_request(self, response: Response):
         duration_ms = RequestLogger._duration_ms()
@@ -34,6 +40,9 @@ class RequestLogger:
             "http.status_code": response.status_code,
             "http.response.content_type": response.content_type,
             "http.duration_ms": duration_ms,
+            "http.request_id": g.get("request_id"),
+            # logged separately by SlowQueryLogger, with the same http.request_id
+            "db.slow_queries": g.get("slow_queries", 0),
         }
 
         if response.status_code >= 400:
@@ -63,6 +72,8 @@ class RequestLogger:
                 "http.request.body": DataScrubber.scrub_body(request),
                 "http.status_code": 500,
                 "http.duration_ms": duration_ms,
+                "http.request_id": g.get("request_id"),
+                "db.slow_queries": g.get("slow_queries", 0),
                 "error.type": type(exc).__name__,
                 "error.message": str(exc),
             },
@@ -73,6 +84,14 @@ class RequestLogger:
     def _duration_ms():
         return round((time.perf_counter() - g.log_start_time) * 1000, 2)
 
+    @staticmethod
+    def _request_id():
+        # keep the id of a proxy or client, so their logs can be matched with ours
+        request_id = request.headers.get(RequestLogger._REQUEST_ID_HEADER, "")
+        if 0 < len(request_id) <= RequestLogger._MAX_REQUEST_ID_LENGTH:
+            return request_id
+        return uuid.uuid4().hex
+
 
 class DataScrubber:
     # Fields whose values are replaced with _DATA_REPLACEMENT
@@ -93,6 +112,8 @@ class DataScrubber:
     )
     _DATA_REPLACEMENT = "[redacted]"
     _MAX_BYTES = 4096
+    # SQLAlchemy's suffix for repeated parameter names, as in "name_1"
+    _PARAMETER_SUFFIX = re.compile(r"_\d+$")
 
     @staticmethod
     def scrub_query_string(req: Request):
@@ -149,6 +170,49 @@ class DataScrubber:
 
         return result
 
+    @staticmethod
+    def scrub_parameters(parameters):
+        """JSON of the parameters of an SQL statement, sensitive values redacted.
+
+        SQLAlchemy names parameters after their column, with a numeric suffix when
+        a name repeats. A name is sensitive when it or one of its "_" separated words
+        is in SENSITIVE_KEYS, so password_hash and refresh_token_1 are redacted.
+        Positional parameters have no names, their values are all redacted.
+        """
+        if isinstance(parameters, (list, tuple)) and all(
+            isinstance(p, dict) for p in parameters
+        ):
+            # executemany
+            scrubbed = [DataScrubber._scrub_parameters(p) for p in parameters]
+        else:
+            scrubbed = DataScrubber._scrub_parameters(parameters)
+
+        result = json.dumps(scrubbed, default=str)
+        if len(result) > DataScrubber._MAX_BYTES:
+            result = result[: DataScrubber._MAX_BYTES] + " … [truncated]"
+        return result
+
+    @staticmethod
+    def _scrub_parameters(parameters):
+        if not parameters:
+            return parameters
+        if not isinstance(parameters, dict):
+            return [DataScrubber._DATA_REPLACEMENT] * len(parameters)
+
+        return {
+            k: DataScrubber._DATA_REPLACEMENT
+            if DataScrubber._is_sensitive_parameter(k)
+            else v
+            for k, v in parameters.items()
+        }
+
+    @staticmethod
+    def _is_sensitive_parameter(name):
+        name = DataScrubber._PARAMETER_SUFFIX.sub("", name.lower())
+        return name in DataScrubber.SENSITIVE_KEYS or any(
+            word in DataScrubber.SENSITIVE_KEYS for word in name.split("_")
+        )
+
     @staticmethod
     def _scrub_json(data, _depth=1):
         """Recursively redact sensitive keys in a parsed JSON object."""
@@ -0,0 +1,170 @@
+import os
+import random
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+from flask import Flask, g, has_request_context, request
+from sqlalchemy import event
+
+from app import db
+from app.middleware.request_logger import DataScrubber
+
+
+class SlowQueryLogger:
+    """Logs SQL statements slower than SLOW_QUERY_THRESHOLD_MS.
+
+    Each record carries the statement, its scrubbed parameters, the duration and the
+    route and http.request_id of the request it ran in, which RequestLogger logs as
+    well, together with the number of slow statements of the request.
+
+    A share of slow SELECTs, SLOW_QUERY_EXPLAIN_RATE, is run again with EXPLAIN
+    ANALYZE on a separate connection, in a background thread so the request does not
+    wait for it, and the plan is logged with the same http.request_id. At most
+    SLOW_QUERY_EXPLAIN_MAX_PENDING of them wait for the thread, the others are dropped,
+    so a burst of slow queries cannot pile up EXPLAINs of an overloaded database.
+    """
+
+    _MAX_STATEMENT_LENGTH = 2000
+    _WHITESPACE = re.compile(r"\s+")
+    # statements that are safe to run a second time, and cannot wait on locks the
+    # request holds. Not WITH, its queries can modify data.
+    _EXPLAINABLE = re.compile(
+        r"^\s*SELECT\b(?!.*\bFOR\s+(NO\s+KEY\s+|KEY\s+)?(UPDATE|SHARE)\b)", re.I | re.S
+    )
+
+    def __init__(self, app: Flask):
+        self.app = app
+        self.threshold_ms = app.config.get("SLOW_QUERY_THRESHOLD_MS", 500)
+        self.explain_rate = app.config.get("SLOW_QUERY_EXPLAIN_RATE", 0.0)
+        self.explain_timeout_ms = app.config.get("SLOW_QUERY_EXPLAIN_TIMEOUT_MS", 5000)
+        self.explain_max_pending = app.config.get("SLOW_QUERY_EXPLAIN_MAX_PENDING", 10)
+
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self._explains_pending = 0
+        self.explains_dropped = 0
+
+        with app.app_context():
+            event.listen(db.engine, "before_cursor_execute", self._before_execute)
+            event.listen(db.engine, "after_cursor_execute", self._after_execute)
+        app.before_request(self._before_request)
+
+        # Store instance on app for easy access (Flask extension pattern)
+        app.extensions["slow_query_logger"] = self
+
+    @staticmethod
+    def normalize_statement(statement):
+        """Statement on a single line, cut at _MAX_STATEMENT_LENGTH characters."""
+        normalized = SlowQueryLogger._WHITESPACE.sub(" ", statement).strip()
+        return normalized[: SlowQueryLogger._MAX_STATEMENT_LENGTH]
+
+    def _before_request(self):
+        g.slow_queries = 0
+
+    def _before_execute(
+        self, conn, cursor, statement, parameters, context, executemany
+    ):
+        if context is not None:
+            context._slow_query_started_at = perf_counter()
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started_at = getattr(context, "_slow_query_started_at", None)
+        if started_at is None or conn.info.get("slow_query_explain"):
+            return
+
+        duration_ms = round((perf_counter() - started_at) * 1000, 2)
+        if duration_ms < self.threshold_ms:
+            return
+
+        request_extra = {}
+        if has_request_context():
+            g.slow_queries = g.get("slow_queries", 0) + 1
+            request_extra = {
+                "http.method": request.method,
+                "http.route": str(request.url_rule or request.path),
+                "http.request_id": g.get("request_id"),
+            }
+
+        normalized = self.normalize_statement(statement)
+        self.app.logger.warning(
+            f"Slow query ({duration_ms}ms): {normalized[:200]}",
+            extra={
+                "db.statement": normalized,
+                "db.parameters": DataScrubber.scrub_parameters(parameters),
+                "db.duration_ms": duration_ms,
+                **request_extra,
+            },
+        )
+
+        if (
+            not executemany
+            and self.explain_rate > 0
+            and random.random() < self.explain_rate
+            and self._EXPLAINABLE.match(statement)
+        ):
+            executor = self._ensure_executor()
+            if self._reserve_explain():
+                executor.submit(self._explain, statement, parameters, request_extra)
+
+    def _ensure_executor(self):
+        # Start lazily, and again in a forked worker, since threads do not survive fork
+        if self._executor is not None and self._pid == os.getpid():
+            return self._executor
+
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._executor = ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix="slow-query-explain"
+                )
+                # EXPLAINs pending in the parent are not run in this process
+                self._explains_pending = 0
+            return self._executor
+
+    def _reserve_explain(self):
+        with self._lock:
+            if self._explains_pending >= self.explain_max_pending:
+                self.explains_dropped += 1
+                return False
+            self._explains_pending += 1
+            return True
+
+    def _explain(self, statement, parameters, request_extra):
+        try:
+            self._explain_analyze(statement, parameters, request_extra)
+        finally:
+            with self._lock:
+                self._explains_pending -= 1
+
+    def _explain_analyze(self, statement, parameters, request_extra):
+        try:
+            with self.app.app_context(), db.engine.connect() as connection:
+                # not logged as slow itself, EXPLAIN ANALYZE runs the statement again
+                connection.info["slow_query_explain"] = True
+                try:
+                    # functions called by the statement cannot write either
+                    connection.exec_driver_sql("SET TRANSACTION READ ONLY")
+                    # for this transaction only, which is rolled back
+                    connection.exec_driver_sql(
+                        "SELECT set_config('statement_timeout', %s, true)",
+                        (str(self.explain_timeout_ms),),
+                    )
+                    plan = connection.exec_driver_sql(
+                        f"EXPLAIN (ANALYZE, BUFFERS) {statement}", parameters
+                    ).scalars()
+                    plan = "\n".join(plan)
+                finally:
+                    connection.info.pop("slow_query_explain", None)
+                    connection.rollback()
+        except Exception:
+            self.app.logger.exception("Could not EXPLAIN ANALYZE a slow query")
+            return
+
+        normalized = self.normalize_statement(statement)
+        self.app.logger.info(
+            f"EXPLAIN ANALYZE of slow query: {normalized[:200]}",
+            extra={"db.statement": normalized, "db.plan": plan, **request_extra},
+        )
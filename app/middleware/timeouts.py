@@ -0,0 +1,146 @@
+from contextlib import contextmanager
+from time import perf_counter
+
+from flask import Flask, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+from werkzeug.exceptions import GatewayTimeout, ServiceUnavailable
+
+from app import db
+from app.extensions import api
+
+# SQLSTATE of a statement cancelled by statement_timeout
+_QUERY_CANCELED = "57014"
+
+
+class DeadlineExceeded(Exception):
+    """A statement was about to run after the deadline of its request."""
+
+
+@contextmanager
+def past_deadline():
+    """Lets the statements of the block run after the request deadline.
+
+    For cleanup that has to happen even when the request timed out, like releasing a
+    claim. The statements still get the endpoint's statement timeout.
+    """
+    if not has_request_context():
+        yield
+        return
+
+    exempt = g.get("deadline_exempt", False)
+    g.deadline_exempt = True
+    try:
+        yield
+    finally:
+        g.deadline_exempt = exempt
+
+
+class RequestTimeouts:
+    """Bounds how long a request can hold a database connection.
+
+    Every transaction begun in a request runs with SET LOCAL statement_timeout, the
+    timeout of its endpoint in STATEMENT_TIMEOUTS or STATEMENT_TIMEOUT, cut down to
+    the time left until the request deadline. The deadline is REQUEST_TIMEOUT seconds
+    after the request started, or sooner when the client sends a shorter timeout in
+    X-Request-Timeout, as it gives up on the response then anyway.
+
+    Postgres cancels a statement at its timeout. The request then answers 504 if its
+    deadline passed, or 503 if the endpoint's statement timeout was hit. Statements
+    issued after the deadline are not sent at all.
+
+    The deadline covers producing the response. A streamed body is generated after
+    that and its statements only get the statement timeout.
+    """
+
+    HEADER = "X-Request-Timeout"
+
+    def __init__(self, app: Flask):
+        self.app = app
+        self.request_timeout = app.config.get("REQUEST_TIMEOUT", 30)
+        self.statement_timeout = app.config.get("STATEMENT_TIMEOUT", 10)
+        self.statement_timeouts = app.config.get("STATEMENT_TIMEOUTS", {})
+        self.retry_after = app.config.get("STATEMENT_TIMEOUT_RETRY_AFTER", 5)
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.register_error_handler(DeadlineExceeded, self._deadline_exceeded)
+        app.register_error_handler(OperationalError, self._operational_error)
+
+        with app.app_context():
+            event.listen(db.engine, "begin", self._begin)
+            event.listen(db.engine, "before_cursor_execute", self._before_execute)
+
+        # Store instance on app for easy access (Flask extension pattern)
+        app.extensions["request_timeouts"] = self
+
+    def _timeout(self):
+        """REQUEST_TIMEOUT, or the shorter timeout in seconds sent by the client."""
+        timeout = request.headers.get(self.HEADER, type=float)
+        if timeout is None or not 0 < timeout < self.request_timeout:
+            return self.request_timeout
+        return timeout
+
+    def _before_request(self):
+        g.request_deadline = perf_counter() + self._timeout()
+
+    def _after_request(self, response):
+        # statements of a streamed body run after this
+        g.request_deadline = None
+        return response
+
+    @staticmethod
+    def _remaining():
+        """Seconds left until the deadline of the current request, None without one."""
+        if not has_request_context() or g.get("request_deadline") is None:
+            return None
+        if g.get("deadline_exempt"):
+            return None
+        return g.request_deadline - perf_counter()
+
+    def _begin(self, conn):
+        if not has_request_context():
+            return
+
+        timeout = self.statement_timeouts.get(request.endpoint, self.statement_timeout)
+        remaining = self._remaining()
+        if remaining is not None:
+            timeout = min(timeout, remaining)
+        # 0 turns statement_timeout off, so at least 1ms. The driver's cursor keeps the
+        # SET out of cursor events, like query counts and the slow query log.
+        with conn.connection.dbapi_connection.cursor() as cursor:
+            cursor.execute(
+                "SET LOCAL statement_timeout = %s", (max(1, int(timeout * 1000)),)
+            )
+
+    def _before_execute(
+        self, conn, cursor, statement, parameters, context, executemany
+    ):
+        remaining = self._remaining()
+        if remaining is not None and remaining <= 0:
+            raise DeadlineExceeded(statement)
+
+    def _deadline_exceeded(self, error):
+        db.session.rollback()
+        return self._error(GatewayTimeout(), "Request deadline exceeded")
+
+    def _operational_error(self, error):
+        if getattr(error.orig, "pgcode", None) != _QUERY_CANCELED:
+            raise error
+
+        # the cancelled statement aborted the transaction
+        db.session.rollback()
+        remaining = self._remaining()
+        if remaining is not None and remaining <= 0:
+            return self._error(GatewayTimeout(), "Request deadline exceeded")
+        return self._error(
+            ServiceUnavailable(),
+            "Request took too long to process, try again later or narrow it down",
+            {"Retry-After": str(self.retry_after)},
+        )
+
+    @staticmethod
+    def _error(error, message, headers=None):
+        # same payload as flask-smorest's abort()
+        error.data = {"message": message, "headers": headers or {}}
+        return api.handle_http_exception(error)
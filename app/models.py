@@ -1,7 +1,7 @@
 from email_normalize import normalize
 from email_validator import EmailNotValidError, validate_email
 from sqlalchemy import CheckConstraint, Computed, FetchedValue, Index, func
-from sqlalchemy.dialects.postgresql import CITEXT, TSVECTOR
+from sqlalchemy.dialects.postgresql import CITEXT, REGCONFIG, TSVECTOR
 from werkzeug.security import check_password_hash, generate_password_hash
 
 from app import db
@@ -119,11 +119,13 @@ class Category(db.Model):
         server_default=func.now(),
         server_onupdate=FetchedValue(),
     )
+    # write only, a category can hold any number of subcategories. Read them with
+    # select(), see the category routes
     subcategories = db.relationship(
         "Subcategory",
         secondary=category_subcategory,
         back_populates="categories",
-        lazy="dynamic",
+        lazy="write_only",
         passive_deletes=True,
     )
 
@@ -143,24 +145,46 @@ class Subcategory(db.Model):
         server_default=func.now(),
         server_onupdate=FetchedValue(),
     )
+    # a subcategory is in a few categories, loadable with selectinload()
     categories = db.relationship(
         "Category",
         secondary=category_subcategory,
         back_populates="subcategories",
-        lazy="dynamic",
         passive_deletes=True,
     )
+    # write only, like Category.subcategories
     products = db.relationship(
         "Product",
         secondary=subcategory_product,
         back_populates="subcategories",
-        lazy="dynamic",
+        lazy="write_only",
         passive_deletes=True,
     )
 
     __table_args__ = (ConstraintFactory.non_empty_string("name"),)
 
 
+# ISO 639-1 code -> PostgreSQL text search configuration
+SEARCH_LANGUAGES = {
+    "da": "danish",
+    "de": "german",
+    "en": "english",
+    "es": "spanish",
+    "fi": "finnish",
+    "fr": "french",
+    "hu": "hungarian",
+    "it": "italian",
+    "nl": "dutch",
+    "no": "norwegian",
+    "pt": "portuguese",
+    "ro": "romanian",
+    "ru": "russian",
+    "sv": "swedish",
+    "tr": "turkish",
+}
+DEFAULT_SEARCH_LANGUAGE = "en"
+
+
 class Product(db.Model):
     __tablename__ = "product"
     id = db.Column(db.Integer, primary_key=True)
@@ -176,24 +200,109 @@ class Product(db.Model):
         server_onupdate=FetchedValue(),
     )
 
+    # text search configuration used to build search_vector
+    language = db.Column(
+        REGCONFIG,
+        nullable=False,
+        server_default=SEARCH_LANGUAGES[DEFAULT_SEARCH_LANGUAGE],
+    )
+
     search_vector = db.Column(
         TSVECTOR,
         Computed(
-            "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
-            "setweight(to_tsvector('english', coalesce(description, '')), 'B')",
+            "setweight(to_tsvector(language, coalesce(name, '')), 'A') || "
+            "setweight(to_tsvector(language, coalesce(description, '')), 'B')",
             persisted=True,
         ),
         nullable=False,
     )
+    # the name's terms alone, so search can fetch name matches from their own index
+    name_vector = db.Column(
+        TSVECTOR,
+        Computed("to_tsvector(language, name)", persisted=True),
+        nullable=False,
+    )
+    # a product is in a few subcategories, loadable with selectinload()
     subcategories = db.relationship(
         "Subcategory",
         secondary=subcategory_product,
         back_populates="products",
-        lazy="dynamic",
         passive_deletes=True,
     )
 
     __table_args__ = (
         ConstraintFactory.non_empty_string("name"),
         Index(None, "search_vector", postgresql_using="gin"),
+        Index(None, "name_vector", postgresql_using="gin"),
+        # keyset pagination for PRODUCT_SORTS
+        Index(None, "created_at", "id"),
+        Index(None, "updated_at", "id"),
+        Index(None, "name", "id"),
+    )
+
+
+# sort argument -> ORDER BY. id breaks ties, so keyset cursors stay stable
+PRODUCT_SORTS = {
+    "id": (Product.id.asc(),),
+    "-id": (Product.id.desc(),),
+    "created_at": (Product.created_at.asc(), Product.id.asc()),
+    "-created_at": (Product.created_at.desc(), Product.id.desc()),
+    "updated_at": (Product.updated_at.asc(), Product.id.asc()),
+    "-updated_at": (Product.updated_at.desc(), Product.id.desc()),
+    "name": (Product.name.asc(), Product.id.asc()),
+    "-name": (Product.name.desc(), Product.id.desc()),
+}
+
+# include argument -> link column aggregated per product, see product_links()
+PRODUCT_INCLUDES = {
+    "subcategory_ids": subcategory_product.c.subcategory_id,
+    "category_ids": category_subcategory.c.category_id,
+}
+
+
+class SearchLog(db.Model):
+    __tablename__ = "search_log"
+    id = db.Column(db.BigInteger, primary_key=True)
+    normalized_query = db.Column(db.String(200), nullable=False)
+    result_bucket = db.Column(db.String(16), nullable=False)
+    latency_ms = db.Column(db.Float, nullable=False)
+    created_at = db.Column(
+        db.DateTime(timezone=True),
+        nullable=False,
+        server_default=func.now(),
+        index=True,
+    )
+
+
+class Tombstone(db.Model):
+    """Deleted catalog entity, so sync clients and caches can learn about deletes."""
+
+    __tablename__ = "tombstone"
+    entity_type = db.Column(db.String(32), primary_key=True)  # table name
+    entity_id = db.Column(db.Integer, primary_key=True)
+    deleted_at = db.Column(
+        db.DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+
+    # change feeds and retention pruning, both per entity type
+    __table_args__ = (Index(None, "entity_type", "deleted_at", "entity_id"),)
+
+
+class IdempotencyKey(db.Model):
+    """Stored response of a write sent with an Idempotency-Key header."""
+
+    __tablename__ = "idempotency_key"
+    user_identity = db.Column(db.String(64), primary_key=True)
+    key = db.Column(db.String(255), primary_key=True)
+    # method, path and body, a key reused for another request is rejected
+    request_hash = db.Column(db.String(64), nullable=False)
+    # both NULL while the first request is still running, or if it died, see
+    # IDEMPOTENCY_CLAIM_TIMEOUT
+    status_code = db.Column(db.Integer)
+    response_body = db.Column(db.Text)
+    created_at = db.Column(
+        db.DateTime(timezone=True),
+        nullable=False,
+        server_default=func.now(),
+        index=True,
     )
@@ -2,25 +2,44 @@ from flask.views import MethodView
 from flask_jwt_extended import jwt_required
 from flask_smorest import Blueprint, abort
 from psycopg2.errors import UniqueViolation
-from sqlakeyset import get_page
+from sqlakeyset import select_page
 from sqlalchemy import UniqueConstraint, exists
 from sqlalchemy.exc import IntegrityError
 
 from app import db
+from app.cache import get_cached_or_404
+from app.idempotency import idempotent
 from app.models import (
+    PRODUCT_SORTS,
     Category,
     Product,
     Subcategory,
     category_subcategory,
 )
+from app.routes.links import (
+    insert_links,
+    replace_links,
+    require_existing,
+    with_product_links,
+)
+from app.routes.streaming import stream_json_list
 from app.schemas import (
     CategoriesOut,
     CategoryIn,
     CategoryOut,
-    PaginationArgs,
+    CollectionArgs,
+    LinkArgs,
+    ProductListArgs,
     ProductsOut,
     SubcategoriesOut,
 )
+from app.serializers import (
+    CATEGORY_ROWS,
+    PRODUCT_ROWS,
+    SUBCATEGORY_ROWS,
+    rows_response,
+)
+from app.tombstones import record_deletion
 
 bp = Blueprint("Category", __name__)
 
@@ -28,6 +47,7 @@ bp = Blueprint("Category", __name__)
 @bp.route("/")
 class CategoryCollection(MethodView):
     init_every_request = False
+    _PER_PAGE = 50
 
     @staticmethod
     def _get_name_unique_constraint():
@@ -43,11 +63,22 @@ class CategoryCollection(MethodView):
     _NAME_UNIQUE_CONSTRAINT = _get_name_unique_constraint()
 
     @bp.doc(summary="Get All Categories")
+    @bp.arguments(CollectionArgs, location="query", as_kwargs=True)
     @bp.response(200, CategoriesOut)
-    def get(self):
-        return {"categories": Category.query.all()}
+    def get(self, cursor, fetch_all):
+        categories = CATEGORY_ROWS.select().order_by(Category.id.asc())
+        if fetch_all:
+            return stream_json_list("categories", categories, CATEGORY_ROWS)
+
+        page = select_page(
+            db.session, categories, per_page=CategoryCollection._PER_PAGE, page=cursor
+        )
+        return rows_response(
+            CategoriesOut, "categories", page, CATEGORY_ROWS, cursor=page.paging
+        )
 
     @jwt_required()
+    @idempotent
     @bp.doc(summary="Create Category", security=[{"access_token": []}])
     @bp.arguments(CategoryIn)
     @bp.response(201, CategoryOut)
@@ -87,25 +118,47 @@ class CategoryById(MethodView):
     @bp.doc(summary="Get Category")
     @bp.response(200, CategoryOut)
     def get(self, id):
-        return self._get(id)
+        return get_cached_or_404(Category, id)
 
     @jwt_required()
     @bp.doc(summary="Update Category", security=[{"access_token": []}])
     @bp.arguments(CategoryIn(partial=("name",)))
+    @bp.arguments(LinkArgs, location="query", as_kwargs=True)
     @bp.response(200, CategoryOut)
-    def put(self, data, id):
+    def put(self, data, id, on_conflict, mode):
         category = self._get(id)
         if name := data.get("name"):
             category.name = name
 
         with db.session.no_autoflush:
-            if sc_ids := data.get("subcategories"):
-                subcategories = Subcategory.query.filter(
-                    Subcategory.id.in_(sc_ids)
-                ).all()
-                if len(subcategories) != len(sc_ids):
-                    abort(422, message="One or more subcategories not present")
-                category.subcategories.extend(subcategories)
+            if mode == "replace" and "subcategories" in data:
+                require_existing(
+                    Subcategory,
+                    data["subcategories"],
+                    "One or more subcategories not present",
+                )
+                replace_links(
+                    category_subcategory,
+                    "category_id",
+                    id,
+                    Subcategory,
+                    data["subcategories"],
+                )
+            elif sc_ids := data.get("subcategories"):
+                if on_conflict == "ignore":
+                    require_existing(
+                        Subcategory, sc_ids, "One or more subcategories not present"
+                    )
+                    insert_links(
+                        category_subcategory, "category_id", id, Subcategory, sc_ids
+                    )
+                else:
+                    subcategories = Subcategory.query.filter(
+                        Subcategory.id.in_(sc_ids)
+                    ).all()
+                    if len(subcategories) != len(sc_ids):
+                        abort(422, message="One or more subcategories not present")
+                    category.subcategories.add_all(subcategories)
 
         try:
             db.session.commit()
@@ -133,18 +186,45 @@ class CategoryById(MethodView):
     def delete(self, id):
         category = self._get(id)
         db.session.delete(category)
+        record_deletion(category)
         db.session.commit()
 
 
 @bp.route("/<int:id>/subcategories")
 class CategorySubcategories(MethodView):
     init_every_request = False
+    _PER_PAGE = 50
 
     @bp.doc(summary="Get Subcategories within a Category")
+    @bp.arguments(CollectionArgs, location="query", as_kwargs=True)
     @bp.response(200, SubcategoriesOut)
-    def get(self, id):
-        category = Category.query.get_or_404(id)
-        return {"subcategories": category.subcategories}
+    def get(self, id, cursor, fetch_all):
+        Category.query.get_or_404(id)
+        subcategories = (
+            SUBCATEGORY_ROWS.select()
+            .join(
+                category_subcategory,
+                category_subcategory.c.subcategory_id == Subcategory.id,
+            )
+            .where(category_subcategory.c.category_id == id)
+            .order_by(Subcategory.id.asc())
+        )
+        if fetch_all:
+            return stream_json_list("subcategories", subcategories, SUBCATEGORY_ROWS)
+
+        page = select_page(
+            db.session,
+            subcategories,
+            per_page=CategorySubcategories._PER_PAGE,
+            page=cursor,
+        )
+        return rows_response(
+            SubcategoriesOut,
+            "subcategories",
+            page,
+            SUBCATEGORY_ROWS,
+            cursor=page.paging,
+        )
 
 
 @bp.route("/<int:id>/products")
@@ -153,16 +233,27 @@ class CategoryProducts(MethodView):
     _PER_PAGE = 10
 
     @bp.doc(summary="Get Products within a Category")
-    @bp.arguments(PaginationArgs, location="query", as_kwargs=True)
+    @bp.arguments(ProductListArgs, location="query", as_kwargs=True)
     @bp.response(200, ProductsOut)
-    def get(self, id, cursor):
+    def get(self, id, cursor, sort, include):
         category_exists = db.session.query(exists().where(Category.id == id)).scalar()
         if not category_exists:
             abort(404)
 
-        products = Product.query.filter(
-            Product.subcategories.any(Subcategory.categories.any(id=id))
-        ).order_by(Product.id.asc())
-        page = get_page(products, per_page=CategoryProducts._PER_PAGE, page=cursor)
+        products = (
+            PRODUCT_ROWS.select()
+            .where(Product.subcategories.any(Subcategory.categories.any(id=id)))
+            .order_by(*PRODUCT_SORTS[sort])
+        )
+        page = select_page(
+            db.session, products, per_page=CategoryProducts._PER_PAGE, page=cursor
+        )
 
-        return {"products": page, "cursor": page.paging}
+        return rows_response(
+            ProductsOut,
+            "products",
+            page,
+            with_product_links(PRODUCT_ROWS, page, include),
+            sort=sort,
+            cursor=page.paging,
+        )
@@ -7,6 +7,7 @@ from flask_smorest import Blueprint
 from sqlalchemy import text
 
 from app import db
+from app.admin import admin_required
 
 bp = Blueprint("Health", __name__)
 
@@ -57,3 +58,16 @@ class HealthCheck(MethodView):
         # Return appropriate HTTP status code
         status_code = 200 if overall_status == "healthy" else 503
         return jsonify(response_data), status_code
+
+
+@bp.route("/metrics")
+class Metrics(MethodView):
+    init_every_request = False
+
+    @admin_required
+    @bp.doc(summary="Worker metrics", security=[{"access_token": []}])
+    def get(self):
+        metrics = {}
+        if admission_control := current_app.extensions.get("admission_control"):
+            metrics["admission"] = admission_control.metrics()
+        return jsonify(metrics)
@@ -0,0 +1,123 @@
+from flask_smorest import abort
+from sqlalchemy import ARRAY, Integer, all_, any_, delete, func, literal, select
+from sqlalchemy.dialects.postgresql import aggregate_order_by, insert
+
+from app import db
+from app.models import PRODUCT_INCLUDES, category_subcategory, subcategory_product
+
+
+def _ids_array(ids):
+    return literal(sorted(set(ids)), ARRAY(Integer))
+
+
+def any_id(ids):
+    """`column == any_id(ids)` binds the ids as one array parameter, unlike in_()."""
+    return any_(_ids_array(ids))
+
+
+def _linked_column(association, owner_column):
+    return next(
+        column.name for column in association.primary_key if column.name != owner_column
+    )
+
+
+def require_existing(model, ids, message):
+    """Abort with 422 and `message` unless a `model` row exists for every id."""
+    ids = sorted(set(ids))
+    existing = db.session.scalar(select(func.count()).where(model.id == any_id(ids)))
+    if existing != len(ids):
+        abort(422, message=message)
+
+
+def insert_links(association, owner_column, owner_id, linked_model, linked_ids):
+    """Link `owner_id` to `linked_ids` in an association table, skipping existing links.
+
+    A single INSERT ... SELECT ... ON CONFLICT DO NOTHING, no ORM objects are loaded
+    and an existing link does not fail the transaction. Returns the number of links
+    inserted. Ids without a `linked_model` row are skipped, see require_existing().
+    """
+    linked_column = _linked_column(association, owner_column)
+    inserted = db.session.execute(
+        insert(association)
+        .from_select(
+            [owner_column, linked_column],
+            select(literal(owner_id), linked_model.id)
+            .where(linked_model.id == any_id(linked_ids))
+            # same lock order for concurrent links
+            .order_by(linked_model.id),
+        )
+        .on_conflict_do_nothing()
+        .returning(association.c[linked_column])
+    ).all()
+    return len(inserted)
+
+
+def replace_links(association, owner_column, owner_id, linked_model, linked_ids):
+    """Make `linked_ids` the exact set of links of `owner_id`.
+
+    The difference is computed in SQL, one DELETE for links not in `linked_ids` and
+    one insert_links() for the new ones, without loading the current links.
+    """
+    linked_column = _linked_column(association, owner_column)
+    db.session.execute(
+        delete(association).where(
+            association.c[owner_column] == owner_id,
+            # true for every link when linked_ids is empty
+            association.c[linked_column] != all_(_ids_array(linked_ids)),
+        )
+    )
+    insert_links(association, owner_column, owner_id, linked_model, linked_ids)
+
+
+def _array_agg_ids(column):
+    # array_agg(DISTINCT column ORDER BY column), '{}' when every value is NULL
+    ids = func.array_agg(aggregate_order_by(column.distinct(), column))
+    return func.coalesce(ids.filter(column.is_not(None)), literal([], ARRAY(Integer)))
+
+
+def product_links(product_ids, include):
+    """Linked ids of each product, as {product id: {"subcategory_ids": [...], ...}}.
+
+    One query aggregating the links of all `product_ids`, grouped by product, for the
+    PRODUCT_INCLUDES names in `include`. Products without links get empty lists.
+    """
+    include = list(dict.fromkeys(include))
+    links = {id: {name: [] for name in include} for id in product_ids}
+    if not include or not product_ids:
+        return links
+
+    columns = {
+        name: _array_agg_ids(PRODUCT_INCLUDES[name]).label(name) for name in include
+    }
+    if "category_ids" in include:
+        # categories of the product's subcategories, looked up in the index per
+        # product, a join would hash all of category_subcategory for every page
+        category_id = category_subcategory.c.category_id
+        columns["category_ids"] = func.array(
+            select(category_id.distinct())
+            .where(
+                category_subcategory.c.subcategory_id
+                == any_(func.array_agg(subcategory_product.c.subcategory_id))
+            )
+            .order_by(category_id)
+            .scalar_subquery()
+        ).label("category_ids")
+
+    stmt = (
+        select(subcategory_product.c.product_id, *columns.values())
+        .where(subcategory_product.c.product_id == any_id(product_ids))
+        .group_by(subcategory_product.c.product_id)
+    )
+
+    for row in db.session.execute(stmt).mappings():
+        links[row["product_id"]] = {name: row[name] for name in include}
+    return links
+
+
+def with_product_links(serialize, rows, include):
+    """`serialize` for a page of product `rows`, adding the links named in `include`."""
+    if not include:
+        return serialize
+
+    links = product_links([row.id for row in rows], include)
+    return lambda row: serialize(row) | links[row.id]
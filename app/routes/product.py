@@ -1,25 +1,54 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+from flask import after_this_request, current_app, request
 from flask.views import MethodView
 from flask_jwt_extended import jwt_required
 from flask_smorest import Blueprint, abort
 from psycopg2.errors import UniqueViolation
-from sqlakeyset import get_page
-from sqlalchemy import Numeric, UniqueConstraint, cast, func
+from sqlakeyset import Marker, get_page, select_page
+from sqlalchemy import Numeric, UniqueConstraint, cast, func, select, text, union
 from sqlalchemy.exc import IntegrityError
 
 from app import db
+from app.admin import admin_required
+from app.cache import get_cached_or_404
+from app.idempotency import idempotent
 from app.models import (
+    DEFAULT_SEARCH_LANGUAGE,
+    PRODUCT_SORTS,
+    SEARCH_LANGUAGES,
     Product,
     Subcategory,
+    Tombstone,
     subcategory_product,
 )
+from app.routes.links import (
+    insert_links,
+    product_links,
+    replace_links,
+    require_existing,
+    with_product_links,
+)
 from app.schemas import (
+    ChangesArgs,
+    LinkArgs,
     PaginationArgs,
+    ProductChangesOut,
     ProductIn,
+    ProductIncludeArgs,
+    ProductListArgs,
     ProductOut,
+    ProductSearchOut,
     ProductsOut,
+    SearchAnalyticsArgs,
+    SearchAnalyticsOut,
     SearchArgs,
     SubcategoriesOut,
 )
+from app.search_analytics import SearchAnalytics, record_search
+from app.serializers import PRODUCT_ROWS, SUBCATEGORY_ROWS, rows_response
+from app.tombstones import record_deletion
 
 bp = Blueprint("Product", __name__)
 
@@ -43,19 +72,31 @@ class ProductCollection(MethodView):
     _NAME_UNIQUE_CONSTRAINT = _get_name_unique_constraint()
 
     @bp.doc(summary="Get All Products")
-    @bp.arguments(PaginationArgs, location="query", as_kwargs=True)
+    @bp.arguments(ProductListArgs, location="query", as_kwargs=True)
     @bp.response(200, ProductsOut)
-    def get(self, cursor):
-        products = Product.query.order_by(Product.id.asc())
-        page = get_page(products, per_page=ProductCollection._PER_PAGE, page=cursor)
-        return {"products": page, "cursor": page.paging}
+    def get(self, cursor, sort, include):
+        products = PRODUCT_ROWS.select().order_by(*PRODUCT_SORTS[sort])
+        page = select_page(
+            db.session, products, per_page=ProductCollection._PER_PAGE, page=cursor
+        )
+        return rows_response(
+            ProductsOut,
+            "products",
+            page,
+            with_product_links(PRODUCT_ROWS, page, include),
+            sort=sort,
+            cursor=page.paging,
+        )
 
     @jwt_required()
+    @idempotent
     @bp.doc(summary="Create Product", security=[{"access_token": []}])
     @bp.arguments(ProductIn)
     @bp.response(201, ProductOut)
     def post(self, data):
         product = Product(name=data["name"], description=data.get("description"))
+        if language := data.get("language"):
+            product.language = language
 
         if sc_ids := data.get("subcategories"):
             subcategories = Subcategory.query.filter(Subcategory.id.in_(sc_ids)).all()
@@ -87,30 +128,68 @@ class ProductById(MethodView):
         return Product.query.get_or_404(id)
 
     @bp.doc(summary="Get Product")
+    @bp.arguments(ProductIncludeArgs, location="query", as_kwargs=True)
     @bp.response(200, ProductOut)
-    def get(self, id):
-        return self._get(id)
+    def get(self, id, include):
+        product = get_cached_or_404(Product, id)
+        if not include:
+            return product
+
+        links = product_links([id], include)[id]
+        # cached products are dicts shared between requests, never mutate them
+        if isinstance(product, dict):
+            return product | links
+        for name, ids in links.items():
+            setattr(product, name, ids)
+        return product
 
     @jwt_required()
     @bp.doc(summary="Update Product", security=[{"access_token": []}])
     @bp.arguments(ProductIn(partial=("name",)))
+    @bp.arguments(LinkArgs, location="query", as_kwargs=True)
     @bp.response(200, ProductOut)
-    def put(self, data, id):
+    def put(self, data, id, on_conflict, mode):
         product = self._get(id)
 
         if name := data.get("name"):
             product.name = name
         if "description" in data:
             product.description = data["description"]
+        if language := data.get("language"):
+            product.language = language
 
         with db.session.no_autoflush:
-            if sc_ids := data.get("subcategories"):
-                subcategories = Subcategory.query.filter(
-                    Subcategory.id.in_(sc_ids)
-                ).all()
-                if len(subcategories) != len(sc_ids):
-                    abort(422, message="One or more subcategories not present")
-                product.subcategories.extend(subcategories)
+            if mode == "replace" and "subcategories" in data:
+                require_existing(
+                    Subcategory,
+                    data["subcategories"],
+                    "One or more subcategories not present",
+                )
+                replace_links(
+                    subcategory_product,
+                    "product_id",
+                    id,
+                    Subcategory,
+                    data["subcategories"],
+                )
+            elif sc_ids := data.get("subcategories"):
+                if on_conflict == "ignore":
+                    require_existing(
+                        Subcategory, sc_ids, "One or more subcategories not present"
+                    )
+                    insert_links(
+                        subcategory_product, "product_id", id, Subcategory, sc_ids
+                    )
+                else:
+                    subcategories = Subcategory.query.filter(
+                        Subcategory.id.in_(sc_ids)
+                    ).all()
+                    if len(subcategories) != len(sc_ids):
+                        abort(422, message="One or more subcategories not present")
+                    # the loaded collection would skip links that already exist
+                    if any(sc in product.subcategories for sc in subcategories):
+                        abort(409, message="Product and subcategory already linked")
+                    product.subcategories.extend(subcategories)
 
         try:
             db.session.commit()
@@ -137,6 +216,7 @@ class ProductById(MethodView):
     def delete(self, id):
         product = self._get(id)
         db.session.delete(product)
+        record_deletion(product)
         db.session.commit()
 
 
@@ -147,8 +227,88 @@ class ProductSubcategories(MethodView):
     @bp.doc(summary="Get Subcategories related to a Product")
     @bp.response(200, SubcategoriesOut)
     def get(self, id):
-        product = Product.query.get_or_404(id)
-        return {"subcategories": product.subcategories}
+        Product.query.get_or_404(id)
+        subcategories = (
+            SUBCATEGORY_ROWS.select()
+            .join(
+                subcategory_product,
+                subcategory_product.c.subcategory_id == Subcategory.id,
+            )
+            .where(subcategory_product.c.product_id == id)
+        )
+        return rows_response(
+            SubcategoriesOut,
+            "subcategories",
+            db.session.execute(subcategories),
+            SUBCATEGORY_ROWS,
+        )
+
+
+@bp.route("/changes")
+class ProductChanges(MethodView):
+    init_every_request = False
+
+    _PER_PAGE = 100
+    # updated_at and deleted_at are the writing transaction's start time, but rows only
+    # become visible on commit. So rows of transactions still open carry at least the
+    # start time of the oldest open transaction, ours included, and changes are settled
+    # up to just before it. Transactions that have written (have an xid) hold the feed
+    # back until they end, however long they take. Those that have not written yet only
+    # for CHANGES_SETTLE_TIMEOUT, so reports, streamed responses and idle sessions
+    # cannot stall it. Sessions of other roles are only listed with pg_read_all_stats,
+    # so writers should use the app's role.
+    _OPEN_TRANSACTIONS_SQL = text(
+        "SELECT now(), min(xact_start) FROM pg_stat_activity "
+        "WHERE datname = current_database() "
+        "AND (backend_xid IS NOT NULL OR xact_start >= now() - :settle_timeout)"
+    )
+
+    @bp.doc(summary="Get Products changed or deleted since a sync token")
+    @bp.arguments(ChangesArgs, location="query", as_kwargs=True)
+    @bp.response(200, ProductChangesOut)
+    def get(self, since):
+        now, oldest_start = db.session.execute(
+            ProductChanges._OPEN_TRANSACTIONS_SQL,
+            {"settle_timeout": current_app.config["CHANGES_SETTLE_TIMEOUT"]},
+        ).one()
+        settled = min(now, oldest_start) - timedelta(microseconds=1)
+
+        # tombstones after the token may have been pruned, the client has to resync
+        deleted_marker = since.get("deleted")
+        retention = current_app.config["TOMBSTONE_RETENTION"]
+        if deleted_marker and deleted_marker.place[0] < now - retention:
+            abort(410, message="Sync token expired, pull again without since")
+
+        products = Product.query.filter(Product.updated_at <= settled).order_by(
+            *PRODUCT_SORTS["updated_at"]
+        )
+        page = get_page(
+            products, per_page=ProductChanges._PER_PAGE, page=since.get("products")
+        )
+        if page:
+            since = since | {"products": page.paging.next}
+
+        tombstones = Tombstone.query.filter(
+            Tombstone.entity_type == Product.__tablename__,
+            Tombstone.deleted_at <= settled,
+        ).order_by(Tombstone.deleted_at, Tombstone.entity_id)
+        deleted = get_page(
+            tombstones, per_page=ProductChanges._PER_PAGE, page=deleted_marker
+        )
+        if deleted.paging.has_next:
+            since = since | {"deleted": deleted.paging.next}
+        else:
+            # Caught up: move the marker to the settle point even without new
+            # tombstones, so it only ages (and expires) for clients that stop pulling
+            place = max(deleted.paging.next.place or (settled, 0), (settled, 0))
+            since = since | {"deleted": Marker(place)}
+
+        return {
+            "products": page,
+            "deleted": deleted,
+            "since": since,
+            "has_more": page.paging.has_next or deleted.paging.has_next,
+        }
 
 
 @bp.route("/search")
@@ -156,22 +316,155 @@ class ProductSearch(MethodView):
     init_every_request = False
 
     _PER_PAGE = 10
-    _MIN_SEARCH_THRESHOLD = 0.5
+    # Candidates are the newest _MAX_CANDIDATES name matches and the newest
+    # _MAX_CANDIDATES matches anywhere, so ranking cost is bounded by the cap and not
+    # by the total match count. Names weigh most in search_vector, so a strong match
+    # is ranked unless more than _MAX_CANDIDATES names match. Past that, for very broad
+    # queries, older matches are not returned on any page. That is the relevance
+    # traded for a bounded cost.
+    _MAX_CANDIDATES = 1000
+    # ts_rank_cd normalization 32: rank / (rank + 1), keeps ranks in [0, 1)
+    _RANK_NORMALIZATION = 32
+    # escaped before highlighting, the parser reads entities as single tokens
+    _HTML_ENTITIES = (
+        ("&", "&amp;"),
+        ("<", "&lt;"),
+        (">", "&gt;"),
+        ('"', "&quot;"),
+        ("'", "&#39;"),
+    )
 
-    def _search(self, search_query):
-        ts_query = func.websearch_to_tsquery("english", search_query)
-        rank_expr = cast(func.ts_rank(Product.search_vector, ts_query), Numeric(5, 3))
+    @staticmethod
+    def _vary_accept_language(response):
+        response.vary.add("Accept-Language")
+        return response
+
+    @staticmethod
+    def _search_config(lang):
+        """Text search configuration from the lang argument or Accept-Language."""
+        if lang is None:
+            # results depend on Accept-Language, shared caches must key on it too
+            after_this_request(ProductSearch._vary_accept_language)
+            code = request.accept_languages.best_match(
+                SEARCH_LANGUAGES, default=DEFAULT_SEARCH_LANGUAGE
+            )
+            lang = SEARCH_LANGUAGES[code]
+        return lang
+
+    def _search(self, search_query, config):
+        ts_query = func.websearch_to_tsquery(config, search_query)
+        matches = Product.search_vector.op("@@")(ts_query)
+
+        # phase 1: candidate ids straight from the GIN indexes, no ranking
+        def newest(*criteria):
+            return (
+                select(Product.id)
+                .where(*criteria)
+                .order_by(Product.id.desc())
+                .limit(self._MAX_CANDIDATES)
+            )
+
+        # name matches can miss the full query, by a term it excludes from the
+        # description, so they are filtered on it below
+        candidates = union(
+            newest(Product.name_vector.op("@@")(ts_query)), newest(matches)
+        ).subquery()
+
+        # phase 2: rank only the candidates. Cast, so bookmarks compare exactly across
+        # pages
+        rank_expr = cast(
+            func.ts_rank_cd(Product.search_vector, ts_query, self._RANK_NORMALIZATION),
+            Numeric(5, 3),
+        )
         rank = rank_expr.label("rank")
 
-        return Product.query.filter(
-            Product.search_vector.op("@@")(ts_query), rank > self._MIN_SEARCH_THRESHOLD
-        ).order_by(rank.desc(), Product.id)
+        return (
+            Product.query.join(candidates, Product.id == candidates.c.id)
+            .filter(matches)
+            .order_by(rank.desc(), Product.id)
+        )
+
+    @staticmethod
+    def _escape_html(text):
+        """`text` with HTML special characters escaped, & first."""
+        for char, entity in ProductSearch._HTML_ENTITIES:
+            text = func.replace(text, char, entity)
+        return text
+
+    def _highlight(self, products, search_query, config, max_words, max_fragments):
+        """Attach ts_headline snippets to the products of a single page.
+
+        Runs after keyset limiting, so ts_headline only sees the returned rows.
+        Snippets are HTML: names and descriptions are escaped before ts_headline
+        adds its <b> tags, so user text cannot inject markup.
+        """
+        if not products:
+            return
+
+        ts_query = func.websearch_to_tsquery(config, search_query)
+        # names are short, highlight them whole
+        name_options = "HighlightAll=true"
+        description_options = (
+            f"MaxWords={max_words}, MinWords={max(1, max_words // 2)}, "
+            f"MaxFragments={max_fragments}"
+        )
+        rows = db.session.execute(
+            select(
+                Product.id,
+                func.ts_headline(
+                    config, self._escape_html(Product.name), ts_query, name_options
+                ),
+                func.ts_headline(
+                    config,
+                    self._escape_html(Product.description),
+                    ts_query,
+                    description_options,
+                ),
+            ).where(Product.id.in_([product.id for product in products]))
+        )
+        highlights = {
+            id: {"name": name, "description": description}
+            for id, name, description in rows
+        }
+
+        for product in products:
+            product.highlight = highlights[product.id]
 
     @bp.doc(summary="Search for products")
     @bp.arguments(SearchArgs, location="query", as_kwargs=True)
     @bp.arguments(PaginationArgs, location="query", as_kwargs=True)
-    @bp.response(200, ProductsOut)
-    def get(self, q, cursor):
-        products = self._search(q)
+    @bp.response(200, ProductSearchOut)
+    def get(self, q, lang, highlight, max_words, max_fragments, cursor):
+        started_at = time.perf_counter()
+        config = self._search_config(lang)
+        products = self._search(q, config)
         page = get_page(products, per_page=ProductSearch._PER_PAGE, page=cursor)
+        if highlight:
+            self._highlight(page, q, config, max_words, max_fragments)
+
+        # later pages of the same search are not new queries
+        if cursor is None:
+            record_search(q, len(page), ProductSearch._PER_PAGE, started_at)
+
         return {"products": page, "cursor": page.paging}
+
+
+@bp.route("/search/analytics")
+class ProductSearchAnalytics(MethodView):
+    init_every_request = False
+
+    @admin_required
+    @bp.doc(
+        summary="Most frequent and zero-result search queries",
+        security=[{"access_token": []}],
+    )
+    @bp.arguments(SearchAnalyticsArgs, location="query", as_kwargs=True)
+    @bp.response(200, SearchAnalyticsOut)
+    def get(self, limit, days):
+        since = datetime.now(timezone.utc) - timedelta(days=days)
+        return {
+            "hot": SearchAnalytics.top_queries(limit, since),
+            "zero_results": SearchAnalytics.top_queries(
+                limit, since, zero_results=True
+            ),
+        }
@@ -0,0 +1,22 @@
+from flask import Response, current_app, stream_with_context
+
+from app import db
+
+
+def stream_json_list(key, stmt, serialize, batch_size=500):
+    """Stream `{key: [...]}` as JSON, dumping rows with `serialize` as they are fetched.
+
+    Rows of the select() `stmt` are read in batches of `batch_size`, so memory stays
+    flat however large the collection is.
+    """
+
+    def generate():
+        yield f'{{"{key}": ['
+        separator = ""
+        rows = db.session.execute(stmt.execution_options(yield_per=batch_size))
+        for row in rows:
+            yield separator + current_app.json.dumps(serialize(row))
+            separator = ","
+        yield "]}"
+
+    return Response(stream_with_context(generate()), mimetype="application/json")
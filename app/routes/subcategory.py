@@ -2,26 +2,49 @@ from flask.views import MethodView
 from flask_jwt_extended import jwt_required
 from flask_smorest import Blueprint, abort
 from psycopg2.errors import UniqueViolation
-from sqlakeyset import get_page
-from sqlalchemy import UniqueConstraint
+from sqlakeyset import select_page
+from sqlalchemy import UniqueConstraint, delete
 from sqlalchemy.exc import IntegrityError
 
 from app import db
+from app.cache import get_cached_or_404
+from app.idempotency import idempotent
 from app.models import (
+    PRODUCT_SORTS,
     Category,
     Product,
     Subcategory,
     category_subcategory,
     subcategory_product,
 )
+from app.routes.links import (
+    any_id,
+    insert_links,
+    replace_links,
+    require_existing,
+    with_product_links,
+)
+from app.routes.streaming import stream_json_list
 from app.schemas import (
     CategoriesOut,
-    PaginationArgs,
+    CollectionArgs,
+    LinkArgs,
+    LinkedOut,
+    ProductIdsIn,
+    ProductListArgs,
     ProductsOut,
     SubcategoriesOut,
     SubcategoryIn,
     SubcategoryOut,
+    UnlinkedOut,
+)
+from app.serializers import (
+    CATEGORY_ROWS,
+    PRODUCT_ROWS,
+    SUBCATEGORY_ROWS,
+    rows_response,
 )
+from app.tombstones import record_deletion
 
 bp = Blueprint("Subcategory", __name__)
 
@@ -29,6 +52,7 @@ bp = Blueprint("Subcategory", __name__)
 @bp.route("/")
 class SubcategoryCollection(MethodView):
     init_every_request = False
+    _PER_PAGE = 50
 
     @staticmethod
     def _get_name_unique_constraint():
@@ -44,11 +68,29 @@ class SubcategoryCollection(MethodView):
     _NAME_UNIQUE_CONSTRAINT = _get_name_unique_constraint()
 
     @bp.doc(summary="Get All Subcategories")
+    @bp.arguments(CollectionArgs, location="query", as_kwargs=True)
     @bp.response(200, SubcategoriesOut)
-    def get(self):
-        return {"subcategories": Subcategory.query.all()}
+    def get(self, cursor, fetch_all):
+        subcategories = SUBCATEGORY_ROWS.select().order_by(Subcategory.id.asc())
+        if fetch_all:
+            return stream_json_list("subcategories", subcategories, SUBCATEGORY_ROWS)
+
+        page = select_page(
+            db.session,
+            subcategories,
+            per_page=SubcategoryCollection._PER_PAGE,
+            page=cursor,
+        )
+        return rows_response(
+            SubcategoriesOut,
+            "subcategories",
+            page,
+            SUBCATEGORY_ROWS,
+            cursor=page.paging,
+        )
 
     @jwt_required()
+    @idempotent
     @bp.doc(summary="Create Subcategory", security=[{"access_token": []}])
     @bp.arguments(SubcategoryIn)
     @bp.response(201, SubcategoryOut)
@@ -93,29 +135,69 @@ class SubcategoryById(MethodView):
     @bp.doc(summary="Get Subcategory")
     @bp.response(200, SubcategoryOut)
     def get(self, id):
-        return self._get(id)
+        return get_cached_or_404(Subcategory, id)
 
     @jwt_required()
     @bp.doc(summary="Update Subcategory", security=[{"access_token": []}])
     @bp.arguments(SubcategoryIn(partial=("name",)))
+    @bp.arguments(LinkArgs, location="query", as_kwargs=True)
     @bp.response(200, SubcategoryOut)
-    def put(self, data, id):
+    def put(self, data, id, on_conflict, mode):
         subcategory = self._get(id)
         if name := data.get("name"):
             subcategory.name = name
 
         with db.session.no_autoflush:
-            if c_ids := data.get("categories"):
-                categories = Category.query.filter(Category.id.in_(c_ids)).all()
-                if len(categories) != len(c_ids):
-                    abort(422, message="One or more categories not present")
-                subcategory.categories.extend(categories)
-
-            if p_ids := data.get("products"):
-                products = Product.query.filter(Product.id.in_(p_ids)).all()
-                if len(products) != len(p_ids):
-                    abort(422, message="One or more products not present")
-                subcategory.products.extend(products)
+            if mode == "replace" and "categories" in data:
+                require_existing(
+                    Category, data["categories"], "One or more categories not present"
+                )
+                replace_links(
+                    category_subcategory,
+                    "subcategory_id",
+                    id,
+                    Category,
+                    data["categories"],
+                )
+            elif c_ids := data.get("categories"):
+                if on_conflict == "ignore":
+                    require_existing(
+                        Category, c_ids, "One or more categories not present"
+                    )
+                    insert_links(
+                        category_subcategory, "subcategory_id", id, Category, c_ids
+                    )
+                else:
+                    categories = Category.query.filter(Category.id.in_(c_ids)).all()
+                    if len(categories) != len(c_ids):
+                        abort(422, message="One or more categories not present")
+                    # the loaded collection would skip links that already exist
+                    if any(c in subcategory.categories for c in categories):
+                        abort(409, message="Subcategory and category already linked")
+                    subcategory.categories.extend(categories)
+
+            if mode == "replace" and "products" in data:
+                require_existing(
+                    Product, data["products"], "One or more products not present"
+                )
+                replace_links(
+                    subcategory_product,
+                    "subcategory_id",
+                    id,
+                    Product,
+                    data["products"],
+                )
+            elif p_ids := data.get("products"):
+                if on_conflict == "ignore":
+                    require_existing(Product, p_ids, "One or more products not present")
+                    insert_links(
+                        subcategory_product, "subcategory_id", id, Product, p_ids
+                    )
+                else:
+                    products = Product.query.filter(Product.id.in_(p_ids)).all()
+                    if len(products) != len(p_ids):
+                        abort(422, message="One or more products not present")
+                    subcategory.products.add_all(products)
 
         try:
             db.session.commit()
@@ -148,18 +230,41 @@ class SubcategoryById(MethodView):
     def delete(self, id):
         subcategory = self._get(id)
         db.session.delete(subcategory)
+        record_deletion(subcategory)
         db.session.commit()
 
 
 @bp.route("/<int:id>/categories")
 class SubcategoryCategories(MethodView):
     init_every_request = False
+    _PER_PAGE = 50
 
     @bp.doc(summary="Get Categories related to a Subcategory")
+    @bp.arguments(CollectionArgs, location="query", as_kwargs=True)
     @bp.response(200, CategoriesOut)
-    def get(self, id):
-        subcategory = Subcategory.query.get_or_404(id)
-        return {"categories": subcategory.categories}
+    def get(self, id, cursor, fetch_all):
+        Subcategory.query.get_or_404(id)
+        categories = (
+            CATEGORY_ROWS.select()
+            .join(
+                category_subcategory,
+                category_subcategory.c.category_id == Category.id,
+            )
+            .where(category_subcategory.c.subcategory_id == id)
+            .order_by(Category.id.asc())
+        )
+        if fetch_all:
+            return stream_json_list("categories", categories, CATEGORY_ROWS)
+
+        page = select_page(
+            db.session,
+            categories,
+            per_page=SubcategoryCategories._PER_PAGE,
+            page=cursor,
+        )
+        return rows_response(
+            CategoriesOut, "categories", page, CATEGORY_ROWS, cursor=page.paging
+        )
 
 
 @bp.route("/<int:id>/products")
@@ -168,11 +273,65 @@ class SubcategoryProducts(MethodView):
     _PER_PAGE = 10
 
     @bp.doc(summary="Get Products within a Subcategory")
-    @bp.arguments(PaginationArgs, location="query", as_kwargs=True)
+    @bp.arguments(ProductListArgs, location="query", as_kwargs=True)
     @bp.response(200, ProductsOut)
-    def get(self, id, cursor):
-        subcategory = Subcategory.query.get_or_404(id)
-        products = subcategory.products.order_by(Product.id.asc())
-        page = get_page(products, per_page=SubcategoryProducts._PER_PAGE, page=cursor)
+    def get(self, id, cursor, sort, include):
+        Subcategory.query.get_or_404(id)
+        products = (
+            PRODUCT_ROWS.select()
+            .join(
+                subcategory_product,
+                subcategory_product.c.product_id == Product.id,
+            )
+            .where(subcategory_product.c.subcategory_id == id)
+            .order_by(*PRODUCT_SORTS[sort])
+        )
+        page = select_page(
+            db.session, products, per_page=SubcategoryProducts._PER_PAGE, page=cursor
+        )
+
+        return rows_response(
+            ProductsOut,
+            "products",
+            page,
+            with_product_links(PRODUCT_ROWS, page, include),
+            sort=sort,
+            cursor=page.paging,
+        )
+
+    @jwt_required()
+    @bp.doc(summary="Link Products to a Subcategory", security=[{"access_token": []}])
+    @bp.arguments(ProductIdsIn)
+    @bp.response(200, LinkedOut)
+    def post(self, data, id):
+        Subcategory.query.get_or_404(id)
+        product_ids = set(data["products"])
+        require_existing(Product, product_ids, "One or more products not present")
+
+        inserted = insert_links(
+            subcategory_product, "subcategory_id", id, Product, product_ids
+        )
+        db.session.commit()
+
+        return {"inserted": inserted, "skipped": len(product_ids) - inserted}
+
+    @jwt_required()
+    @bp.doc(
+        summary="Unlink Products from a Subcategory",
+        security=[{"access_token": []}],
+    )
+    @bp.arguments(ProductIdsIn)
+    @bp.response(200, UnlinkedOut)
+    def delete(self, data, id):
+        Subcategory.query.get_or_404(id)
+        product_ids = sorted(set(data["products"]))
+
+        deleted = db.session.execute(
+            delete(subcategory_product).where(
+                subcategory_product.c.subcategory_id == id,
+                subcategory_product.c.product_id == any_id(product_ids),
+            )
+        ).rowcount
+        db.session.commit()
 
-        return {"products": page, "cursor": page.paging}
+        return {"deleted": deleted, "skipped": len(product_ids) - deleted}
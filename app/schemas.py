@@ -1,21 +1,44 @@
 import base64
+import json
 
-from marshmallow import Schema, ValidationError, fields, validate
+from flask import request
+from marshmallow import Schema, ValidationError, fields, post_load, validate
 from marshmallow_sqlalchemy import SQLAlchemyAutoSchema, SQLAlchemySchema, auto_field
-from sqlakeyset import BadBookmark, unserialize_bookmark
+from sqlakeyset import BadBookmark, serialize_bookmark, unserialize_bookmark
+from webargs.fields import DelimitedList
 
-from app.models import Category, Product, Subcategory, User
+from app.models import (
+    PRODUCT_INCLUDES,
+    PRODUCT_SORTS,
+    SEARCH_LANGUAGES,
+    Category,
+    Product,
+    Subcategory,
+    Tombstone,
+    User,
+)
 
 
 class Cursor(fields.Field[dict]):
+    """Keyset cursor, bound to the endpoint and `sort` of the object it is dumped for.
+
+    PaginationArgs rejects a cursor whose endpoint or sort differs from the requested
+    one, as its marker only fits the ordering it was issued for.
+    """
+
+    _SORT_SEPARATOR = "|"
+
     def _serialize(self, paging, attr, obj, **kwargs):
         def encode(s):
-            bytes = s.encode("utf-8")
+            bytes = Cursor._SORT_SEPARATOR.join((endpoint, sort, s)).encode("utf-8")
             return base64.urlsafe_b64encode(bytes).decode("utf-8")
 
         if paging is None:
             return None
 
+        endpoint = request.endpoint or ""
+        sort = obj.get("sort") or ""
+
         return {
             "next": encode(paging.bookmark_next) if paging.has_next else None,
             "prev": encode(paging.bookmark_previous) if paging.has_previous else None,
@@ -27,12 +50,60 @@ class Cursor(fields.Field[dict]):
 
         try:
             decoded_bytes = base64.urlsafe_b64decode(cursor.encode("utf-8"))
-            marker_serialized = decoded_bytes.decode("utf-8")
-            return unserialize_bookmark(marker_serialized)
+            # the marker may contain the separator, the endpoint and sort do not
+            endpoint, sort, marker_serialized = decoded_bytes.decode("utf-8").split(
+                Cursor._SORT_SEPARATOR, 2
+            )
+            return endpoint, sort or None, unserialize_bookmark(marker_serialized)
         except (TypeError, ValueError, KeyError, BadBookmark) as ex:
             raise ValidationError("Invalid cursor") from ex
 
 
+class SyncToken(fields.Field[dict]):
+    """Opaque delta sync watermark: the keyset marker reached in each change stream."""
+
+    def _serialize(self, markers, attr, obj, **kwargs):
+        if markers is None:
+            return None
+
+        bookmarks = {
+            stream: serialize_bookmark(marker) for stream, marker in markers.items()
+        }
+        bytes = json.dumps(bookmarks, separators=(",", ":")).encode("utf-8")
+        return base64.urlsafe_b64encode(bytes).decode("utf-8")
+
+    def _deserialize(self, value, attr, data, **kwargs):
+        try:
+            bookmarks = json.loads(base64.urlsafe_b64decode(value))
+            if not isinstance(bookmarks, dict):
+                raise ValueError("Token is not a mapping")
+            return {
+                stream: unserialize_bookmark(bookmark)
+                for stream, bookmark in bookmarks.items()
+            }
+        except (TypeError, ValueError, KeyError, BadBookmark) as ex:
+            raise ValidationError("Invalid token") from ex
+
+
+class Language(fields.Field[str]):
+    """ISO 639-1 code in the API, text search configuration in the database."""
+
+    _CODES = {config: code for code, config in SEARCH_LANGUAGES.items()}
+
+    def _serialize(self, config, attr, obj, **kwargs):
+        if config is None:
+            return None
+        return self._CODES.get(config, config)
+
+    def _deserialize(self, code, attr, data, **kwargs):
+        try:
+            return SEARCH_LANGUAGES[code]
+        except (KeyError, TypeError) as ex:
+            raise ValidationError(
+                f"Must be one of: {', '.join(SEARCH_LANGUAGES)}."
+            ) from ex
+
+
 class CategoryOut(SQLAlchemyAutoSchema):
     class Meta:
         model = Category
@@ -40,6 +111,7 @@ class CategoryOut(SQLAlchemyAutoSchema):
 
 class CategoriesOut(Schema):
     categories = fields.List(fields.Nested(CategoryOut))
+    cursor = Cursor()
 
 
 class CategoryIn(SQLAlchemySchema):
@@ -57,6 +129,7 @@ class SubcategoryOut(SQLAlchemyAutoSchema):
 
 class SubcategoriesOut(Schema):
     subcategories = fields.List(fields.Nested(SubcategoryOut))
+    cursor = Cursor()
 
 
 class SubcategoryIn(SQLAlchemySchema):
@@ -68,33 +141,157 @@ class SubcategoryIn(SQLAlchemySchema):
     products = fields.List(fields.Int())
 
 
+class ProductIdsIn(Schema):
+    products = fields.List(
+        fields.Int(), required=True, validate=validate.Length(min=1, max=10000)
+    )
+
+
+class LinkedOut(Schema):
+    inserted = fields.Int()
+    skipped = fields.Int()  # already linked
+
+
+class UnlinkedOut(Schema):
+    deleted = fields.Int()
+    skipped = fields.Int()  # not linked
+
+
 class ProductOut(SQLAlchemyAutoSchema):
     class Meta:
         model = Product
-        exclude = ("search_vector",)
+        exclude = ("search_vector", "name_vector")
+
+    language = Language()
+    # only with ?include=, see ProductIncludeArgs
+    subcategory_ids = fields.List(fields.Int(), dump_only=True)
+    category_ids = fields.List(fields.Int(), dump_only=True)
 
 
 class ProductsOut(Schema):
     products = fields.List(fields.Nested(ProductOut))
+    sort = fields.Str()
     cursor = Cursor()
 
 
+class TombstoneOut(SQLAlchemySchema):
+    class Meta:
+        model = Tombstone
+
+    id = auto_field("entity_id")
+    deleted_at = auto_field()
+
+
+class ProductChangesOut(Schema):
+    products = fields.List(fields.Nested(ProductOut))
+    deleted = fields.List(fields.Nested(TombstoneOut))
+    # pass as `since` on the next pull
+    since = SyncToken()
+    has_more = fields.Bool()
+
+
 class ProductIn(SQLAlchemySchema):
     class Meta:
         model = Product
 
     name = auto_field(pre_load=str.strip, validate=validate.Length(min=1))
     description = auto_field(pre_load=lambda x: x.strip() if isinstance(x, str) else x)
+    language = Language()
     subcategories = fields.List(fields.Int())
 
 
+class ProductHighlightOut(Schema):
+    name = fields.Str(metadata={"description": "HTML, matches wrapped in <b>"})
+    description = fields.Str(metadata={"description": "HTML, matches wrapped in <b>"})
+
+
+class ProductSearchResultOut(ProductOut):
+    # only present when highlighting is requested
+    highlight = fields.Nested(ProductHighlightOut)
+
+
+class ProductSearchOut(ProductsOut):
+    products = fields.List(fields.Nested(ProductSearchResultOut))
+
+
 class SearchArgs(Schema):
     q = fields.Str(required=True, pre_load=str.strip, validate=validate.Length(min=1))
+    # falls back to Accept-Language, then DEFAULT_SEARCH_LANGUAGE
+    lang = Language(load_default=None)
+    highlight = fields.Bool(load_default=False)
+    # ts_headline fragment options, used only with highlight
+    max_words = fields.Int(load_default=35, validate=validate.Range(min=2, max=100))
+    max_fragments = fields.Int(load_default=0, validate=validate.Range(min=0, max=10))
+
+
+class SearchAnalyticsArgs(Schema):
+    limit = fields.Int(load_default=10, validate=validate.Range(min=1, max=100))
+    days = fields.Int(load_default=7, validate=validate.Range(min=1, max=90))
+
+
+class SearchQueryStatsOut(Schema):
+    query = fields.Str()
+    count = fields.Int()
+    avg_latency_ms = fields.Float()
+    p95_latency_ms = fields.Float()
+
+
+class SearchAnalyticsOut(Schema):
+    hot = fields.List(fields.Nested(SearchQueryStatsOut))
+    zero_results = fields.List(fields.Nested(SearchQueryStatsOut))
 
 
 class PaginationArgs(Schema):
     cursor = Cursor(load_default=None)
 
+    @post_load
+    def _unwrap_cursor(self, data, **kwargs):
+        if data["cursor"] is not None:
+            endpoint, sort, marker = data["cursor"]
+            if endpoint != request.endpoint:
+                raise ValidationError(
+                    "Cursor was issued for a different endpoint", "cursor"
+                )
+            if sort != data.get("sort"):
+                raise ValidationError(
+                    "Cursor was issued for a different sort order", "cursor"
+                )
+            data["cursor"] = marker
+        return data
+
+
+class ProductIncludeArgs(Schema):
+    # comma separated, e.g. include=subcategory_ids,category_ids
+    include = DelimitedList(
+        fields.Str(validate=validate.OneOf(PRODUCT_INCLUDES)), load_default=()
+    )
+
+
+class ProductListArgs(PaginationArgs, ProductIncludeArgs):
+    # "-" prefix for descending order
+    sort = fields.Str(load_default="id", validate=validate.OneOf(PRODUCT_SORTS))
+
+
+class CollectionArgs(PaginationArgs):
+    # stream every row in one response instead of a page, for small collections
+    fetch_all = fields.Bool(data_key="all", load_default=False)
+
+
+class ChangesArgs(Schema):
+    # no token: start from the beginning
+    since = SyncToken(load_default=dict)
+
+
+class LinkArgs(Schema):
+    # "ignore" skips already linked pairs instead of answering 409
+    on_conflict = fields.Str(
+        load_default="error", validate=validate.OneOf(["error", "ignore"])
+    )
+    # "replace" makes the given ids the exact set of links, an empty list unlinks all
+    mode = fields.Str(
+        load_default="extend", validate=validate.OneOf(["extend", "replace"])
+    )
+
 
 class AuthIn(SQLAlchemySchema):
     class Meta:
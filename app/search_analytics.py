@@ -0,0 +1,156 @@
+import atexit
+import os
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from flask import Flask, current_app
+from sqlalchemy import delete, func, insert, select
+
+from app import db
+from app.models import SearchLog
+
+
+class SearchAnalytics:
+    """Buffers product search events in memory and writes them to search_log in batches.
+
+    Recording only appends to a buffer. A background thread flushes it every
+    SEARCH_ANALYTICS_FLUSH_INTERVAL seconds, or earlier once SEARCH_ANALYTICS_BATCH_SIZE
+    events are pending, so the request path never waits on the insert. Each flush also
+    prunes events older than SEARCH_ANALYTICS_RETENTION.
+    """
+
+    _MAX_QUERY_LENGTH = 200
+    _WHITESPACE = re.compile(r"\s+")
+
+    def __init__(self, app: Flask):
+        self.app = app
+        self.flush_interval = app.config.get("SEARCH_ANALYTICS_FLUSH_INTERVAL", 10)
+        self.batch_size = app.config.get("SEARCH_ANALYTICS_BATCH_SIZE", 500)
+        self.max_pending = app.config.get("SEARCH_ANALYTICS_MAX_PENDING", 10000)
+        self.retention = app.config.get(
+            "SEARCH_ANALYTICS_RETENTION", timedelta(days=90)
+        )
+        self.dropped = 0
+
+        self._pending = []
+        self._lock = threading.Lock()
+        # held for the whole write, flush() returns once pending events are stored
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+
+        atexit.register(self.flush)
+
+        # Store instance on app for easy access (Flask extension pattern)
+        app.extensions["search_analytics"] = self
+
+    @staticmethod
+    def normalize_query(query):
+        normalized = SearchAnalytics._WHITESPACE.sub(" ", query).strip().lower()
+        return normalized[: SearchAnalytics._MAX_QUERY_LENGTH]
+
+    @staticmethod
+    def result_bucket(result_count, per_page):
+        if result_count == 0:
+            return "0"
+        if result_count < per_page:
+            return f"1-{per_page - 1}"
+        return f"{per_page}+"
+
+    def record(self, query, result_count, per_page, latency_ms):
+        event = {
+            "normalized_query": self.normalize_query(query),
+            "result_bucket": self.result_bucket(result_count, per_page),
+            "latency_ms": latency_ms,
+            # when the search ran, not when the batch is written
+            "created_at": datetime.now(timezone.utc),
+        }
+
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                return
+            self._pending.append(event)
+            full = len(self._pending) >= self.batch_size
+
+        self._ensure_worker()
+        if full:
+            self._wakeup.set()
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                events, self._pending = self._pending, []
+
+            if not events:
+                return
+
+            try:
+                with self.app.app_context():
+                    with db.engine.begin() as connection:
+                        connection.execute(
+                            delete(SearchLog).where(
+                                SearchLog.created_at < func.now() - self.retention
+                            )
+                        )
+                        connection.execute(insert(SearchLog), events)
+            except Exception:
+                self.app.logger.exception(
+                    f"Could not write {len(events)} search analytics events"
+                )
+
+    def _ensure_worker(self):
+        # Start lazily, and again in a forked worker, since threads do not survive fork
+        if self._thread is not None and self._pid == os.getpid():
+            return
+
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._run, name="search-analytics", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    @staticmethod
+    def top_queries(limit, since, zero_results=False):
+        """Most frequent normalized queries recorded after `since`."""
+        count = func.count().label("count")
+        stmt = (
+            select(
+                SearchLog.normalized_query.label("query"),
+                count,
+                func.round(func.avg(SearchLog.latency_ms)).label("avg_latency_ms"),
+                func.percentile_cont(0.95)
+                .within_group(SearchLog.latency_ms)
+                .label("p95_latency_ms"),
+            )
+            .where(SearchLog.created_at >= since)
+            .group_by(SearchLog.normalized_query)
+            .order_by(count.desc(), SearchLog.normalized_query)
+            .limit(limit)
+        )
+        if zero_results:
+            stmt = stmt.where(SearchLog.result_bucket == "0")
+
+        return db.session.execute(stmt).mappings().all()
+
+
+def record_search(query, result_count, per_page, started_at):
+    """Record a search if analytics are enabled for the current app."""
+    analytics = current_app.extensions.get("search_analytics")
+    if analytics is None:
+        return
+
+    latency_ms = round((time.perf_counter() - started_at) * 1000, 2)
+    analytics.record(query, result_count, per_page, latency_ms)
@@ -0,0 +1,71 @@
+from functools import cache
+
+from flask import current_app
+from marshmallow import fields
+from sqlalchemy import select
+
+from app.schemas import CategoryOut, ProductOut, SubcategoryOut
+
+# dumped as they come from the database
+_PLAIN_FIELDS = (fields.Integer, fields.String, fields.Boolean, fields.Float)
+
+
+class RowSerializer:
+    """Dumps Core rows the way an SQLAlchemyAutoSchema dumps ORM objects.
+
+    The columns to select and a converter per field are worked out once from the
+    schema. Dumping a row is then a loop over a tuple, without building ORM instances
+    or going through marshmallow for every row.
+    """
+
+    def __init__(self, schema):
+        table = schema.opts.model.__table__
+        self.columns = []
+        self._fields = []
+        for name, field in schema.dump_fields.items():
+            column = table.c.get(field.attribute or name)
+            # not stored on the table, like ProductOut.subcategory_ids
+            if column is None:
+                continue
+            self.columns.append(column)
+            self._fields.append((field.data_key or name, self._converter(name, field)))
+
+    @staticmethod
+    def _converter(name, field):
+        if isinstance(field, _PLAIN_FIELDS):
+            return None
+        if isinstance(field, fields.DateTime) and field.format in (None, "iso"):
+            return fields.DateTime.SERIALIZATION_FUNCS["iso"]
+        return lambda value: field._serialize(value, name, None)
+
+    def select(self):
+        """select() of the schema's columns, in the order __call__ expects."""
+        return select(*self.columns)
+
+    def __call__(self, row):
+        # sqlakeyset may append its own columns to the row, zip() stops before them
+        return {
+            key: value if convert is None or value is None else convert(value)
+            for (key, convert), value in zip(self._fields, row)
+        }
+
+
+PRODUCT_ROWS = RowSerializer(ProductOut())
+CATEGORY_ROWS = RowSerializer(CategoryOut())
+SUBCATEGORY_ROWS = RowSerializer(SubcategoryOut())
+
+
+@cache
+def _envelope(envelope_schema, key):
+    return envelope_schema(exclude=(key,))
+
+
+def rows_response(envelope_schema, key, rows, serialize, **envelope):
+    """JSON response of `envelope_schema`, with `rows` dumped by `serialize` as `key`.
+
+    Views returning this bypass their @bp.response schema, which would dump every
+    row with marshmallow again.
+    """
+    data = _envelope(envelope_schema, key).dump(envelope)
+    data[key] = [serialize(row) for row in rows]
+    return current_app.json.response(data)
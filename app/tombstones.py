@@ -0,0 +1,24 @@
+from flask import current_app
+from sqlalchemy import delete, func
+
+from app import db
+from app.models import Tombstone
+
+
+def record_deletion(entity):
+    """Add a tombstone for a deleted entity to the current transaction.
+
+    Call before commit, so the tombstone is stored together with the delete or not at
+    all. Tombstones of the same type older than TOMBSTONE_RETENTION are pruned on the
+    way, which keeps the table small without a separate cleanup job.
+    """
+    entity_type = entity.__tablename__
+    retention = current_app.config["TOMBSTONE_RETENTION"]
+
+    db.session.execute(
+        delete(Tombstone).where(
+            Tombstone.entity_type == entity_type,
+            Tombstone.deleted_at < func.now() - retention,
+        )
+    )
+    db.session.add(Tombstone(entity_type=entity_type, entity_id=entity.id))
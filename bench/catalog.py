@@ -0,0 +1,275 @@
+"""Generate a large synthetic catalog with a production-like shape.
+
+Writes --categories categories, --subcategories subcategories and --products products
+with their links into an empty, migrated database at SQLALCHEMY_DATABASE_URI, using
+COPY. Everything is drawn from a random generator seeded with --seed, so the same
+arguments always produce the same catalog.
+
+    python -m bench.catalog --products 1000000
+
+The catalog has this shape:
+- Product names are a brand, words and a model code. Brands and words follow a power
+  law, and the model code keeps every name unique.
+- Description lengths vary and about 5% are missing. Description words follow a
+  power law too.
+- Subcategory membership is skewed. A few subcategories hold most products, like
+  bestseller categories, and most products are in one or two subcategories.
+- created_at is spread over the two years before a fixed date, and updated_at falls
+  after it.
+
+--truncate empties the catalog tables first. Tables are never dropped, the schema
+stays under Alembic.
+"""
+
+import argparse
+import bisect
+import itertools
+import random
+import time
+from array import array
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text
+
+from app import create_app, db
+from app.models import Category, Product, Subcategory
+
+_BRANDS = [
+    "Acme", "Northwind", "Contoso", "Globex", "Initech", "Umbrella", "Hooli",
+    "Vandelay", "Stark", "Wayne", "Tyrell", "Cyberdyne", "Soylent", "Aperture",
+    "Monarch", "Gringotts",
+]  # fmt: skip
+
+_ADJECTIVES = [
+    "wireless", "smart", "pro", "mini", "ultra", "lite", "portable", "compact",
+    "classic", "premium", "ergonomic", "rugged", "slim", "digital", "quiet", "solar",
+    "modular",
+]  # fmt: skip
+
+_NOUNS = [
+    "phone", "case", "charger", "cable", "speaker", "headphones", "watch", "camera",
+    "lens", "tripod", "keyboard", "mouse", "monitor", "laptop", "tablet", "stylus",
+    "router", "drone", "projector", "microphone", "turntable", "thermostat", "doorbell",
+    "telescope", "kettle", "blender", "backpack", "lamp", "desk", "chair",
+]  # fmt: skip
+
+_DESCRIPTION_WORDS = _ADJECTIVES + _NOUNS + [
+    "with", "and", "for", "the", "a", "fast", "battery", "hours", "warranty",
+    "included", "compatible", "design", "quality", "easy", "setup", "home", "office",
+    "travel", "water", "resistant", "bluetooth", "usb", "color", "black", "white",
+    "steel",
+]  # fmt: skip
+
+_DESCRIPTION_MAX_LENGTH = Product.description.type.length
+_MISSING_DESCRIPTION = 0.05
+_EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+_CREATED_SPAN = timedelta(days=730)
+
+
+def _power_law(population, rng, exponent=1.2):
+    """Draws items of `population`, the item at rank r with weight 1 / r ** exponent."""
+    cum_weights = list(
+        itertools.accumulate(
+            1 / rank**exponent for rank in range(1, len(population) + 1)
+        )
+    )
+    total = cum_weights[-1]
+
+    def draw():
+        return population[bisect.bisect(cum_weights, rng.random() * total)]
+
+    return draw
+
+
+def _escape(value):
+    # COPY text format
+    if value is None:
+        return r"\N"
+    return value.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+
+
+class _CopyReader:
+    """File-like object over an iterable of rows, for cursor.copy_expert()."""
+
+    def __init__(self, rows):
+        self._lines = (
+            "\t".join(_escape(value) for value in row).encode() + b"\n" for row in rows
+        )
+        self._buffer = b""
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            line = next(self._lines, None)
+            if line is None:
+                break
+            self._buffer += line
+
+        if size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+class CatalogGenerator:
+    def __init__(self, num_products, num_categories, num_subcategories, seed):
+        self.num_products = num_products
+        self.num_categories = num_categories
+        self.num_subcategories = num_subcategories
+        self.rng = random.Random(seed)
+
+        self._brand = _power_law(_BRANDS, self.rng)
+        self._adjective = _power_law(_ADJECTIVES, self.rng)
+        self._noun = _power_law(_NOUNS, self.rng)
+        self._description_word = _power_law(_DESCRIPTION_WORDS, self.rng)
+        # subcategory ids in popularity order, shuffled so id does not imply rank
+        popular = list(range(1, num_subcategories + 1))
+        self.rng.shuffle(popular)
+        self._subcategory = _power_law(popular, self.rng)
+
+    def categories(self):
+        for id in range(1, self.num_categories + 1):
+            yield str(id), f"Category {id}"
+
+    def subcategories(self):
+        for id in range(1, self.num_subcategories + 1):
+            yield str(id), f"Subcategory {id}"
+
+    def category_subcategories(self):
+        for subcategory_id in range(1, self.num_subcategories + 1):
+            k = min(self.num_categories, 1 + int(self.rng.expovariate(2)))
+            for category_id in sorted(
+                self.rng.sample(range(1, self.num_categories + 1), k)
+            ):
+                yield str(category_id), str(subcategory_id)
+
+    def _name(self, id):
+        # base 36 of the id, unique per product
+        code = ""
+        while id:
+            id, digit = divmod(id, 36)
+            code = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"[digit] + code
+        return (
+            f"{self._brand()} {self._adjective().title()} {self._noun().title()} {code}"
+        )
+
+    def _description(self):
+        if self.rng.random() < _MISSING_DESCRIPTION:
+            return None
+        # log-normal, most descriptions are short to medium, some hit the limit
+        length = min(_DESCRIPTION_MAX_LENGTH, int(self.rng.lognormvariate(5, 0.6)))
+        words = []
+        size = -1
+        while size + 1 < length:
+            word = self._description_word()
+            if size + 1 + len(word) > length:
+                break
+            words.append(word)
+            size += 1 + len(word)
+        return " ".join(words).capitalize() or None
+
+    def products(self):
+        """Product rows. Their subcategory links are kept for links()."""
+        # as ints, a million products have around 1.5 million links
+        self._link_subcategories = array("i")
+        self._link_products = array("i")
+        for id in range(1, self.num_products + 1):
+            created_at = _EPOCH - _CREATED_SPAN * self.rng.random()
+            updated_at = created_at + (_EPOCH - created_at) * self.rng.random() ** 4
+            yield (
+                str(id),
+                self._name(id),
+                self._description(),
+                created_at.isoformat(),
+                updated_at.isoformat(),
+            )
+
+            k = min(self.num_subcategories, 1 + int(self.rng.expovariate(1.5)))
+            subcategory_ids = set()
+            while len(subcategory_ids) < k:
+                subcategory_ids.add(self._subcategory())
+            for subcategory_id in sorted(subcategory_ids):
+                self._link_subcategories.append(subcategory_id)
+                self._link_products.append(id)
+
+    def links(self):
+        """Subcategory links of the products, call after products() is consumed."""
+        for subcategory_id, product_id in zip(
+            self._link_subcategories, self._link_products
+        ):
+            yield str(subcategory_id), str(product_id)
+
+
+def _copy(cursor, table, columns, rows):
+    start = time.perf_counter()
+    cursor.copy_expert(
+        f"COPY {table} ({', '.join(columns)}) FROM STDIN", _CopyReader(rows)
+    )
+    elapsed = time.perf_counter() - start
+    print(f"copied {cursor.rowcount} rows into {table} in {elapsed:.1f}s")
+
+
+def _reset_sequence(cursor, table):
+    cursor.execute(
+        f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+        f"(SELECT coalesce(max(id), 0) + 1 FROM {table}), false)"
+    )
+
+
+def generate(generator, truncate):
+    catalog = [Category, Subcategory, Product]
+    tables = ", ".join(model.__tablename__ for model in catalog)
+    if truncate:
+        db.session.execute(text(f"TRUNCATE {tables} CASCADE"))
+    elif any(db.session.query(model.query.exists()).scalar() for model in catalog):
+        raise SystemExit("catalog tables are not empty, pass --truncate to replace")
+
+    cursor = db.session.connection().connection.cursor()
+    _copy(cursor, "category", ("id", "name"), generator.categories())
+    _copy(cursor, "subcategory", ("id", "name"), generator.subcategories())
+    _copy(
+        cursor,
+        "category_subcategory",
+        ("category_id", "subcategory_id"),
+        generator.category_subcategories(),
+    )
+    _copy(
+        cursor,
+        "product",
+        ("id", "name", "description", "created_at", "updated_at"),
+        generator.products(),
+    )
+    _copy(
+        cursor,
+        "subcategory_product",
+        ("subcategory_id", "product_id"),
+        generator.links(),
+    )
+    for model in catalog:
+        _reset_sequence(cursor, model.__tablename__)
+    db.session.commit()
+
+    db.session.execute(
+        text(f"ANALYZE {tables}, category_subcategory, subcategory_product")
+    )
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=1_000_000)
+    parser.add_argument("--categories", type=int, default=50)
+    parser.add_argument("--subcategories", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--truncate", action="store_true")
+    args = parser.parse_args()
+
+    generator = CatalogGenerator(
+        args.products, args.categories, args.subcategories, args.seed
+    )
+    app = create_app()
+    with app.app_context():
+        generate(generator, args.truncate)
+
+
+if __name__ == "__main__":
+    main()
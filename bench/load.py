@@ -0,0 +1,384 @@
+"""Load test the API with a weighted mix of catalog, search and login requests.
+
+Serves the app from a threaded in-process HTTP server and replays --requests requests
+from --concurrency client threads, each with a keep-alive connection. The mix and the
+ids in each path are drawn from a seeded random generator, so runs are reproducible.
+Prints a JSON report with RPS, p50/p95/p99 latency and SQL statements per request for
+every endpoint, for comparing runs.
+
+    python -m bench.load --testcontainers --products 100000 --concurrency 8
+
+With --testcontainers the catalog is seeded into a throwaway Postgres container,
+otherwise into the migrated database at SQLALCHEMY_DATABASE_URI, where existing rows
+are kept and the catalog is topped up to the requested size. The app runs with the
+production config, so results match what is deployed: features off by default there,
+like the catalog cache and search analytics, are only on with their flag, and nothing
+is reported to Sentry.
+"""
+
+import argparse
+import http.client
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+from urllib.parse import urlencode
+
+from flask import g, has_request_context
+from sqlalchemy import event, select, text
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from app import create_app, db
+from app.models import PRODUCT_SORTS, Category, Subcategory
+from bench.search import _QUERIES, seed
+
+QUERY_COUNT_HEADER = "X-Query-Count"
+
+# endpoint -> share of the requests, overridden with --mix name=weight,...
+DEFAULT_MIX = {
+    "products": 30,
+    "category_products": 15,
+    "subcategory_products": 15,
+    "search": 30,
+    "login": 10,
+}
+
+_BENCH_EMAIL = "bench@example.com"
+_BENCH_PASSWORD = "bench-password"
+
+_SEED_CATEGORIES_SQL = text(
+    """
+    INSERT INTO category (name)
+    SELECT 'Bench category ' || g FROM generate_series(:start, :stop) AS g
+    """
+)
+
+_SEED_SUBCATEGORIES_SQL = text(
+    """
+    INSERT INTO subcategory (name)
+    SELECT 'Bench subcategory ' || g FROM generate_series(:start, :stop) AS g
+    """
+)
+
+# Rows without links get 1 to `links` random ones, random() is evaluated per row
+_SEED_LINKS_SQL = """
+    INSERT INTO {association} ({owner_column}, {linked_column})
+    SELECT o.id, ids[1 + floor(random() * cardinality(ids))::int]
+    FROM {owner} AS o,
+        generate_series(1, 1 + o.id % :links),
+        (SELECT array_agg(id) AS ids FROM {linked}) AS l
+    WHERE NOT EXISTS (
+        SELECT 1 FROM {association} AS a WHERE a.{owner_column} = o.id
+    )
+    ON CONFLICT DO NOTHING
+"""
+
+
+def _top_up(model, sql, count):
+    existing = db.session.scalar(select(db.func.count()).select_from(model))
+    if existing < count:
+        db.session.execute(sql, {"start": existing + 1, "stop": count})
+
+
+def _link(association, owner, owner_column, linked, linked_column, links):
+    db.session.execute(
+        text(
+            _SEED_LINKS_SQL.format(
+                association=association,
+                owner=owner,
+                owner_column=owner_column,
+                linked=linked,
+                linked_column=linked_column,
+            )
+        ),
+        {"links": links},
+    )
+
+
+def seed_catalog(num_products, num_categories, num_subcategories):
+    """Top up the catalog and link every product and subcategory."""
+    _top_up(Category, _SEED_CATEGORIES_SQL, num_categories)
+    _top_up(Subcategory, _SEED_SUBCATEGORIES_SQL, num_subcategories)
+    db.session.commit()
+    seed(num_products)
+
+    _link(
+        "category_subcategory",
+        owner="subcategory",
+        owner_column="subcategory_id",
+        linked="category",
+        linked_column="category_id",
+        links=2,
+    )
+    _link(
+        "subcategory_product",
+        owner="product",
+        owner_column="product_id",
+        linked="subcategory",
+        linked_column="subcategory_id",
+        links=3,
+    )
+    db.session.commit()
+
+    db.session.execute(text("ANALYZE"))
+    db.session.commit()
+
+
+def _count_queries(app):
+    """Send the number of SQL statements of each request in QUERY_COUNT_HEADER."""
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        # background threads, like the search analytics writer, have no request
+        if has_request_context():
+            g.bench_queries = g.get("bench_queries", 0) + 1
+
+    def after_request(response):
+        response.headers[QUERY_COUNT_HEADER] = str(g.get("bench_queries", 0))
+        return response
+
+    event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+    app.after_request(after_request)
+
+
+class _KeepAliveHandler(WSGIRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class _Plan:
+    """Draws the requests of a run from `mix` with a seeded random generator."""
+
+    def __init__(self, mix, category_ids, subcategory_ids, seed):
+        self.names = list(mix)
+        self.weights = list(mix.values())
+        self.category_ids = category_ids
+        self.subcategory_ids = subcategory_ids
+        self.random = random.Random(seed)
+
+    def requests(self, count):
+        return [self._request() for _ in range(count)]
+
+    def _request(self):
+        name = self.random.choices(self.names, self.weights)[0]
+        if name == "products":
+            sort = self.random.choice(list(PRODUCT_SORTS))
+            return name, "GET", f"/products?{urlencode({'sort': sort})}", None
+        if name == "category_products":
+            id = self.random.choice(self.category_ids)
+            return name, "GET", f"/categories/{id}/products", None
+        if name == "subcategory_products":
+            id = self.random.choice(self.subcategory_ids)
+            return name, "GET", f"/subcategories/{id}/products", None
+        if name == "search":
+            q = self.random.choice(_QUERIES)
+            return name, "GET", f"/products/search?{urlencode({'q': q})}", None
+        body = {"email": _BENCH_EMAIL, "password": _BENCH_PASSWORD}
+        return name, "POST", "/auth/login", json.dumps(body)
+
+
+def _replay(port, requests, results):
+    connection = http.client.HTTPConnection("127.0.0.1", port)
+    try:
+        for name, method, path, body in requests:
+            headers = {"Content-Type": "application/json"} if body else {}
+            start = time.perf_counter()
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            elapsed_ms = (time.perf_counter() - start) * 1000
+
+            queries = int(response.getheader(QUERY_COUNT_HEADER, 0))
+            results.append((name, response.status, elapsed_ms, queries))
+    finally:
+        connection.close()
+
+
+def _run(port, plans, count):
+    """Replay `count` requests, spread as evenly as possible over the `plans`."""
+    per_client, remainder = divmod(count, len(plans))
+    results = []
+    threads = [
+        threading.Thread(
+            target=_replay,
+            args=(port, plan.requests(per_client + (i < remainder)), results),
+        )
+        for i, plan in enumerate(plans)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, time.perf_counter() - start
+
+
+def _percentiles(timings):
+    if len(timings) < 2:
+        return {f"p{p}_ms": round(timings[0], 2) for p in (50, 95, 99)}
+    cuts = statistics.quantiles(timings, n=100, method="inclusive")
+    return {f"p{p}_ms": round(cuts[p - 1], 2) for p in (50, 95, 99)}
+
+
+def _summary(results, elapsed):
+    # client threads that failed to connect leave no results
+    if not results:
+        return {"requests": 0, "errors": 0, "rps": 0.0}
+    timings = [elapsed_ms for _, _, elapsed_ms, _ in results]
+    return {
+        "requests": len(results),
+        "errors": sum(status >= 400 for _, status, _, _ in results),
+        "rps": round(len(results) / elapsed, 1),
+        **_percentiles(timings),
+        "queries_per_request": round(
+            statistics.mean(queries for _, _, _, queries in results), 2
+        ),
+    }
+
+
+def report(results, elapsed):
+    by_endpoint = defaultdict(list)
+    for result in results:
+        by_endpoint[result[0]].append(result)
+
+    return {
+        "elapsed_s": round(elapsed, 2),
+        "total": _summary(results, elapsed),
+        "endpoints": {
+            name: _summary(by_endpoint[name], elapsed) for name in sorted(by_endpoint)
+        },
+    }
+
+
+def _non_negative_int(value):
+    number = int(value)
+    if number < 0:
+        raise argparse.ArgumentTypeError("expected 0 or more")
+    return number
+
+
+def _positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError("expected 1 or more")
+    return number
+
+
+def _parse_mix(value):
+    mix = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        if name not in DEFAULT_MIX or not weight.isdigit():
+            raise argparse.ArgumentTypeError(
+                f"expected name=weight with a name out of {', '.join(DEFAULT_MIX)}"
+            )
+        mix[name] = int(weight)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--testcontainers", action="store_true")
+    parser.add_argument("--products", type=int, default=100_000)
+    parser.add_argument("--categories", type=int, default=20)
+    parser.add_argument("--subcategories", type=int, default=200)
+    parser.add_argument("--requests", type=_positive_int, default=5000)
+    parser.add_argument("--warmup", type=_non_negative_int, default=500)
+    parser.add_argument("--concurrency", type=_positive_int, default=8)
+    parser.add_argument("--mix", type=_parse_mix, default=DEFAULT_MIX)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--catalog-cache", action="store_true")
+    parser.add_argument("--search-analytics", action="store_true")
+    parser.add_argument("--output", help="write the JSON report here, not to stdout")
+    args = parser.parse_args()
+
+    with ExitStack() as stack:
+        if args.testcontainers:
+            from testcontainers.postgres import PostgresContainer
+
+            pg = stack.enter_context(PostgresContainer("postgres:16"))
+            database_uri = pg.get_connection_url()
+        else:
+            database_uri = os.environ["SQLALCHEMY_DATABASE_URI"]
+
+        app = create_app(
+            "production",
+            SQLALCHEMY_DATABASE_URI=database_uri,
+            # tokens of this run only
+            JWT_SECRET_KEY=os.urandom(24).hex(),
+            SENTRY_DSN=None,
+            CATALOG_CACHE=args.catalog_cache,
+            SEARCH_ANALYTICS=args.search_analytics,
+        )
+        app.logger.setLevel(logging.CRITICAL)
+        stack.enter_context(app.app_context())
+        _count_queries(app)
+
+        if args.testcontainers:
+            from flask_migrate import upgrade
+
+            upgrade()
+
+        print("seeding catalog", file=sys.stderr)
+        seed_catalog(args.products, args.categories, args.subcategories)
+        # ordered, so the seeded plans pick the same ids on every run
+        category_ids = db.session.scalars(select(Category.id).order_by("id")).all()
+        subcategory_ids = db.session.scalars(
+            select(Subcategory.id).order_by("id")
+        ).all()
+        db.session.remove()
+
+        # 409 when it exists from an earlier run
+        app.test_client().post(
+            "/auth/register", json={"email": _BENCH_EMAIL, "password": _BENCH_PASSWORD}
+        )
+
+        server = make_server(
+            "127.0.0.1", 0, app, threaded=True, request_handler=_KeepAliveHandler
+        )
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        stack.callback(server.shutdown)
+
+        plans = [
+            _Plan(args.mix, category_ids, subcategory_ids, seed=args.seed + client)
+            for client in range(args.concurrency)
+        ]
+        print(f"warming up with {args.warmup} requests", file=sys.stderr)
+        _run(server.server_port, plans, args.warmup)
+
+        print(f"replaying {args.requests} requests", file=sys.stderr)
+        results, elapsed = _run(server.server_port, plans, args.requests)
+
+    result = report(results, elapsed) | {
+        "config": {
+            key: getattr(args, key)
+            for key in (
+                "products",
+                "categories",
+                "subcategories",
+                "requests",
+                "concurrency",
+                "mix",
+                "seed",
+                "catalog_cache",
+                "search_analytics",
+            )
+        }
+    }
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
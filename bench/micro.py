@@ -0,0 +1,135 @@
+"""Micro-benchmarks of per-request CPU work, with fixed inputs and no database.
+
+Covers cursor encoding and decoding, dumping a page of products, scrubbing logged
+request data and email normalization. Run with pytest-benchmark:
+
+    pytest bench/micro.py --benchmark-autosave
+
+Later runs fail when a benchmark got slower than the last saved run by more than the
+given threshold:
+
+    pytest bench/micro.py --benchmark-compare --benchmark-compare-fail=median:15%
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from flask import Flask
+from sqlakeyset import Marker, serialize_bookmark
+
+from app.middleware.request_logger import DataScrubber
+from app.models import Product, User
+from app.schemas import Cursor, ProductsOut
+from app.serializers import PRODUCT_ROWS
+
+_CREATED_AT = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+class _Paging:
+    """The parts of sqlakeyset's Paging that ProductsOut dumps, for fixed markers."""
+
+    has_next = has_previous = True
+
+    def __init__(self, last, first):
+        self.marker_next = Marker((last.updated_at, last.id), backwards=False)
+        self.marker_previous = Marker((first.updated_at, first.id), backwards=True)
+
+    @property
+    def bookmark_next(self):
+        return serialize_bookmark(self.marker_next)
+
+    @property
+    def bookmark_previous(self):
+        return serialize_bookmark(self.marker_previous)
+
+
+@pytest.fixture(scope="module")
+def products():
+    return [
+        Product(
+            id=i,
+            name=f"Product {i} wireless charger",
+            description=f"Fast wireless charger number {i}, works with phones. " * 8,
+            language="english",
+            created_at=_CREATED_AT + timedelta(minutes=i),
+            updated_at=_CREATED_AT + timedelta(minutes=i, seconds=30),
+        )
+        for i in range(1, 11)
+    ]
+
+
+@pytest.fixture(scope="module")
+def page(products):
+    return {
+        "products": products,
+        "sort": "updated_at",
+        "cursor": _Paging(products[-1], products[0]),
+    }
+
+
+@pytest.fixture(scope="module")
+def app():
+    return Flask(__name__)
+
+
+def test_cursor_serialize(benchmark, app, page):
+    cursor = Cursor()
+    # cursors are bound to the endpoint of the request
+    with app.test_request_context():
+        result = benchmark(cursor.serialize, "cursor", page)
+    assert result["next"] and result["prev"]
+
+
+def test_cursor_deserialize(benchmark, app, page):
+    cursor = Cursor()
+    with app.test_request_context():
+        encoded = cursor.serialize("cursor", page)["next"]
+    _, sort, marker = benchmark(cursor.deserialize, encoded)
+    assert sort == "updated_at"
+    assert marker.place[1] == 10
+
+
+def test_products_dump(benchmark, app, page):
+    schema = ProductsOut()
+    with app.test_request_context():
+        data = benchmark(schema.dump, page)
+    assert len(data["products"]) == 10
+
+
+def test_product_rows_dump(benchmark, products):
+    rows = [
+        tuple(getattr(product, column.key) for column in PRODUCT_ROWS.columns)
+        for product in products
+    ]
+    data = benchmark(lambda: [PRODUCT_ROWS(row) for row in rows])
+    assert len(data) == 10
+
+
+def test_scrub_query_string(benchmark, app):
+    query_string = "q=wireless+charger&sort=-updated_at&cursor=abc&token=secret"
+    with app.test_request_context(query_string=query_string) as ctx:
+        result = benchmark(DataScrubber.scrub_query_string, ctx.request)
+    assert "secret" not in result
+
+
+def test_scrub_body(benchmark, app):
+    body = {
+        "email": "user@example.com",
+        "password": "secret",
+        "profile": {"name": "User", "api_key": "secret", "tags": ["a", "b", "c"]},
+        "items": [{"id": i, "token": "secret"} for i in range(20)],
+    }
+    with app.test_request_context(method="POST", json=body) as ctx:
+        result = benchmark(DataScrubber.scrub_body, ctx.request)
+    assert "secret" not in result
+
+
+@pytest.mark.parametrize(
+    "email, expected",
+    [
+        ("User.Name+tag@Example.com", "user.name+tag@example.com"),
+        ("first.last+shop@gmail.com", "firstlast@gmail.com"),
+    ],
+)
+def test_normalize_email(benchmark, email, expected):
+    assert benchmark(User._normalize_email, email) == expected
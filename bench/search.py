@@ -0,0 +1,116 @@
+"""Benchmark product search against a large synthetic catalog.
+
+Compares the first-page latency of the previous search query (ts_rank over every
+match, post-filtered by a rank threshold) with the current two-phase search.
+
+    python -m bench.search --products 1000000
+
+Uses SQLALCHEMY_DATABASE_URI, which must point to a migrated database. The catalog is
+topped up to --products rows, existing rows are kept.
+"""
+
+import argparse
+import statistics
+import time
+
+from sqlakeyset import get_page
+from sqlalchemy import Numeric, cast, func, text
+
+from app import create_app, db
+from app.models import Product
+from app.routes.product import ProductSearch
+
+# Term frequencies follow a power law (random() ** 3), so the first words are very
+# common and the last ones are rare. Queries below pick terms from both ends.
+_WORDS = [
+    "phone", "case", "charger", "cable", "wireless", "smart", "pro", "mini",
+    "ultra", "lite", "speaker", "headphones", "watch", "camera", "lens", "tripod",
+    "keyboard", "mouse", "monitor", "laptop", "tablet", "stylus", "router", "drone",
+    "projector", "microphone", "turntable", "thermostat", "doorbell", "telescope",
+]  # fmt: skip
+
+_SEED_SQL = text(
+    """
+    INSERT INTO product (name, description)
+    SELECT
+        initcap(w[1 + floor(:n_words * random() ^ 3)::int]) || ' '
+            || initcap(w[1 + floor(:n_words * random() ^ 3)::int]) || ' '
+            || 'bench-' || g,
+        array_to_string(
+            ARRAY(
+                SELECT w[1 + floor(:n_words * random() ^ 3)::int]
+                FROM generate_series(1, 20 + g % 40)
+            ),
+            ' '
+        )
+    FROM generate_series(:start, :stop) AS g, (SELECT CAST(:words AS text[]) AS w) AS v
+    """
+)
+
+_QUERIES = ["phone", "wireless charger", "smart watch", "drone", "telescope"]
+
+
+def _legacy_search(search_query, min_rank=0.5):
+    ts_query = func.websearch_to_tsquery("english", search_query)
+    rank = cast(func.ts_rank(Product.search_vector, ts_query), Numeric(5, 3)).label(
+        "rank"
+    )
+    return Product.query.filter(
+        Product.search_vector.op("@@")(ts_query), rank > min_rank
+    ).order_by(rank.desc(), Product.id)
+
+
+def seed(num_products, batch_size=100_000):
+    existing = Product.query.count()
+    db.session.execute(text("SELECT setseed(0.42)"))
+    for start in range(existing + 1, num_products + 1, batch_size):
+        stop = min(start + batch_size - 1, num_products)
+        db.session.execute(
+            _SEED_SQL,
+            {"n_words": len(_WORDS), "words": _WORDS, "start": start, "stop": stop},
+        )
+        db.session.commit()
+        print(f"seeded products {start}..{stop}")
+
+    db.session.execute(text("ANALYZE product"))
+    db.session.commit()
+
+
+def _time_first_page(build_query, search_query, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        get_page(build_query(search_query), per_page=ProductSearch._PER_PAGE)
+        timings.append((time.perf_counter() - start) * 1000)
+        db.session.rollback()
+    return statistics.median(timings)
+
+
+def run(repeat):
+    ts_query = func.websearch_to_tsquery
+    print(f"{'query':<20}{'matches':>10}{'legacy ms':>12}{'current ms':>12}")
+    for search_query in _QUERIES:
+        matches = Product.query.filter(
+            Product.search_vector.op("@@")(ts_query("english", search_query))
+        ).count()
+        legacy = _time_first_page(_legacy_search, search_query, repeat)
+        current = _time_first_page(
+            lambda q: ProductSearch()._search(q, "english"), search_query, repeat
+        )
+        print(f"{search_query:<20}{matches:>10}{legacy:>12.1f}{current:>12.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        seed(args.products)
+        run(args.repeat)
+
+
+if __name__ == "__main__":
+    main()
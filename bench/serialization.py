@@ -0,0 +1,90 @@
+"""Benchmark dumping and JSON encoding of a page of products.
+
+Compares dumping --rows products with marshmallow (ORM objects) and with the
+RowSerializer of the list endpoints (Core rows), then encoding the result into a
+response with Flask's stdlib JSON provider and with OrjsonProvider.
+
+    python -m bench.serialization --rows 1000
+
+Needs no database, the products are built in memory.
+"""
+
+import argparse
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from app.json_provider import OrjsonProvider
+from app.models import Product
+from app.schemas import ProductsOut
+from app.serializers import PRODUCT_ROWS
+
+
+def _products(rows):
+    created_at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    return [
+        Product(
+            id=i,
+            name=f"Product {i} wireless charger",
+            description=f"Fast wireless charger number {i}, works with phones. " * 4,
+            language="english",
+            created_at=created_at + timedelta(minutes=i),
+            updated_at=created_at + timedelta(minutes=i, seconds=30),
+        )
+        for i in range(1, rows + 1)
+    ]
+
+
+def _time(encode, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        encode()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def run(num_rows, repeat):
+    app = Flask(__name__)
+    products = _products(num_rows)
+    schema = ProductsOut()
+
+    # what a Core select() of PRODUCT_ROWS.columns returns
+    rows = [
+        tuple(getattr(product, column.key) for column in PRODUCT_ROWS.columns)
+        for product in products
+    ]
+
+    with app.app_context():
+        dump_ms = _time(lambda: schema.dump({"products": products}), repeat)
+        rows_ms = _time(lambda: [PRODUCT_ROWS(row) for row in rows], repeat)
+        data = schema.dump({"products": products})
+        assert data["products"] == [PRODUCT_ROWS(row) for row in rows]
+
+        providers = {
+            "stdlib": DefaultJSONProvider(app),
+            "orjson": OrjsonProvider(app),
+        }
+        print(f"marshmallow dump of {len(rows)} rows: {dump_ms:.2f} ms")
+        print(f"RowSerializer dump of {len(rows)} rows: {rows_ms:.2f} ms")
+        print(f"{'provider':<10}{'encode ms':>12}{'bytes':>10}")
+        for name, provider in providers.items():
+            encode_ms = _time(lambda: provider.response(data), repeat)
+            size = len(provider.response(data).get_data())
+            print(f"{name:<10}{encode_ms:>12.2f}{size:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    run(args.rows, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,11 +7,18 @@ load_dotenv()
 
 
 class Config:
+    def __init__(self, **overrides):
+        # settings passed to create_app(), over the ones of the environment
+        for key, value in overrides.items():
+            setattr(self, key, value)
+
     # sqlalchemy
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
     # PostgreSQL options
     SQLALCHEMY_ENGINE_OPTIONS = {
+        "pool_size": 5,  # Connections kept open per worker
+        "max_overflow": 10,  # Extra connections under load, -1 for no limit
         "pool_timeout": 30,  # Timeout when getting connection from pool
         "pool_recycle": 3600,  # Recycle connections after 1 hour
         "pool_pre_ping": True,  # Verify connections before use
@@ -25,6 +32,9 @@ class Config:
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=3)
     JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=3)
 
+    # users allowed on operational endpoints like search analytics, comma separated
+    ADMIN_EMAILS = frozenset(filter(None, os.getenv("ADMIN_EMAILS", "").split(",")))
+
     # flask-smorest
     API_TITLE = "Ecommerce REST API"
     API_VERSION = "v1"
@@ -37,6 +47,73 @@ class Config:
 
     # logging
     LOG_REQUESTS = False
+    # statements slower than this are logged with the request they ran in, None
+    # turns the slow query log off
+    SLOW_QUERY_THRESHOLD_MS = 500
+    SLOW_QUERY_EXPLAIN_RATE = 0.0  # share of slow SELECTs re-run with EXPLAIN ANALYZE
+    SLOW_QUERY_EXPLAIN_TIMEOUT_MS = 5000
+    SLOW_QUERY_EXPLAIN_MAX_PENDING = 10  # sampled EXPLAINs beyond this are dropped
+
+    # requests answer 504 after REQUEST_TIMEOUT seconds, or the shorter timeout a
+    # client sends in X-Request-Timeout, None turns deadlines and statement timeouts off
+    REQUEST_TIMEOUT = 30
+    # statement_timeout of request transactions in seconds, by endpoint, cut down to the
+    # time left until the deadline. Statements cancelled at it answer 503.
+    STATEMENT_TIMEOUT = 10
+    STATEMENT_TIMEOUTS = {
+        # broad queries match much of the catalog
+        "Product.ProductSearch": 3,
+    }
+    STATEMENT_TIMEOUT_RETRY_AFTER = 5  # seconds, sent in Retry-After with the 503
+
+    # while ADMISSION_POOL_THRESHOLD of the connection pool is checked out, or
+    # ADMISSION_MAX_IN_FLIGHT requests are in flight in a worker, low priority requests
+    # and full collection streams answer 503 instead of queueing for a connection
+    ADMISSION_CONTROL = True
+    ADMISSION_POOL_THRESHOLD = 0.8
+    ADMISSION_MAX_IN_FLIGHT = 32  # None to only watch the pool
+    ADMISSION_LOW_PRIORITY = {
+        "Product.ProductSearch",
+        "Product.ProductSearchAnalytics",
+        "Product.ProductChanges",
+    }
+    ADMISSION_RETRY_AFTER = 2  # seconds
+
+    # search analytics, written to search_log by a background thread
+    SEARCH_ANALYTICS = False
+    SEARCH_ANALYTICS_FLUSH_INTERVAL = 10  # seconds
+    SEARCH_ANALYTICS_BATCH_SIZE = 500
+    SEARCH_ANALYTICS_MAX_PENDING = 10000  # events beyond this are dropped
+    SEARCH_ANALYTICS_RETENTION = timedelta(days=90)  # older events are pruned
+
+    # per-worker cache of category, subcategory and product lookups, invalidated
+    # across workers with Postgres LISTEN/NOTIFY
+    CATALOG_CACHE = False
+    CATALOG_CACHE_TTL = 60  # seconds, bounds staleness if a notification is lost
+    CATALOG_CACHE_MAX_ENTRIES = 10000
+    CATALOG_CACHE_CHANNEL = "catalog_changes"
+
+    # deletes are reported to sync clients for this long, older sync tokens expire
+    TOMBSTONE_RETENTION = timedelta(days=30)
+    # open transactions that have not written yet hold the changes feed back for at
+    # most this long. Keep it above REQUEST_TIMEOUT, so requests that write late in
+    # their transaction are not skipped.
+    CHANGES_SETTLE_TIMEOUT = timedelta(seconds=2 * REQUEST_TIMEOUT)
+
+    # brotli or gzip response compression, negotiated with Accept-Encoding
+    COMPRESS_RESPONSES = True
+    COMPRESS_MIN_SIZE = 1024  # bytes, smaller bodies are sent uncompressed
+    COMPRESS_GZIP_LEVEL = 6
+    COMPRESS_BROTLI_QUALITY = 4  # 0-11, higher qualities are too slow for responses
+    COMPRESS_CACHE_TTL = 300  # seconds
+    COMPRESS_CACHE_MAX_ENTRIES = 512
+    COMPRESS_CACHE_MAX_SIZE = 256 * 1024  # bytes, larger bodies are not cached
+
+    # responses of writes sent with an Idempotency-Key header are replayed this long
+    IDEMPOTENCY_KEY_TTL = timedelta(hours=24)
+    # a key still pending after this was claimed by a request that died, and retries
+    # take it over. Keep it above REQUEST_TIMEOUT, requests don't run longer.
+    IDEMPOTENCY_CLAIM_TIMEOUT = timedelta(seconds=2 * REQUEST_TIMEOUT)
 
     # flask-smorest Swagger UI top level authorize dialog box
     API_SPEC_OPTIONS = {
@@ -68,9 +145,11 @@ class TestingConfig(Config):
     TESTING = True
     JWT_SECRET_KEY = os.urandom(24).hex()
     LOG_REQUESTS = True
+    SEARCH_ANALYTICS = True
+    CATALOG_CACHE = True
 
     def __init__(self, **kwargs):
-        super().__init__()
+        super().__init__(**kwargs)
         self.SQLALCHEMY_DATABASE_URI = kwargs["SQLALCHEMY_DATABASE_URI"]
 
 
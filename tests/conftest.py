@@ -50,6 +50,10 @@ def clean_db(app):
         db.session.commit()
         db.session.remove()
 
+        # rows were deleted without ORM events, so no invalidation was sent
+        if catalog_cache := app.extensions.get("catalog_cache"):
+            catalog_cache.cache.clear()
+
 
 @pytest.fixture
 def client(app):
@@ -0,0 +1,26 @@
+import pytest
+from flask import Flask
+
+from app import create_app
+from app.admin import init_admins
+
+
+class TestAdmins:
+    def test_admin_emails_are_normalized_once(self):
+        app = Flask(__name__)
+        app.config["ADMIN_EMAILS"] = {" Admin@Example.com", "ops@example.com"}
+        init_admins(app)
+
+        assert app.extensions["admin_emails"] == {
+            "admin@example.com",
+            "ops@example.com",
+        }
+
+    def test_invalid_admin_email_fails_startup(self):
+        with pytest.raises(ValueError, match="Invalid email in ADMIN_EMAILS"):
+            # fails before the database is used
+            create_app(
+                "testing",
+                SQLALCHEMY_DATABASE_URI="postgresql://unused",
+                ADMIN_EMAILS={"admin@example.com", "not-an-email"},
+            )
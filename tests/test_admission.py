@@ -0,0 +1,122 @@
+from collections import Counter
+from unittest.mock import patch
+
+import pytest
+from flask import Flask
+
+from app.middleware.admission import AdmissionControl
+from tests.utils import get_auth_header
+
+
+class TestAdmissionControl:
+    @pytest.fixture(autouse=True)
+    def setup(self, app, client, create_product, register_user):
+        self.client = client
+        self.admission_control = app.extensions["admission_control"]
+
+        self.product_id = create_product("iPhone 13").get_json()["id"]
+        register_user("shopper@example.com", "password")
+
+        with (
+            patch.object(self.admission_control, "shed", Counter()),
+            # the default user of create_authenticated_headers
+            patch.dict(app.extensions, {"admin_emails": {"testuser@example.com"}}),
+        ):
+            yield
+
+    def _saturate_pool(self):
+        return patch.object(
+            self.admission_control, "_pool_usage", return_value=(12, 15)
+        )
+
+    def test_pool_usage(self):
+        checked_out, capacity = self.admission_control._pool_usage()
+        # pool_size 5 and max_overflow 10 of SQLALCHEMY_ENGINE_OPTIONS
+        assert capacity == 15
+        assert 0 <= checked_out < capacity
+
+    def test_unbounded_pool_has_no_capacity(self):
+        app = Flask(__name__)
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {"max_overflow": -1}
+
+        assert AdmissionControl(app)._pool_usage()[1] is None
+
+    def test_low_priority_requests_are_admitted_when_not_saturated(self):
+        resp = self.client.get("/products/search?q=iphone")
+
+        assert resp.status_code == 200
+        assert not self.admission_control.shed
+
+    def test_low_priority_requests_are_shed_when_pool_saturated(self):
+        with self._saturate_pool():
+            resp = self.client.get("/products/search?q=iphone")
+
+        assert resp.status_code == 503
+        assert resp.headers["Retry-After"] == "2"
+        assert resp.get_json()["message"] == "Server is busy, try again later"
+        assert self.admission_control.shed == {("Product.ProductSearch", "pool"): 1}
+
+    def test_full_collection_streams_are_shed(self):
+        with self._saturate_pool():
+            assert self.client.get("/categories?all=true").status_code == 503
+            assert self.client.get("/categories").status_code == 200
+
+    def test_auth_and_detail_reads_keep_flowing(self):
+        with self._saturate_pool():
+            login = self.client.post(
+                "/auth/login",
+                json={"email": "shopper@example.com", "password": "password"},
+            )
+            detail = self.client.get(f"/products/{self.product_id}")
+            listing = self.client.get("/products")
+
+        assert login.status_code == 200
+        assert detail.status_code == 200
+        assert listing.status_code == 200
+        assert not self.admission_control.shed
+
+    def test_low_priority_requests_are_shed_at_max_in_flight(self):
+        with patch.object(self.admission_control, "max_in_flight", 0):
+            resp = self.client.get("/products/changes")
+
+        assert resp.status_code == 503
+        assert self.admission_control.shed == {
+            ("Product.ProductChanges", "in_flight"): 1
+        }
+
+    def test_in_flight_requests_are_released(self):
+        self.client.get("/products")
+        self.client.get("/categories?all=true")
+        self.client.get("/products/0")
+        with self._saturate_pool():
+            self.client.get("/products/search?q=iphone")
+
+        assert self.admission_control.in_flight == 0
+
+    def test_metrics(self, create_authenticated_headers):
+        headers = create_authenticated_headers()
+        with self._saturate_pool():
+            self.client.get("/products/search?q=iphone")
+            self.client.get("/products/search?q=case")
+            resp = self.client.get("/metrics", headers=headers)
+
+        assert resp.status_code == 200
+        metrics = resp.get_json()["admission"]
+        # the metrics request itself
+        assert metrics["in_flight"] == 1
+        assert metrics["pool_checked_out"] == 12
+        assert metrics["pool_capacity"] == 15
+        assert metrics["saturated"] is True
+        assert metrics["shed_total"] == 2
+        assert metrics["shed"] == [
+            {"endpoint": "Product.ProductSearch", "reason": "pool", "count": 2}
+        ]
+
+    def test_metrics_require_admin(self, login_user):
+        assert self.client.get("/metrics").status_code == 401
+
+        tokens = login_user("shopper@example.com", "password").get_json()
+        resp = self.client.get(
+            "/metrics", headers=get_auth_header(tokens["access_token"])
+        )
+        assert resp.status_code == 403
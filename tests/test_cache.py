@@ -0,0 +1,131 @@
+import time
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import text
+
+from app import db
+from app.cache import LocalCache
+
+
+class TestLocalCache:
+    def test_get_and_set(self):
+        cache = LocalCache(ttl=60, max_entries=10)
+        cache.set("key", "value", cache.generation)
+
+        assert cache.get("key") == "value"
+        assert cache.get("missing") is None
+
+    def test_expired_entry(self):
+        cache = LocalCache(ttl=0, max_entries=10)
+        cache.set("key", "value", cache.generation)
+
+        assert cache.get("key") is None
+
+    def test_least_recently_used_entry_is_dropped(self):
+        cache = LocalCache(ttl=60, max_entries=2)
+        for key in ("a", "b"):
+            cache.set(key, key, cache.generation)
+        cache.get("a")
+        cache.set("c", "c", cache.generation)
+
+        assert [cache.get(key) for key in ("a", "b", "c")] == ["a", None, "c"]
+
+    def test_value_loaded_before_eviction_is_not_stored(self):
+        cache = LocalCache(ttl=60, max_entries=10)
+        generation = cache.generation
+        cache.evict("other")
+        cache.set("key", "stale", generation)
+
+        assert cache.get("key") is None
+
+
+class TestCatalogCache:
+    @pytest.fixture(autouse=True)
+    def setup(self, app, client, create_authenticated_headers):
+        self.client = client
+        self.headers = create_authenticated_headers()
+        self.catalog_cache = app.extensions["catalog_cache"]
+
+    def _get_name(self, id):
+        resp = self.client.get(f"/products/{id}")
+        assert resp.status_code == 200
+        return resp.get_json()["name"]
+
+    def _rename_behind_api(self, id, name, notify=False):
+        # a write the ORM session of this worker does not see, as from another worker
+        with db.engine.begin() as connection:
+            connection.execute(
+                text("UPDATE product SET name = :name WHERE id = :id"),
+                {"name": name, "id": id},
+            )
+            if notify:
+                connection.execute(
+                    text("SELECT pg_notify(:channel, :payload)"),
+                    {"channel": self.catalog_cache.channel, "payload": f"product:{id}"},
+                )
+
+    def _cached_product(self, create_product):
+        id = create_product("Old", "desc").get_json()["id"]
+        assert self._get_name(id) == "Old"
+        assert self.catalog_cache.listening.wait(5)
+
+        # the listener clears the cache once subscribed, fill it again
+        assert self._get_name(id) == "Old"
+        return id
+
+    def test_get_is_served_from_cache(self, create_product):
+        id = self._cached_product(create_product)
+
+        self._rename_behind_api(id, "New")
+        assert self._get_name(id) == "Old"
+
+    def test_notification_evicts_entry(self, create_product):
+        id = self._cached_product(create_product)
+
+        self._rename_behind_api(id, "New", notify=True)
+        for _ in range(50):
+            if self._get_name(id) == "New":
+                break
+            time.sleep(0.1)
+
+        assert self._get_name(id) == "New"
+
+    def test_update_evicts_entry(self, create_product):
+        id = self._cached_product(create_product)
+
+        resp = self.client.put(
+            f"/products/{id}", json={"name": "New"}, headers=self.headers
+        )
+        assert resp.status_code == 200
+        assert self._get_name(id) == "New"
+
+    def test_delete_evicts_entry(self, create_product):
+        id = self._cached_product(create_product)
+
+        self.client.delete(f"/products/{id}", headers=self.headers)
+        assert self.client.get(f"/products/{id}").status_code == 404
+
+    @pytest.mark.parametrize("path", ["categories", "subcategories"])
+    def test_update_evicts_category_and_subcategory(
+        self, create_category, create_subcategory, path
+    ):
+        create = create_category if path == "categories" else create_subcategory
+        id = create("Old").get_json()["id"]
+        assert self.client.get(f"/{path}/{id}").get_json()["name"] == "Old"
+
+        self.client.put(f"/{path}/{id}", json={"name": "New"}, headers=self.headers)
+        assert self.client.get(f"/{path}/{id}").get_json()["name"] == "New"
+
+    def test_failed_write_sends_no_notification(self, create_product):
+        id = self._cached_product(create_product)
+        create_product("Taken", "desc")
+
+        with patch.object(self.catalog_cache.cache, "evict") as evict:
+            resp = self.client.put(
+                f"/products/{id}", json={"name": "Taken"}, headers=self.headers
+            )
+            assert resp.status_code == 409
+            time.sleep(0.5)
+
+        evict.assert_not_called()
@@ -1,4 +1,5 @@
 import time
+from unittest.mock import patch
 
 import pytest
 
@@ -86,6 +87,51 @@ class TestCategory:
         assert "A" in names
         assert "B" in names
 
+    def test_get_all_categories_pagination(self, create_category):
+        for i in range(5):
+            create_category(f"Category{i}")
+
+        with patch("app.routes.category.CategoryCollection._PER_PAGE", 3):
+            resp1 = self.client.get("/categories")
+            assert resp1.status_code == 200
+            data1 = resp1.get_json()
+            assert len(data1["categories"]) == 3
+            assert data1["cursor"]["prev"] is None
+            assert isinstance(data1["cursor"]["next"], str)
+
+            resp2 = self.client.get(
+                "/categories", query_string={"cursor": data1["cursor"]["next"]}
+            )
+            assert resp2.status_code == 200
+            data2 = resp2.get_json()
+            assert len(data2["categories"]) == 2
+            assert data2["cursor"]["next"] is None
+
+        names = [c["name"] for c in data1["categories"] + data2["categories"]]
+        assert names == [f"Category{i}" for i in range(5)]
+
+    def test_get_all_categories_streamed(self, create_category):
+        for i in range(5):
+            create_category(f"Category{i}")
+
+        with patch("app.routes.category.CategoryCollection._PER_PAGE", 3):
+            resp = self.client.get("/categories", query_string={"all": "true"})
+
+        assert resp.status_code == 200
+        assert resp.is_streamed
+        assert resp.content_type == "application/json"
+        data = resp.get_json()
+        assert "cursor" not in data
+        assert [c["name"] for c in data["categories"]] == [
+            f"Category{i}" for i in range(5)
+        ]
+        assert set(data["categories"][0]) == {"id", "name", "created_at", "updated_at"}
+
+    def test_get_all_categories_streamed_empty(self):
+        resp = self.client.get("/categories", query_string={"all": "true"})
+        assert resp.status_code == 200
+        assert resp.get_json() == {"categories": []}
+
     def test_update_category(self, create_authenticated_headers, create_category):
         response = create_category("OldName")
         data = response.get_json()
@@ -0,0 +1,198 @@
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import insert, text
+
+from app import db
+from app.models import Product, Tombstone
+from app.routes.product import ProductChanges
+from app.schemas import SyncToken
+
+
+class TestProductChanges:
+    @pytest.fixture(autouse=True)
+    def setup(self, client):
+        self.client = client
+
+    def _delete(self, id, headers):
+        resp = self.client.delete(f"/products/{id}", headers=headers)
+        assert resp.status_code == 204
+
+    def _changes(self, since=None):
+        query_string = {"since": since} if since is not None else {}
+        resp = self.client.get("/products/changes", query_string=query_string)
+        assert resp.status_code == 200
+        # requests share the test app context, end the read transaction so the next
+        # pull sees a new now()
+        db.session.rollback()
+        return resp.get_json()
+
+    def test_initial_pull_returns_all_products(self, create_product):
+        for name in ("a", "b", "c"):
+            create_product(name, "desc")
+
+        data = self._changes()
+        assert [p["name"] for p in data["products"]] == ["a", "b", "c"]
+        assert data["has_more"] is False
+        assert data["since"]
+
+    def test_pull_returns_only_changes_after_token(
+        self, create_authenticated_headers, create_product
+    ):
+        ids = [create_product(name, "desc").get_json()["id"] for name in ("a", "b")]
+        since = self._changes()["since"]
+
+        assert self._changes(since)["products"] == []
+
+        self.client.put(
+            f"/products/{ids[0]}",
+            json={"description": "new"},
+            headers=create_authenticated_headers(),
+        )
+        create_product("c", "desc")
+
+        data = self._changes(since)
+        assert [p["name"] for p in data["products"]] == ["a", "c"]
+        assert data["products"][0]["description"] == "new"
+        assert self._changes(data["since"])["products"] == []
+
+    def test_empty_pull_keeps_products_marker(self, create_product):
+        create_product("a", "desc")
+        since = self._changes()["since"]
+
+        next_since = self._changes(since)["since"]
+        token = SyncToken()
+        assert (
+            token.deserialize(next_since)["products"]
+            == token.deserialize(since)["products"]
+        )
+
+    def test_pull_paginates(self, create_product):
+        for i in range(5):
+            create_product(f"Product{i}", "desc")
+
+        names = []
+        since = None
+        with patch.object(ProductChanges, "_PER_PAGE", 2):
+            while True:
+                data = self._changes(since)
+                names += [p["name"] for p in data["products"]]
+                since = data["since"]
+                if not data["has_more"]:
+                    break
+
+        assert names == [f"Product{i}" for i in range(5)]
+
+    def test_changes_behind_open_transaction_are_held_back(self, create_product):
+        with db.engine.connect() as slow:
+            # a write that started first, and commits after the next pull
+            slow.execute(insert(Product).values(name="slow"))
+            create_product("fast", "desc")
+
+            data = self._changes()
+            assert data["products"] == []
+            slow.commit()
+
+        data = self._changes(data["since"])
+        assert [p["name"] for p in data["products"]] == ["slow", "fast"]
+
+    def test_read_only_transaction_holds_changes_back_until_settle_timeout(
+        self, app, create_product
+    ):
+        with db.engine.connect() as reader:
+            # a report, or a session left idle in transaction
+            reader.execute(text("SELECT 1"))
+            create_product("a", "desc")
+
+            # it could still write, with its start time as updated_at
+            assert self._changes()["products"] == []
+
+            with patch.dict(app.config, {"CHANGES_SETTLE_TIMEOUT": timedelta(0)}):
+                data = self._changes()
+            assert [p["name"] for p in data["products"]] == ["a"]
+
+    def test_deletes_behind_open_transaction_are_held_back(
+        self, create_authenticated_headers, create_product
+    ):
+        id = create_product("a", "desc").get_json()["id"]
+        since = self._changes()["since"]
+
+        with db.engine.connect() as slow:
+            slow.execute(insert(Tombstone).values(entity_type="product", entity_id=0))
+            self._delete(id, create_authenticated_headers())
+
+            data = self._changes(since)
+            assert data["deleted"] == []
+            slow.commit()
+
+        data = self._changes(data["since"])
+        assert [t["id"] for t in data["deleted"]] == [0, id]
+
+    @pytest.mark.parametrize("since", ["not-a-token", "WzFd", "eyJwcm9kdWN0cyI6MX0="])
+    def test_invalid_token(self, since):
+        resp = self.client.get("/products/changes", query_string={"since": since})
+        assert resp.status_code == 422
+
+    def test_pull_returns_deleted_products(
+        self, create_authenticated_headers, create_product
+    ):
+        headers = create_authenticated_headers()
+        ids = [create_product(name, "desc").get_json()["id"] for name in ("a", "b")]
+        since = self._changes()["since"]
+
+        self._delete(ids[0], headers)
+
+        data = self._changes(since)
+        assert data["products"] == []
+        assert [t["id"] for t in data["deleted"]] == [ids[0]]
+        assert data["deleted"][0]["deleted_at"]
+        assert self._changes(data["since"])["deleted"] == []
+
+    def test_deleted_pull_paginates(self, create_authenticated_headers, create_product):
+        headers = create_authenticated_headers()
+        ids = [create_product(f"P{i}", "desc").get_json()["id"] for i in range(5)]
+        since = self._changes()["since"]
+        for id in ids:
+            self._delete(id, headers)
+
+        deleted = []
+        with patch.object(ProductChanges, "_PER_PAGE", 2):
+            while True:
+                data = self._changes(since)
+                deleted += [t["id"] for t in data["deleted"]]
+                since = data["since"]
+                if not data["has_more"]:
+                    break
+
+        assert deleted == ids
+
+    def test_category_tombstones_not_in_product_feed(
+        self, create_authenticated_headers, create_category
+    ):
+        id = create_category("Cat").get_json()["id"]
+        self.client.delete(f"/categories/{id}", headers=create_authenticated_headers())
+
+        assert self._changes()["deleted"] == []
+
+    def test_expired_token(self, app, create_product):
+        create_product("a", "desc")
+        since = self._changes()["since"]
+
+        with patch.dict(app.config, {"TOMBSTONE_RETENTION": timedelta(0)}):
+            resp = self.client.get("/products/changes", query_string={"since": since})
+        assert resp.status_code == 410
+
+    def test_token_does_not_expire_while_pulling(self, app, create_product):
+        create_product("a", "desc")
+        since = self._changes()["since"]
+
+        # the deleted marker follows the pulls even though nothing was deleted
+        with patch.dict(app.config, {"TOMBSTONE_RETENTION": timedelta(minutes=1)}):
+            old = datetime.now(timezone.utc) - timedelta(minutes=2)
+            db.session.add(
+                Tombstone(entity_type="product", entity_id=0, deleted_at=old)
+            )
+            db.session.commit()
+
+            assert self._changes(since)["deleted"] == []
@@ -0,0 +1,95 @@
+import json
+import zlib
+from unittest.mock import patch
+
+import pytest
+
+
+class TestCompression:
+    @pytest.fixture(autouse=True)
+    def setup(self, app, client, create_product):
+        self.client = client
+        self.compression = app.extensions["compression"]
+        self.compression.cache.clear()
+
+        # a page of products with long descriptions is well above the threshold
+        for i in range(5):
+            create_product(f"Product {i}", "x" * 500)
+
+    def _get(self, path, encoding, **query_string):
+        return self.client.get(
+            path, query_string=query_string, headers={"Accept-Encoding": encoding}
+        )
+
+    @staticmethod
+    def _gunzip(resp):
+        return json.loads(zlib.decompress(resp.get_data(), wbits=31))
+
+    def test_gzip(self):
+        plain = self.client.get("/products").get_json()
+
+        resp = self._get("/products", "gzip")
+        assert resp.status_code == 200
+        assert resp.headers["Content-Encoding"] == "gzip"
+        assert "Accept-Encoding" in resp.headers["Vary"]
+        assert int(resp.headers["Content-Length"]) == len(resp.get_data())
+        assert self._gunzip(resp) == plain
+
+    def test_brotli_preferred(self):
+        brotli = pytest.importorskip("brotli")
+
+        resp = self._get("/products", "gzip, deflate, br")
+        assert resp.headers["Content-Encoding"] == "br"
+        assert json.loads(brotli.decompress(resp.get_data())) == (
+            self.client.get("/products").get_json()
+        )
+
+    def test_quality_values(self):
+        resp = self._get("/products", "br;q=0.5, gzip")
+        assert resp.headers["Content-Encoding"] == "gzip"
+
+        resp = self._get("/products", "gzip;q=0, identity")
+        assert "Content-Encoding" not in resp.headers
+        assert "Accept-Encoding" in resp.headers["Vary"]
+
+    def test_no_accept_encoding(self):
+        resp = self.client.get("/products")
+        assert "Content-Encoding" not in resp.headers
+        assert len(resp.get_json()["products"]) == 5
+
+    def test_small_body_is_not_compressed(self):
+        product = self.client.get("/products").get_json()["products"][0]
+
+        resp = self._get(f"/products/{product['id']}/subcategories", "gzip")
+        assert resp.status_code == 200
+        assert len(resp.get_data()) < self.compression.min_size
+        assert "Content-Encoding" not in resp.headers
+
+    def test_error_is_not_compressed(self):
+        with patch.object(self.compression, "min_size", 0):
+            resp = self._get("/products/999999", "gzip")
+
+        assert resp.status_code == 404
+        assert "Content-Encoding" not in resp.headers
+
+    def test_streamed_response(self, create_category):
+        for i in range(50):
+            create_category(f"Category {i}")
+        plain = self.client.get("/categories", query_string={"all": "true"}).get_json()
+
+        resp = self._get("/categories", "gzip", all="true")
+        assert resp.is_streamed
+        assert resp.headers["Content-Encoding"] == "gzip"
+        assert "Content-Length" not in resp.headers
+        assert self._gunzip(resp) == plain
+        assert len(plain["categories"]) == 50
+
+    def test_compressed_body_is_cached(self):
+        with patch.object(
+            self.compression, "compress", wraps=self.compression.compress
+        ) as compress:
+            first = self._get("/products", "gzip")
+            second = self._get("/products", "gzip")
+
+        assert compress.call_count == 1
+        assert first.get_data() == second.get_data()
@@ -0,0 +1,152 @@
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+import pytest
+
+from app import db
+from app.idempotency import _release, _request_hash
+from app.models import Category, IdempotencyKey, Product, User
+from tests import utils
+
+
+class TestIdempotency:
+    @pytest.fixture(autouse=True)
+    def setup(self, client, create_authenticated_headers):
+        self.client = client
+        self.headers = create_authenticated_headers()
+
+    def _post(self, path, payload, key="key-1", headers=None):
+        headers = {**(headers or self.headers), "Idempotency-Key": key}
+        return self.client.post(path, json=payload, headers=headers)
+
+    @pytest.mark.parametrize("path", ["/categories", "/subcategories", "/products"])
+    def test_retry_is_replayed(self, path):
+        resp1 = self._post(path, {"name": "Name"})
+        assert resp1.status_code == 201
+        assert "Idempotent-Replayed" not in resp1.headers
+
+        resp2 = self._post(path, {"name": "Name"})
+        assert resp2.status_code == 201
+        assert resp2.headers["Idempotent-Replayed"] == "true"
+        assert resp2.get_json() == resp1.get_json()
+
+    def test_replay_does_not_run_view(self):
+        self._post("/products", {"name": "Name"})
+
+        with patch("app.routes.product.Product", side_effect=AssertionError):
+            resp = self._post("/products", {"name": "Name"})
+
+        assert resp.status_code == 201
+        assert Product.query.count() == 1
+
+    def test_without_key(self):
+        self.client.post("/categories", json={"name": "Name"}, headers=self.headers)
+        resp = self.client.post(
+            "/categories", json={"name": "Name"}, headers=self.headers
+        )
+
+        assert resp.status_code == 409
+        assert IdempotencyKey.query.count() == 0
+
+    def test_different_keys_run_separately(self):
+        self._post("/categories", {"name": "Name"}, key="key-1")
+        resp = self._post("/categories", {"name": "Name"}, key="key-2")
+
+        assert resp.status_code == 409
+
+    def test_key_reused_for_different_request(self):
+        self._post("/categories", {"name": "Name"})
+
+        resp = self._post("/categories", {"name": "Other"})
+        assert resp.status_code == 422
+        assert Category.query.count() == 1
+
+    def test_keys_are_per_user(self, register_user, login_user):
+        self._post("/categories", {"name": "Name"})
+
+        register_user("other@example.com", "password")
+        tokens = login_user("other@example.com", "password").get_json()
+        other_headers = utils.get_auth_header(tokens["access_token"])
+        resp = self._post("/categories", {"name": "Name"}, headers=other_headers)
+        assert resp.status_code == 409
+
+    def test_error_response_is_not_stored(self, create_category):
+        create_category("Name")
+
+        resp = self._post("/categories", {"name": "Name"})
+        assert resp.status_code == 409
+        assert IdempotencyKey.query.count() == 0
+
+        Category.query.delete()
+        db.session.commit()
+        resp = self._post("/categories", {"name": "Name"})
+        assert resp.status_code == 201
+
+    def _add_pending_key(self, path, payload, **kwargs):
+        db.session.add(
+            IdempotencyKey(
+                user_identity=str(self._identity()),
+                key="key-1",
+                request_hash=self._request_hash(path, payload),
+                **kwargs,
+            )
+        )
+        db.session.commit()
+
+    def test_request_in_progress(self):
+        self._add_pending_key("/categories", {"name": "Name"})
+
+        resp = self._post("/categories", {"name": "Name"})
+        assert resp.status_code == 409
+        assert "in progress" in resp.get_json()["message"]
+
+    def test_pending_key_of_dead_request_is_taken_over(self):
+        # claimed past IDEMPOTENCY_CLAIM_TIMEOUT by a request that never finished
+        self._add_pending_key(
+            "/categories",
+            {"name": "Name"},
+            created_at=datetime.now(timezone.utc) - timedelta(minutes=5),
+        )
+
+        resp1 = self._post("/categories", {"name": "Name"})
+        assert resp1.status_code == 201
+
+        resp2 = self._post("/categories", {"name": "Name"})
+        assert resp2.headers["Idempotent-Replayed"] == "true"
+        assert resp2.get_json() == resp1.get_json()
+        assert Category.query.count() == 1
+
+    def test_release_leaves_claim_taken_over(self):
+        self._add_pending_key("/categories", {"name": "Name"})
+        claimed_at = IdempotencyKey.query.one().created_at
+
+        # a request whose claim expired and was taken over in the meantime
+        _release(str(self._identity()), "key-1", claimed_at - timedelta(minutes=5))
+        assert IdempotencyKey.query.count() == 1
+
+        _release(str(self._identity()), "key-1", claimed_at)
+        assert IdempotencyKey.query.count() == 0
+
+    def test_expired_keys_are_pruned(self):
+        self._post("/categories", {"name": "Name"})
+        IdempotencyKey.query.update(
+            {"created_at": datetime.now(timezone.utc) - timedelta(hours=25)}
+        )
+        db.session.commit()
+
+        resp = self._post("/categories", {"name": "Name"})
+        assert resp.status_code == 409
+        assert "Idempotent-Replayed" not in resp.headers
+
+    def test_key_too_long(self):
+        resp = self._post("/categories", {"name": "Name"}, key="k" * 256)
+        assert resp.status_code == 422
+
+    def _identity(self):
+        return User.query.one().id
+
+    def _request_hash(self, path, payload):
+        with self.client.application.test_request_context(
+            path, method="POST", json=payload
+        ):
+            return _request_hash()
@@ -0,0 +1,51 @@
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import pytest
+from flask import Flask
+
+from app.json_provider import OrjsonProvider
+
+
+class TestOrjsonProvider:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.app = Flask(__name__)
+        self.provider = OrjsonProvider(self.app)
+
+    def test_app_uses_orjson(self, app):
+        assert isinstance(app.json, OrjsonProvider)
+
+    def test_dumps(self):
+        data = {"b": 1, "a": [None, True, "ü"], 1: 2.5}
+        assert self.provider.dumps(data) == '{"1":2.5,"a":[null,true,"ü"],"b":1}'
+
+    def test_dumps_datetime_and_default_types(self):
+        data = {
+            "at": datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone.utc),
+            "price": Decimal("1.50"),
+        }
+        assert (
+            self.provider.dumps(data)
+            == '{"at":"2024-01-02T03:04:05+00:00","price":"1.50"}'
+        )
+
+    def test_dumps_with_stdlib_arguments(self):
+        assert self.provider.dumps({"a": 1}, indent=2) == '{\n  "a": 1\n}'
+
+    def test_loads(self):
+        assert self.provider.loads(b'{"a": [1, "x"]}') == {"a": [1, "x"]}
+
+    def test_response(self):
+        with self.app.app_context():
+            response = self.provider.response({"a": 1})
+
+        assert response.mimetype == "application/json"
+        assert response.get_data() == b'{"a":1}\n'
+
+    def test_response_in_debug_mode_is_indented(self):
+        self.app.debug = True
+        with self.app.app_context():
+            response = self.provider.response({"a": 1})
+
+        assert response.get_data() == b'{\n  "a": 1\n}\n'
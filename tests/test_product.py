@@ -1,8 +1,12 @@
+import base64
 import time
+from unittest.mock import patch
 
 import pytest
+from sqlakeyset import Marker, serialize_bookmark
 
-from app.models import Product
+from app import db
+from app.models import Category, Product
 from tests import utils
 
 
@@ -37,6 +41,7 @@ class TestProduct:
         assert "id" in data
         assert "created_at" in data
         assert "updated_at" in data
+        assert data["language"] == "en"
 
         created_at = utils.parse_api_datetime(data["created_at"])
         updated_at = utils.parse_api_datetime(data["updated_at"])
@@ -234,6 +239,127 @@ class TestProduct:
         assert data2["cursor"]["next"] is None
         assert isinstance(data2["cursor"]["prev"], str)
 
+    @pytest.mark.parametrize(
+        "sort, expected",
+        [
+            ("id", ["b", "C", "a"]),
+            ("-id", ["a", "C", "b"]),
+            ("name", ["a", "b", "C"]),
+            ("-name", ["C", "b", "a"]),
+            ("created_at", ["b", "C", "a"]),
+            ("-created_at", ["a", "C", "b"]),
+        ],
+    )
+    def test_products_sort(self, create_product, sort, expected):
+        for name in ("b", "C", "a"):
+            create_product(name, "desc")
+
+        resp = self.client.get("/products", query_string={"sort": sort})
+        assert resp.status_code == 200
+        data = resp.get_json()
+        assert data["sort"] == sort
+        assert [p["name"] for p in data["products"]] == expected
+
+    def test_products_sort_updated_at(
+        self, create_authenticated_headers, create_product
+    ):
+        ids = [create_product(name, "desc").get_json()["id"] for name in ("a", "b")]
+        self.client.put(
+            f"/products/{ids[0]}",
+            json={"description": "new"},
+            headers=create_authenticated_headers(),
+        )
+
+        resp = self.client.get("/products", query_string={"sort": "-updated_at"})
+        assert [p["id"] for p in resp.get_json()["products"]] == [ids[0], ids[1]]
+
+    def test_products_sort_pagination(self, create_product):
+        for i in range(15):
+            create_product(f"Product{i:02}", f"Description{i}")
+
+        resp1 = self.client.get("/products", query_string={"sort": "-name"})
+        data1 = resp1.get_json()
+        resp2 = self.client.get(
+            "/products",
+            query_string={"sort": "-name", "cursor": data1["cursor"]["next"]},
+        )
+        assert resp2.status_code == 200
+        data2 = resp2.get_json()
+
+        names = [p["name"] for p in data1["products"] + data2["products"]]
+        assert names == [f"Product{i:02}" for i in reversed(range(15))]
+
+        # back to the first page
+        resp3 = self.client.get(
+            "/products",
+            query_string={"sort": "-name", "cursor": data2["cursor"]["prev"]},
+        )
+        assert resp3.get_json()["products"] == data1["products"]
+
+    @pytest.mark.parametrize("other_sort", [None, "name", "-created_at"])
+    def test_products_cursor_bound_to_sort(self, create_product, other_sort):
+        for i in range(12):
+            create_product(f"Product{i}", f"Description{i}")
+
+        data = self.client.get("/products", query_string={"sort": "-id"}).get_json()
+        query_string = {"cursor": data["cursor"]["next"]}
+        if other_sort:
+            query_string["sort"] = other_sort
+
+        resp = self.client.get("/products", query_string=query_string)
+        assert resp.status_code == 422
+
+    def test_products_cursor_from_search_rejected(self, create_product):
+        for i in range(12):
+            create_product(f"iPhone {i}", f"Description {i}")
+
+        data = self.client.get(
+            "/products/search", query_string={"q": "iPhone"}
+        ).get_json()
+        resp = self.client.get(
+            "/products", query_string={"cursor": data["cursor"]["next"]}
+        )
+        assert resp.status_code == 422
+
+    def test_search_cursor_from_other_endpoint_rejected(self, create_product):
+        create_product("iPhone 13", "Latest Apple iPhone")
+        # /categories has no sort either, a cursor of it must not seek the search
+        db.session.add_all(Category(name=f"Category{i}") for i in range(51))
+        db.session.commit()
+
+        data = self.client.get("/categories").get_json()
+        resp = self.client.get(
+            "/products/search",
+            query_string={"q": "iPhone", "cursor": data["cursor"]["next"]},
+        )
+        assert resp.status_code == 422
+        assert resp.get_json()["errors"]["query"]["cursor"] == [
+            "Cursor was issued for a different endpoint"
+        ]
+
+    def test_search_cursor_marker_of_other_ordering_rejected(self, create_product):
+        create_product("iPhone 13", "Latest Apple iPhone")
+
+        # a forged cursor with a single column marker, search orders by (rank, id)
+        bookmark = serialize_bookmark(Marker((1,), False))
+        cursor = base64.urlsafe_b64encode(
+            f"Product.ProductSearch||{bookmark}".encode("utf-8")
+        ).decode("utf-8")
+        resp = self.client.get(
+            "/products/search", query_string={"q": "iPhone", "cursor": cursor}
+        )
+        assert resp.status_code == 422
+        assert resp.get_json()["errors"]["query"]["cursor"] == ["Invalid cursor"]
+
+    @pytest.mark.parametrize("cursor", ["not-a-cursor", "Pmk6MQ=="])
+    def test_products_invalid_cursor(self, cursor):
+        resp = self.client.get("/products", query_string={"cursor": cursor})
+        assert resp.status_code == 422
+
+    def test_products_invalid_sort(self):
+        resp = self.client.get("/products", query_string={"sort": "description"})
+        assert resp.status_code == 422
+
     def test_search_products_basic(self, create_product):
         create_product("iPhone 13", "Latest Apple iPhone")
         create_product("Samsung Galaxy S21", "Android flagship")
@@ -262,7 +388,6 @@ class TestProduct:
         assert "Apple Watch" in names2
 
     def test_search_products_ranking(self, create_product):
-        # All these should have strong matches (rank > 0.5)
         create_product("iPhone iPhone iPhone 13", "Apple phone")  # name match, highest
         create_product(
             "iPhone iPhone Accessory", "Accessory for iPhone"
@@ -279,6 +404,43 @@ class TestProduct:
         assert names == expected
         assert "Samsung" not in names
 
+    def test_search_products_name_matches_rank_first(self, create_product):
+        create_product("Phone Stand", "Holds any Apple device")
+        create_product("Apple Watch", "Wearable device")
+
+        resp = self.client.get("/products/search", query_string={"q": "Apple"})
+        assert resp.status_code == 200
+        names = [p["name"] for p in resp.get_json()["products"]]
+        assert names == ["Apple Watch", "Phone Stand"]
+
+    def test_search_products_ranks_capped_candidates(self, create_product):
+        for i in range(5):
+            create_product(f"iPhone {i}", f"Description {i}")
+
+        with patch("app.routes.product.ProductSearch._MAX_CANDIDATES", 3):
+            resp = self.client.get("/products/search", query_string={"q": "iPhone"})
+
+        assert resp.status_code == 200
+        data = resp.get_json()
+        # newest matches are the candidates
+        names = sorted(p["name"] for p in data["products"])
+        assert names == ["iPhone 2", "iPhone 3", "iPhone 4"]
+        assert data["cursor"]["next"] is None
+
+    def test_search_products_keeps_name_match_older_than_cap(self, create_product):
+        create_product("Telescope", "Refractor for stargazing")
+        for i in range(5):
+            create_product(f"Tripod {i}", f"Fits any telescope {i}")
+
+        with patch("app.routes.product.ProductSearch._MAX_CANDIDATES", 3):
+            resp = self.client.get("/products/search", query_string={"q": "telescope"})
+
+        assert resp.status_code == 200
+        names = [p["name"] for p in resp.get_json()["products"]]
+        # older than the 3 newest matches, but a name match
+        assert names[0] == "Telescope"
+        assert names[1:] == ["Tripod 2", "Tripod 3", "Tripod 4"]
+
     def test_search_products_no_results(self, create_product):
         create_product("iPhone 13", "Latest Apple iPhone")
         resp = self.client.get("/products/search", query_string={"q": "Nonexistent"})
@@ -316,6 +478,152 @@ class TestProduct:
         assert isinstance(data2["products"], list)
         assert len(data2["products"]) == 5
 
+    def test_search_products_highlight(self, create_product):
+        create_product("iPhone 13", "Latest Apple iPhone with a bigger battery")
+        create_product("Apple Watch", None)
+
+        resp = self.client.get(
+            "/products/search", query_string={"q": "iPhone", "highlight": "true"}
+        )
+        assert resp.status_code == 200
+        products = resp.get_json()["products"]
+        assert len(products) == 1
+        assert products[0]["highlight"]["name"] == "<b>iPhone</b> 13"
+        assert "<b>iPhone</b>" in products[0]["highlight"]["description"]
+
+        resp = self.client.get(
+            "/products/search", query_string={"q": "Apple", "highlight": "true"}
+        )
+        highlights = {p["name"]: p["highlight"] for p in resp.get_json()["products"]}
+        assert highlights["Apple Watch"] == {
+            "name": "<b>Apple</b> Watch",
+            "description": None,
+        }
+
+    def test_search_products_highlight_escapes_html(self, create_product):
+        create_product(
+            "<img src=x onerror=alert(1)> iPhone",
+            "Tom's \"iPhone\" case <script>alert('x')</script> & more",
+        )
+
+        resp = self.client.get(
+            "/products/search", query_string={"q": "iPhone", "highlight": "true"}
+        )
+        assert resp.status_code == 200
+        highlight = resp.get_json()["products"][0]["highlight"]
+        assert highlight["name"] == "&lt;img src=x onerror=alert(1)&gt; <b>iPhone</b>"
+        assert highlight["description"] == (
+            "Tom&#39;s &quot;<b>iPhone</b>&quot; case "
+            "&lt;script&gt;alert(&#39;x&#39;)&lt;/script&gt; &amp; more"
+        )
+
+    def test_search_products_highlight_fragments(self, create_product):
+        filler = " ".join(f"word{i}" for i in range(20))
+        create_product("Charger", f"{filler} iPhone {filler} iPhone {filler}")
+
+        resp = self.client.get(
+            "/products/search",
+            query_string={
+                "q": "iPhone",
+                "highlight": "true",
+                "max_words": 4,
+                "max_fragments": 2,
+            },
+        )
+        assert resp.status_code == 200
+        description = resp.get_json()["products"][0]["highlight"]["description"]
+        assert description.count("<b>iPhone</b>") == 2
+        assert len(description.split()) < 20
+
+    def test_search_products_without_highlight(self, create_product):
+        create_product("iPhone 13", "Latest Apple iPhone")
+
+        resp = self.client.get("/products/search", query_string={"q": "iPhone"})
+        assert resp.status_code == 200
+        assert "highlight" not in resp.get_json()["products"][0]
+
+    def test_search_products_highlight_invalid_fragment_size(self):
+        resp = self.client.get(
+            "/products/search",
+            query_string={"q": "iPhone", "highlight": "true", "max_words": 1},
+        )
+        assert resp.status_code == 422
+
+    def test_create_product_with_language(self, create_authenticated_headers):
+        response = self.client.post(
+            "/products",
+            json={"name": "Fahrräder", "description": "Schöne Räder", "language": "de"},
+            headers=create_authenticated_headers(),
+        )
+        assert response.status_code == 201
+        assert response.get_json()["language"] == "de"
+
+    def test_create_product_unsupported_language(self, create_authenticated_headers):
+        response = self.client.post(
+            "/products",
+            json={"name": "Bicycle", "language": "xx"},
+            headers=create_authenticated_headers(),
+        )
+        assert response.status_code == 422
+        self._verify_product_in_db("Bicycle", should_exist=False)
+
+    def test_update_product_language(self, create_authenticated_headers):
+        headers = create_authenticated_headers()
+        p_id = self.client.post(
+            "/products", json={"name": "Fahrräder"}, headers=headers
+        ).get_json()["id"]
+        # stemmed with the english config, so the german singular does not match
+        resp = self.client.get(
+            "/products/search", query_string={"q": "Fahrrad", "lang": "de"}
+        )
+        assert resp.get_json()["products"] == []
+
+        update_resp = self.client.put(
+            f"/products/{p_id}", json={"language": "de"}, headers=headers
+        )
+        assert update_resp.status_code == 200
+        assert update_resp.get_json()["language"] == "de"
+
+        resp = self.client.get(
+            "/products/search", query_string={"q": "Fahrrad", "lang": "de"}
+        )
+        assert [p["id"] for p in resp.get_json()["products"]] == [p_id]
+
+    def test_search_products_language_from_accept_language(
+        self, create_authenticated_headers
+    ):
+        self.client.post(
+            "/products",
+            json={"name": "Fahrräder", "language": "de"},
+            headers=create_authenticated_headers(),
+        )
+
+        resp = self.client.get(
+            "/products/search",
+            query_string={"q": "Fahrrädern"},
+            headers={"Accept-Language": "de-DE,de;q=0.9,en;q=0.8"},
+        )
+        assert resp.status_code == 200
+        assert [p["name"] for p in resp.get_json()["products"]] == ["Fahrräder"]
+        assert "Accept-Language" in resp.vary
+
+        # falls back to english
+        resp = self.client.get("/products/search", query_string={"q": "Fahrrädern"})
+        assert resp.get_json()["products"] == []
+        assert "Accept-Language" in resp.vary
+
+        # an explicit lang does not depend on the header
+        resp = self.client.get(
+            "/products/search", query_string={"q": "Fahrrädern", "lang": "de"}
+        )
+        assert "Accept-Language" not in resp.vary
+
+    def test_search_products_unsupported_language(self):
+        resp = self.client.get(
+            "/products/search", query_string={"q": "Fahrrad", "lang": "xx"}
+        )
+        assert resp.status_code == 422
+
     def test_search_products_empty_query(self):
         # empty query
         resp = self.client.get("/products/search", query_string={"q": ""})
@@ -0,0 +1,87 @@
+import pytest
+from sqlalchemy.orm import selectinload
+
+from app import db
+from app.models import Product, Subcategory
+from tests.utils import capture_queries
+
+
+class TestQueryCounts:
+    @pytest.fixture(autouse=True)
+    def setup(self, app, client, create_category, create_subcategory, create_product):
+        self.client = client
+        self.catalog_cache = app.extensions["catalog_cache"]
+        self.create_product = create_product
+
+        category = create_category("C").get_json()
+        self.subcategory_ids = [
+            create_subcategory(f"S{i}", categories=[category["id"]]).get_json()["id"]
+            for i in range(3)
+        ]
+
+    def _create_products(self, count, start=0):
+        for i in range(start, start + count):
+            self.create_product(f"P{i}", "desc", subcategories=self.subcategory_ids)
+
+    def _count_queries(self, path, **query_string):
+        # nothing loaded by earlier requests may be reused
+        db.session.expire_all()
+        self.catalog_cache.cache.clear()
+        with capture_queries() as statements:
+            resp = self.client.get(path, query_string=query_string)
+        assert resp.status_code == 200
+        return len(statements)
+
+    @pytest.mark.parametrize(
+        "path",
+        [
+            "/products",
+            "/subcategories/{subcategory_id}/products",
+            "/categories/{category_id}/products",
+        ],
+    )
+    def test_product_list_include_is_independent_of_page_size(self, path):
+        subcategory = db.session.get(Subcategory, self.subcategory_ids[0])
+        path = path.format(
+            subcategory_id=subcategory.id, category_id=subcategory.categories[0].id
+        )
+        include = "subcategory_ids,category_ids"
+
+        self._create_products(1)
+        one = self._count_queries(path, include=include)
+        self._create_products(9, start=1)
+        page = self._count_queries(path, include=include)
+
+        assert page == one
+        # links of the page: exactly one statement on top of the listing
+        assert page == self._count_queries(path) + 1
+
+    def test_product_include_is_one_statement(self):
+        self._create_products(1)
+        id = db.session.scalar(db.select(Product.id))
+
+        assert (
+            self._count_queries(f"/products/{id}", include="category_ids")
+            == self._count_queries(f"/products/{id}") + 1
+        )
+
+    def test_selectinload_subcategories(self):
+        self._create_products(10)
+
+        db.session.expire_all()
+        with capture_queries() as lazy:
+            for product in Product.query.all():
+                assert len(product.subcategories) == 3
+
+        db.session.expire_all()
+        with capture_queries() as batched:
+            products = Product.query.options(
+                selectinload(Product.subcategories).selectinload(Subcategory.categories)
+            ).all()
+            for product in products:
+                assert len(product.subcategories) == 3
+                assert all(len(sc.categories) == 1 for sc in product.subcategories)
+
+        # one query per product without, one per relationship with selectinload
+        assert len(lazy) == 1 + 10
+        assert len(batched) == 3
@@ -0,0 +1,106 @@
+import pytest
+
+from app import db
+from app.models import category_subcategory, subcategory_product
+from bench.catalog import CatalogGenerator, generate
+from tests.utils import capture_queries, explain, plan_nodes
+
+
+class TestQueryPlans:
+    """Plan shape of the statements behind hot endpoints, against a seeded catalog.
+
+    Plans are explained with enable_seqscan off. The planner then takes an index
+    whenever one is usable, whatever the table size, so a Seq Scan means the index a
+    statement relies on is missing or cannot be used. Without a usable index it can
+    also read a whole index instead, so scans of the link tables, which grow with the
+    catalog, must have an Index Cond. Merge joins are off too, on a catalog this small
+    they would merge whole link table indexes where a larger one is looked up in them.
+    """
+
+    _LINK_TABLE_INDEXES = {
+        index.name
+        for table in (category_subcategory, subcategory_product)
+        for index in (table.primary_key, *table.indexes)
+    }
+
+    # products are named "<brand> <adjective> <noun> <id in base 36>"
+    _PRODUCT_CODE = "9IX"  # product 12345
+
+    @pytest.fixture(autouse=True)
+    def setup(self, client):
+        self.client = client
+        generate(
+            # categories of about a tenth of the catalog each, their listings walk
+            # products in sort order and look their links up per product
+            CatalogGenerator(
+                num_products=15000, num_categories=10, num_subcategories=100, seed=1
+            ),
+            truncate=True,
+        )
+
+    def _scans(self, path):
+        """Plan nodes of every scan in the plans serving `path`."""
+        db.session.expire_all()
+        with capture_queries() as queries:
+            resp = self.client.get(path)
+        assert resp.status_code == 200
+
+        db.session.execute(db.text("SET LOCAL enable_seqscan = off"))
+        db.session.execute(db.text("SET LOCAL enable_mergejoin = off"))
+        return [
+            node
+            for query in queries
+            for node in plan_nodes(explain(query))
+            if "Scan" in node["Node Type"]
+        ]
+
+    @pytest.mark.parametrize(
+        "path, indexes",
+        [
+            ("/products?sort=name", {"product_name_idx"}),
+            ("/products?sort=-created_at", {"product_created_at_idx"}),
+            ("/products?sort=updated_at", {"product_updated_at_idx"}),
+            (
+                "/products?include=subcategory_ids,category_ids",
+                {
+                    "product_pkey",
+                    "subcategory_product_product_id_idx",
+                    "category_subcategory_subcategory_id_idx",
+                },
+            ),
+            (
+                "/categories/1/products",
+                {"product_pkey", "subcategory_product_product_id_idx"},
+            ),
+            (
+                "/categories/1/products?sort=name",
+                {"product_name_idx", "subcategory_product_product_id_idx"},
+            ),
+            (
+                "/subcategories/1/products",
+                {"subcategory_product_pkey", "product_pkey"},
+            ),
+            (
+                f"/products/search?q={_PRODUCT_CODE}",
+                {"product_search_vector_idx", "product_name_vector_idx"},
+            ),
+            ("/products/changes", {"product_updated_at_idx"}),
+        ],
+    )
+    def test_plan_uses_indexes(self, path, indexes):
+        scans = self._scans(path)
+
+        assert not [scan for scan in scans if scan["Node Type"] == "Seq Scan"]
+        assert indexes <= {scan.get("Index Name") for scan in scans}
+        assert not [
+            scan
+            for scan in scans
+            if scan.get("Index Name") in self._LINK_TABLE_INDEXES
+            and "Index Cond" not in scan
+        ]
+
+    def test_search_by_product_code(self):
+        resp = self.client.get(
+            "/products/search", query_string={"q": self._PRODUCT_CODE}
+        )
+        assert [product["id"] for product in resp.get_json()["products"]] == [12345]
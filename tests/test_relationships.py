@@ -1,5 +1,8 @@
+from unittest.mock import patch
+
 import pytest
 
+from app import db
 from app.models import Category, Product, Subcategory
 
 
@@ -14,7 +17,10 @@ class TestRelationships:
     def _category_subcategory_ids(self, category_id):
         category = Category.query.get(category_id)
         assert category is not None
-        return sorted([subcategory.id for subcategory in category.subcategories])
+        return sorted(
+            subcategory.id
+            for subcategory in db.session.scalars(category.subcategories.select())
+        )
 
     def _subcategory_category_ids(self, subcategory_id):
         subcategory = Subcategory.query.get(subcategory_id)
@@ -24,7 +30,9 @@ class TestRelationships:
     def _subcategory_product_ids(self, subcategory_id):
         subcategory = Subcategory.query.get(subcategory_id)
         assert subcategory is not None
-        return sorted([product.id for product in subcategory.products])
+        return sorted(
+            product.id for product in db.session.scalars(subcategory.products.select())
+        )
 
     def _product_subcategory_ids(self, product_id):
         product = Product.query.get(product_id)
@@ -37,8 +45,8 @@ class TestRelationships:
         return sorted(
             {
                 product.id
-                for subcategory in category.subcategories
-                for product in subcategory.products.all()
+                for subcategory in db.session.scalars(category.subcategories.select())
+                for product in db.session.scalars(subcategory.products.select())
             }
         )
 
@@ -269,6 +277,243 @@ class TestRelationships:
             [subcategory1["id"], subcategory2["id"]]
         )
 
+    def test_update_category_ignores_linked_subcategories(
+        self, create_authenticated_headers, create_category, create_subcategory
+    ):
+        subcategory1 = create_subcategory("U_SC1").get_json()
+        subcategory2 = create_subcategory("U_SC2").get_json()
+        category = create_category(
+            "U_Cat", subcategories=[subcategory1["id"]]
+        ).get_json()
+
+        response = self.client.put(
+            f"/categories/{category['id']}",
+            query_string={"on_conflict": "ignore"},
+            json={
+                "name": "U_Cat2",
+                "subcategories": [subcategory1["id"], subcategory2["id"]],
+            },
+            headers=create_authenticated_headers(),
+        )
+
+        assert response.status_code == 200
+        assert response.get_json()["name"] == "U_Cat2"
+        assert self._category_subcategory_ids(category["id"]) == sorted(
+            [subcategory1["id"], subcategory2["id"]]
+        )
+
+    def test_update_subcategory_ignores_linked_categories_and_products(
+        self,
+        create_authenticated_headers,
+        create_category,
+        create_product,
+        create_subcategory,
+    ):
+        category1 = create_category("UC1").get_json()
+        category2 = create_category("UC2").get_json()
+        product1 = create_product("UP1").get_json()
+        product2 = create_product("UP2").get_json()
+        subcategory = create_subcategory(
+            "U_SC", categories=[category1["id"]], products=[product1["id"]]
+        ).get_json()
+
+        response = self.client.put(
+            f"/subcategories/{subcategory['id']}",
+            query_string={"on_conflict": "ignore"},
+            json={
+                "categories": [category1["id"], category2["id"]],
+                "products": [product1["id"], product2["id"]],
+            },
+            headers=create_authenticated_headers(),
+        )
+
+        assert response.status_code == 200
+        assert self._subcategory_category_ids(subcategory["id"]) == sorted(
+            [category1["id"], category2["id"]]
+        )
+        assert self._subcategory_product_ids(subcategory["id"]) == sorted(
+            [product1["id"], product2["id"]]
+        )
+
+    def test_update_product_ignores_linked_subcategories(
+        self, create_authenticated_headers, create_product, create_subcategory
+    ):
+        subcategory1 = create_subcategory("UPS1").get_json()
+        subcategory2 = create_subcategory("UPS2").get_json()
+        product = create_product(
+            "UP", "desc", subcategories=[subcategory1["id"]]
+        ).get_json()
+
+        response = self.client.put(
+            f"/products/{product['id']}",
+            query_string={"on_conflict": "ignore"},
+            json={"subcategories": [subcategory1["id"], subcategory2["id"]]},
+            headers=create_authenticated_headers(),
+        )
+
+        assert response.status_code == 200
+        assert self._product_subcategory_ids(product["id"]) == sorted(
+            [subcategory1["id"], subcategory2["id"]]
+        )
+
+    @pytest.mark.parametrize(
+        "path, payload",
+        [
+            ("categories", {"subcategories": [0]}),
+            ("subcategories", {"categories": [0]}),
+            ("subcategories", {"products": [0]}),
+            ("products", {"subcategories": [0]}),
+        ],
+    )
+    def test_update_ignore_conflicts_missing_links(
+        self,
+        create_authenticated_headers,
+        create_category,
+        create_product,
+        create_subcategory,
+        path,
+        payload,
+    ):
+        id = {
+            "categories": lambda: create_category("C"),
+            "subcategories": lambda: create_subcategory("SC"),
+            "products": lambda: create_product("P", "desc"),
+        }[path]().get_json()["id"]
+
+        response = self.client.put(
+            f"/{path}/{id}",
+            query_string={"on_conflict": "ignore"},
+            json=payload,
+            headers=create_authenticated_headers(),
+        )
+
+        assert response.status_code == 422
+
+    def test_update_ignore_conflicts_duplicate_name(
+        self, create_authenticated_headers, create_category, create_subcategory
+    ):
+        create_category("Taken")
+        subcategory = create_subcategory("SC").get_json()
+        category = create_category("Cat").get_json()
+
+        response = self.client.put(
+            f"/categories/{category['id']}",
+            query_string={"on_conflict": "ignore"},
+            json={"name": "Taken", "subcategories": [subcategory["id"]]},
+            headers=create_authenticated_headers(),
+        )
+
+        assert response.status_code == 409
+        assert self._category_subcategory_ids(category["id"]) == []
+
+    def test_update_category_replaces_subcategories(
+        self, create_authenticated_headers, create_category, create_subcategory
+    ):
+        sc_ids = [create_subcategory(f"R_SC{i}").get_json()["id"] for i in range(3)]
+        category = create_category("R_Cat", subcategories=sc_ids[:2]).get_json()
+
+        response = self.client.put(
+            f"/categories/{category['id']}",
+            query_string={"mode": "replace"},
+            json={"subcategories": sc_ids[1:]},
+            headers=create_authenticated_headers(),
+        )
+
+        assert response.status_code == 200
+        assert self._category_subcategory_ids(category["id"]) == sc_ids[1:]
+        # links of other categories are untouched
+        assert self._subcategory_category_ids(sc_ids[0]) == []
+
+    def test_update_subcategory_replaces_categories_and_products(
+        self,
+        create_authenticated_headers,
+        create_category,
+        create_product,
+        create_subcategory,
+    ):
+        c_ids = [create_category(f"RC{i}").get_json()["id"] for i in range(2)]
+        p_ids = [create_product(f"RP{i}", "desc").get_json()["id"] for i in range(2)]
+        other = create_subcategory("R_Other", products=p_ids).get_json()
+        subcategory = create_subcategory(
+            "R_SC", categories=c_ids[:1], products=p_ids[:1]
+        ).get_json()
+
+        response = self.client.put(
+            f"/subcategories/{subcategory['id']}",
+            query_string={"mode": "replace"},
+            json={"categories": c_ids[1:], "products": []},
+            headers=create_authenticated_headers(),
+        )
+
+        assert response.status_code == 200
+        assert self._subcategory_category_ids(subcategory["id"]) == c_ids[1:]
+        assert self._subcategory_product_ids(subcategory["id"]) == []
+        assert self._subcategory_product_ids(other["id"]) == p_ids
+
+    def test_update_product_replaces_subcategories(
+        self, create_authenticated_headers, create_product, create_subcategory
+    ):
+        sc_ids = [create_subcategory(f"R_SC{i}").get_json()["id"] for i in range(3)]
+        product = create_product("RP", "desc", subcategories=sc_ids[:2]).get_json()
+
+        response = self.client.put(
+            f"/products/{product['id']}",
+            query_string={"mode": "replace"},
+            json={"subcategories": [sc_ids[2], sc_ids[0], sc_ids[2]]},
+            headers=create_authenticated_headers(),
+        )
+
+        assert response.status_code == 200
+        assert self._product_subcategory_ids(product["id"]) == [sc_ids[0], sc_ids[2]]
+
+    def test_update_replace_keeps_links_not_in_payload(
+        self, create_authenticated_headers, create_product, create_subcategory
+    ):
+        subcategory = create_subcategory("R_SC").get_json()
+        product = create_product(
+            "RP", "desc", subcategories=[subcategory["id"]]
+        ).get_json()
+
+        response = self.client.put(
+            f"/products/{product['id']}",
+            query_string={"mode": "replace"},
+            json={"name": "RP2"},
+            headers=create_authenticated_headers(),
+        )
+
+        assert response.status_code == 200
+        assert self._product_subcategory_ids(product["id"]) == [subcategory["id"]]
+
+    def test_update_replace_missing_links(
+        self, create_authenticated_headers, create_product, create_subcategory
+    ):
+        subcategory = create_subcategory("R_SC").get_json()
+        product = create_product(
+            "RP", "desc", subcategories=[subcategory["id"]]
+        ).get_json()
+
+        response = self.client.put(
+            f"/products/{product['id']}",
+            query_string={"mode": "replace"},
+            json={"subcategories": [0]},
+            headers=create_authenticated_headers(),
+        )
+
+        assert response.status_code == 422
+        assert self._product_subcategory_ids(product["id"]) == [subcategory["id"]]
+
+    @pytest.mark.parametrize(
+        "query_string", [{"on_conflict": "overwrite"}, {"mode": "merge"}]
+    )
+    def test_update_invalid_link_args(self, create_authenticated_headers, query_string):
+        response = self.client.put(
+            "/categories/1",
+            query_string=query_string,
+            json={"name": "Cat"},
+            headers=create_authenticated_headers(),
+        )
+        assert response.status_code == 422
+
     def test_get_category_subcategories_empty(self, create_category):
         category = create_category("Cat_NoSC").get_json()
         resp = self.client.get(f"/categories/{category['id']}/subcategories")
@@ -288,6 +533,30 @@ class TestRelationships:
             resp, "subcategories", expected_ids=[subcategory1["id"], subcategory2["id"]]
         )
 
+    def test_get_category_subcategories_pagination_and_all(
+        self, create_category, create_subcategory
+    ):
+        subcategory_ids = [
+            create_subcategory(f"SC{i}").get_json()["id"] for i in range(4)
+        ]
+        category = create_category("Cat", subcategories=subcategory_ids).get_json()
+        path = f"/categories/{category['id']}/subcategories"
+
+        with patch("app.routes.category.CategorySubcategories._PER_PAGE", 3):
+            page1 = self.client.get(path).get_json()
+            page2 = self.client.get(
+                path, query_string={"cursor": page1["cursor"]["next"]}
+            ).get_json()
+            streamed = self.client.get(path, query_string={"all": "true"})
+
+        assert [sc["id"] for sc in page1["subcategories"]] == subcategory_ids[:3]
+        assert [sc["id"] for sc in page2["subcategories"]] == subcategory_ids[3:]
+        assert page2["cursor"]["next"] is None
+        assert streamed.is_streamed
+        self._assert_related_collection(
+            streamed, "subcategories", expected_ids=subcategory_ids
+        )
+
     def test_get_category_products_empty(self, create_category):
         category = create_category("Cat_NoProd").get_json()
         resp = self.client.get(f"/categories/{category['id']}/products")
@@ -326,6 +595,28 @@ class TestRelationships:
         )
         assert returned_product_ids == product_ids
 
+    @pytest.mark.parametrize(
+        "path_format", ["/categories/{c}/products", "/subcategories/{sc}/products"]
+    )
+    def test_get_products_within_sorted(
+        self, create_category, create_subcategory, create_product, path_format
+    ):
+        category = create_category("Cat_Sort").get_json()
+        subcategory = create_subcategory(
+            "SC_Sort", categories=[category["id"]]
+        ).get_json()
+        for index in range(12):
+            create_product(f"P{index:02}", "desc", subcategories=[subcategory["id"]])
+        path = path_format.format(c=category["id"], sc=subcategory["id"])
+
+        page1 = self.client.get(path, query_string={"sort": "-name"}).get_json()
+        page2 = self.client.get(
+            path, query_string={"sort": "-name", "cursor": page1["cursor"]["next"]}
+        ).get_json()
+
+        names = [p["name"] for p in page1["products"] + page2["products"]]
+        assert names == [f"P{index:02}" for index in reversed(range(12))]
+
     def test_get_subcategory_categories_empty(self, create_subcategory):
         subcategory = create_subcategory("SC_NoCat").get_json()
         resp = self.client.get(f"/subcategories/{subcategory['id']}/categories")
@@ -345,6 +636,28 @@ class TestRelationships:
             resp, "categories", expected_ids=[category1["id"], category2["id"]]
         )
 
+    def test_get_subcategory_categories_pagination_and_all(
+        self, create_category, create_subcategory
+    ):
+        category_ids = [create_category(f"C{i}").get_json()["id"] for i in range(4)]
+        subcategory = create_subcategory("SC", categories=category_ids).get_json()
+        path = f"/subcategories/{subcategory['id']}/categories"
+
+        with patch("app.routes.subcategory.SubcategoryCategories._PER_PAGE", 3):
+            page1 = self.client.get(path).get_json()
+            page2 = self.client.get(
+                path, query_string={"cursor": page1["cursor"]["next"]}
+            ).get_json()
+            streamed = self.client.get(path, query_string={"all": "true"})
+
+        assert [c["id"] for c in page1["categories"]] == category_ids[:3]
+        assert [c["id"] for c in page2["categories"]] == category_ids[3:]
+        assert page2["cursor"]["next"] is None
+        assert streamed.is_streamed
+        self._assert_related_collection(
+            streamed, "categories", expected_ids=category_ids
+        )
+
     def test_get_subcategory_products_empty(self, create_subcategory):
         subcategory = create_subcategory("SC_NoProd").get_json()
         resp = self.client.get(f"/subcategories/{subcategory['id']}/products")
@@ -382,6 +695,71 @@ class TestRelationships:
         )
         assert returned_product_ids == product_ids
 
+    def test_bulk_link_subcategory_products(
+        self, create_authenticated_headers, create_subcategory, create_product
+    ):
+        p_ids = [create_product(f"P{i}", "desc").get_json()["id"] for i in range(4)]
+        sc_id = create_subcategory("SC", products=p_ids[:1]).get_json()["id"]
+
+        resp = self.client.post(
+            f"/subcategories/{sc_id}/products",
+            json={"products": p_ids + p_ids[1:2]},
+            headers=create_authenticated_headers(),
+        )
+        assert resp.status_code == 200
+        assert resp.get_json() == {"inserted": 3, "skipped": 1}
+        assert self._subcategory_product_ids(sc_id) == sorted(p_ids)
+
+    def test_bulk_link_subcategory_products_missing_product(
+        self, create_authenticated_headers, create_subcategory, create_product
+    ):
+        p_id = create_product("P", "desc").get_json()["id"]
+        sc_id = create_subcategory("SC").get_json()["id"]
+
+        resp = self.client.post(
+            f"/subcategories/{sc_id}/products",
+            json={"products": [p_id, p_id + 1]},
+            headers=create_authenticated_headers(),
+        )
+        assert resp.status_code == 422
+        assert self._subcategory_product_ids(sc_id) == []
+
+    def test_bulk_unlink_subcategory_products(
+        self, create_authenticated_headers, create_subcategory, create_product
+    ):
+        p_ids = [create_product(f"P{i}", "desc").get_json()["id"] for i in range(3)]
+        sc_id = create_subcategory("SC", products=p_ids[:2]).get_json()["id"]
+
+        resp = self.client.delete(
+            f"/subcategories/{sc_id}/products",
+            json={"products": [p_ids[0], p_ids[2], p_ids[2] + 1]},
+            headers=create_authenticated_headers(),
+        )
+        assert resp.status_code == 200
+        assert resp.get_json() == {"deleted": 1, "skipped": 2}
+        assert self._subcategory_product_ids(sc_id) == [p_ids[1]]
+
+    @pytest.mark.parametrize("method", ["post", "delete"])
+    @pytest.mark.parametrize(
+        "payload, expected_code", [({"products": [1]}, 404), ({"products": []}, 422)]
+    )
+    def test_bulk_subcategory_products_errors(
+        self, create_authenticated_headers, method, payload, expected_code
+    ):
+        resp = getattr(self.client, method)(
+            "/subcategories/1/products",
+            json=payload,
+            headers=create_authenticated_headers(),
+        )
+        assert resp.status_code == expected_code
+
+    @pytest.mark.parametrize("method", ["post", "delete"])
+    def test_bulk_subcategory_products_requires_token(self, method):
+        resp = getattr(self.client, method)(
+            "/subcategories/1/products", json={"products": [1]}
+        )
+        assert resp.status_code == 401
+
     def test_get_product_subcategories_empty(self, create_product):
         product = create_product("Prod_NoSC", "desc").get_json()
         resp = self.client.get(f"/products/{product['id']}/subcategories")
@@ -401,6 +779,113 @@ class TestRelationships:
             resp, "subcategories", expected_ids=[subcategory1["id"], subcategory2["id"]]
         )
 
+    def _linked_products(self, create_category, create_subcategory, create_product):
+        category1 = create_category("C1").get_json()
+        category2 = create_category("C2").get_json()
+        subcategory1 = create_subcategory(
+            "S1", categories=[category1["id"], category2["id"]]
+        ).get_json()
+        subcategory2 = create_subcategory("S2", categories=[category1["id"]]).get_json()
+        subcategory3 = create_subcategory("S3").get_json()
+        linked = create_product(
+            "P1",
+            "desc",
+            subcategories=[subcategory2["id"], subcategory1["id"], subcategory3["id"]],
+        ).get_json()
+        unlinked = create_product("P2", "desc").get_json()
+
+        expected = {
+            linked["id"]: {
+                "subcategory_ids": sorted(
+                    [subcategory1["id"], subcategory2["id"], subcategory3["id"]]
+                ),
+                # C1 is linked through two subcategories, and listed once
+                "category_ids": sorted([category1["id"], category2["id"]]),
+            },
+            unlinked["id"]: {"subcategory_ids": [], "category_ids": []},
+        }
+        return expected, category1, subcategory1
+
+    def test_get_products_include_links(
+        self, create_category, create_subcategory, create_product
+    ):
+        expected, _, _ = self._linked_products(
+            create_category, create_subcategory, create_product
+        )
+
+        resp = self.client.get(
+            "/products", query_string={"include": "subcategory_ids,category_ids"}
+        )
+        assert resp.status_code == 200
+        products = resp.get_json()["products"]
+        assert {
+            p["id"]: {
+                "subcategory_ids": p["subcategory_ids"],
+                "category_ids": p["category_ids"],
+            }
+            for p in products
+        } == expected
+
+        resp = self.client.get("/products", query_string={"include": "category_ids"})
+        for product in resp.get_json()["products"]:
+            assert "subcategory_ids" not in product
+            assert product["category_ids"] == expected[product["id"]]["category_ids"]
+
+        resp = self.client.get("/products")
+        for product in resp.get_json()["products"]:
+            assert "subcategory_ids" not in product
+            assert "category_ids" not in product
+
+    def test_get_product_include_links(
+        self, create_category, create_subcategory, create_product
+    ):
+        expected, _, _ = self._linked_products(
+            create_category, create_subcategory, create_product
+        )
+
+        for id, links in expected.items():
+            resp = self.client.get(
+                f"/products/{id}",
+                query_string={"include": "subcategory_ids,category_ids"},
+            )
+            assert resp.status_code == 200
+            product = resp.get_json()
+            assert product["name"] in ("P1", "P2")
+            assert product["subcategory_ids"] == links["subcategory_ids"]
+            assert product["category_ids"] == links["category_ids"]
+
+            # the cached product is not changed by the include
+            assert (
+                "subcategory_ids" not in self.client.get(f"/products/{id}").get_json()
+            )
+
+    def test_get_products_within_include_links(
+        self, create_category, create_subcategory, create_product
+    ):
+        expected, category, subcategory = self._linked_products(
+            create_category, create_subcategory, create_product
+        )
+
+        for path in (
+            f"/categories/{category['id']}/products",
+            f"/subcategories/{subcategory['id']}/products",
+        ):
+            resp = self.client.get(path, query_string={"include": "subcategory_ids"})
+            assert resp.status_code == 200
+            products = resp.get_json()["products"]
+            assert len(products) == 1
+            assert (
+                products[0]["subcategory_ids"]
+                == expected[products[0]["id"]]["subcategory_ids"]
+            )
+
+    @pytest.mark.parametrize("include", ["subcategories", "subcategory_ids,foo"])
+    def test_include_invalid(self, create_product, include):
+        product = create_product("P", "desc").get_json()
+        for path in ("/products", f"/products/{product['id']}"):
+            resp = self.client.get(path, query_string={"include": include})
+            assert resp.status_code == 422
+
     @pytest.mark.parametrize(
         "path",
         [
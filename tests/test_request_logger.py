@@ -180,6 +180,35 @@ class TestDataScrubber:
 
         assert current_result["nested"] == "<too deeply nested>"
 
+    def test_scrub_parameters(self):
+        """Test that SQL parameters named after sensitive columns are redacted."""
+        result = DataScrubber.scrub_parameters(
+            {
+                "email_normalized_1": "john@example.com",
+                "password_hash": "scrypt:...",
+                "refresh_token_1": "abc",
+                "author_id": 1,
+            }
+        )
+
+        assert json.loads(result) == {
+            "email_normalized_1": "john@example.com",
+            "password_hash": "[redacted]",
+            "refresh_token_1": "[redacted]",
+            "author_id": 1,
+        }
+
+    def test_scrub_parameters_positional_and_executemany(self):
+        """Test that positional parameters are redacted and executemany is scrubbed."""
+        assert json.loads(DataScrubber.scrub_parameters(("a", 1))) == [
+            "[redacted]",
+            "[redacted]",
+        ]
+        assert json.loads(
+            DataScrubber.scrub_parameters([{"token": "a"}, {"token": "b", "id": 2}])
+        ) == [{"token": "[redacted]"}, {"token": "[redacted]", "id": 2}]
+        assert DataScrubber.scrub_parameters({}) == "{}"
+
 
 class TestRequestLogger:
     """Test the RequestLogger middleware for request/response logging."""
@@ -464,3 +493,16 @@ class TestRequestLoggerIntegration:
             # Check second request timing
             second_call = mock_info.call_args_list[1]
             assert second_call[1]["extra"]["http.duration_ms"] == 150.0
+
+    def test_request_id(self):
+        """Test that requests get an id, or keep the one sent in X-Request-ID."""
+        with patch.object(self.app.logger, "info") as mock_info:
+            self.client.get("/health", headers={"X-Request-ID": "abc-123"})
+            assert mock_info.call_args[1]["extra"]["http.request_id"] == "abc-123"
+
+            self.client.get("/health", headers={"X-Request-ID": "x" * 65})
+            generated = mock_info.call_args[1]["extra"]["http.request_id"]
+            assert len(generated) == 32
+
+            self.client.get("/health")
+            assert mock_info.call_args[1]["extra"]["http.request_id"] != generated
@@ -0,0 +1,172 @@
+import time
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import select
+
+from app import db
+from app.models import SearchLog
+from app.search_analytics import SearchAnalytics
+
+
+class TestSearchAnalytics:
+    @pytest.fixture(autouse=True)
+    def setup(self, app, client):
+        self.client = client
+        self.analytics = app.extensions["search_analytics"]
+
+        # searches from earlier tests may still be pending
+        self.analytics.flush()
+        SearchLog.query.delete()
+        db.session.commit()
+
+        # the default user of create_authenticated_headers
+        with patch.dict(app.extensions, {"admin_emails": {"testuser@example.com"}}):
+            yield
+
+    def _search(self, q, **kwargs):
+        resp = self.client.get("/products/search", query_string={"q": q, **kwargs})
+        assert resp.status_code == 200
+        return resp.get_json()
+
+    def _analytics(self, headers, **query_string):
+        self.analytics.flush()
+        return self.client.get(
+            "/products/search/analytics", query_string=query_string, headers=headers
+        )
+
+    def test_normalize_query(self):
+        assert SearchAnalytics.normalize_query("  iPhone   13\tPro ") == "iphone 13 pro"
+        assert len(SearchAnalytics.normalize_query("a" * 500)) == 200
+
+    @pytest.mark.parametrize(
+        "result_count, expected", [(0, "0"), (1, "1-9"), (9, "1-9"), (10, "10+")]
+    )
+    def test_result_bucket(self, result_count, expected):
+        assert SearchAnalytics.result_bucket(result_count, 10) == expected
+
+    def test_search_is_recorded(self, create_product):
+        create_product("iPhone 13", "Latest Apple iPhone")
+
+        self._search("  IPHONE ")
+        self.analytics.flush()
+
+        log = SearchLog.query.one()
+        assert log.normalized_query == "iphone"
+        assert log.result_bucket == "1-9"
+        assert log.latency_ms >= 0
+        assert log.created_at is not None
+
+    def test_search_time_is_recorded(self):
+        before = datetime.now(timezone.utc)
+        self._search("iPhone")
+        after = datetime.now(timezone.utc)
+        time.sleep(0.05)
+        self.analytics.flush()
+
+        # not the time of the flush
+        assert before <= SearchLog.query.one().created_at <= after
+
+    def test_old_events_are_pruned_on_flush(self):
+        db.session.add_all(
+            [
+                SearchLog(
+                    normalized_query="old",
+                    result_bucket="0",
+                    latency_ms=1,
+                    created_at=datetime.now(timezone.utc) - timedelta(days=91),
+                ),
+                SearchLog(
+                    normalized_query="recent",
+                    result_bucket="0",
+                    latency_ms=1,
+                    created_at=datetime.now(timezone.utc) - timedelta(days=89),
+                ),
+            ]
+        )
+        db.session.commit()
+
+        self._search("new")
+        self.analytics.flush()
+
+        queries = db.session.scalars(select(SearchLog.normalized_query)).all()
+        assert sorted(queries) == ["new", "recent"]
+
+    def test_only_first_page_is_recorded(self, create_product):
+        for i in range(15):
+            create_product(f"iPhone {i}", f"Description {i}")
+
+        data = self._search("iPhone")
+        self._search("iPhone", cursor=data["cursor"]["next"])
+        self.analytics.flush()
+
+        assert SearchLog.query.count() == 1
+        assert SearchLog.query.one().result_bucket == "10+"
+
+    def test_pending_events_are_bounded(self):
+        with (
+            patch.object(self.analytics, "max_pending", 2),
+            patch.object(self.analytics, "dropped", 0),
+        ):
+            for _ in range(3):
+                self._search("iPhone")
+
+            assert self.analytics.dropped == 1
+
+        self.analytics.flush()
+        assert SearchLog.query.count() == 2
+
+    def test_full_batch_is_flushed_in_background(self):
+        with patch.object(self.analytics, "batch_size", 1):
+            self._search("iPhone")
+
+            for _ in range(50):
+                if SearchLog.query.count():
+                    break
+                time.sleep(0.1)
+
+        assert SearchLog.query.count() == 1
+
+    def test_search_analytics_hot_and_zero_result_queries(
+        self, create_authenticated_headers, create_product
+    ):
+        create_product("iPhone 13", "Latest Apple iPhone")
+        for _ in range(3):
+            self._search("iPhone")
+        self._search("Apple")
+        self._search("Nonexistent")
+        self._search("nonexistent")
+
+        resp = self._analytics(create_authenticated_headers())
+        assert resp.status_code == 200
+        data = resp.get_json()
+
+        assert [(q["query"], q["count"]) for q in data["hot"]] == [
+            ("iphone", 3),
+            ("nonexistent", 2),
+            ("apple", 1),
+        ]
+        assert [(q["query"], q["count"]) for q in data["zero_results"]] == [
+            ("nonexistent", 2)
+        ]
+        assert data["hot"][0]["p95_latency_ms"] >= 0
+
+    def test_search_analytics_limit(self, create_authenticated_headers):
+        for q in ("a", "b", "b", "c"):
+            self._search(q)
+
+        resp = self._analytics(create_authenticated_headers(), limit=1)
+        assert resp.status_code == 200
+        assert [q["query"] for q in resp.get_json()["hot"]] == ["b"]
+
+    def test_search_analytics_requires_token(self):
+        resp = self._analytics(None)
+        assert resp.status_code == 401
+
+    def test_search_analytics_requires_admin(self, create_authenticated_headers):
+        headers = create_authenticated_headers("shopper@example.com", "password")
+
+        resp = self._analytics(headers)
+        assert resp.status_code == 403
+        assert resp.get_json()["message"] == "Admin access required"
@@ -0,0 +1,48 @@
+import pytest
+
+from app import db
+from app.models import Category, Product, Subcategory
+from app.schemas import CategoryOut, ProductOut, SubcategoryOut
+from app.serializers import CATEGORY_ROWS, PRODUCT_ROWS, SUBCATEGORY_ROWS
+
+
+class TestRowSerializer:
+    @pytest.fixture(autouse=True)
+    def setup(self, client):
+        self.client = client
+
+    @pytest.mark.parametrize(
+        "model, schema, serialize",
+        [
+            (Category, CategoryOut(), CATEGORY_ROWS),
+            (Subcategory, SubcategoryOut(), SUBCATEGORY_ROWS),
+            (Product, ProductOut(), PRODUCT_ROWS),
+        ],
+    )
+    def test_row_dumps_like_schema(
+        self,
+        create_category,
+        create_subcategory,
+        create_product,
+        model,
+        schema,
+        serialize,
+    ):
+        create = {
+            Category: lambda: create_category("Name"),
+            Subcategory: lambda: create_subcategory("Name"),
+            Product: lambda: create_product("Name", "desc"),
+        }[model]
+        id = create().get_json()["id"]
+
+        row = db.session.execute(serialize.select().where(model.id == id)).one()
+        assert serialize(row) == schema.dump(db.session.get(model, id))
+
+    def test_null_values(self, create_product):
+        id = create_product("Name", None).get_json()["id"]
+
+        row = db.session.execute(PRODUCT_ROWS.select().where(Product.id == id)).one()
+        assert PRODUCT_ROWS(row)["description"] is None
+
+    def test_search_vector_is_not_selected(self):
+        assert "search_vector" not in [column.key for column in PRODUCT_ROWS.columns]
@@ -0,0 +1,139 @@
+import sys
+from unittest.mock import patch
+
+import pytest
+
+from app.middleware.slow_query_logger import SlowQueryLogger
+
+
+class TestSlowQueryLogger:
+    @pytest.fixture(autouse=True)
+    def setup(self, app, client, create_product):
+        self.app = app
+        self.client = client
+        self.slow_query_logger = app.extensions["slow_query_logger"]
+
+        create_product("iPhone 13", "Latest Apple iPhone")
+
+    def _get_products(self, **patches):
+        with (
+            patch.multiple(self.slow_query_logger, threshold_ms=0, **patches),
+            patch.object(self.app.logger, "warning") as mock_warning,
+            patch.object(self.app.logger, "info") as mock_info,
+        ):
+            resp = self.client.get("/products", headers={"X-Request-ID": "req-1"})
+            assert resp.status_code == 200
+
+            if self.slow_query_logger._executor is not None:
+                # one worker, so this runs after the EXPLAIN submitted before it
+                self.slow_query_logger._executor.submit(lambda: None).result()
+
+        slow_queries = [
+            call.kwargs["extra"]
+            for call in mock_warning.call_args_list
+            if "db.statement" in call.kwargs["extra"]
+        ]
+        return slow_queries, mock_info
+
+    @staticmethod
+    def _request_log(mock_info):
+        return next(
+            call.kwargs["extra"]
+            for call in mock_info.call_args_list
+            if "http.status_code" in call.kwargs["extra"]
+        )
+
+    def test_normalize_statement(self):
+        statement = "SELECT *\n    FROM product\n  WHERE id = %(id_1)s "
+        assert (
+            SlowQueryLogger.normalize_statement(statement)
+            == "SELECT * FROM product WHERE id = %(id_1)s"
+        )
+        assert len(SlowQueryLogger.normalize_statement("x " * 5000)) == 2000
+
+    @pytest.mark.parametrize(
+        "statement, explainable",
+        [
+            ("SELECT * FROM product", True),
+            ("  select * FROM product", True),
+            ("WITH a AS (SELECT 1) SELECT * FROM a", False),
+            ("WITH a AS (DELETE FROM product RETURNING id) SELECT * FROM a", False),
+            ("SELECT * FROM product WHERE id = 1 FOR UPDATE", False),
+            ("SELECT * FROM product FOR\\nSHARE", False),
+            ("SELECT * FROM product FOR NO KEY UPDATE", False),
+            ("SELECT * FROM product FOR KEY SHARE", False),
+            ("UPDATE product SET name = 'a'", False),
+            ("INSERT INTO product (name) VALUES ('a')", False),
+        ],
+    )
+    def test_explainable(self, statement, explainable):
+        statement = statement.replace("\\n", "\n")
+        assert bool(SlowQueryLogger._EXPLAINABLE.match(statement)) is explainable
+
+    def test_slow_queries_are_logged_with_request(self):
+        slow_queries, mock_info = self._get_products()
+
+        assert slow_queries
+        query = slow_queries[0]
+        assert query["db.statement"].startswith("SELECT")
+        assert "\n" not in query["db.statement"]
+        assert query["db.duration_ms"] >= 0
+        assert query["http.route"] == "/products/"
+        assert query["http.method"] == "GET"
+        assert {q["http.request_id"] for q in slow_queries} == {"req-1"}
+
+        request_log = self._request_log(mock_info)
+        assert request_log["http.request_id"] == "req-1"
+        assert request_log["db.slow_queries"] == len(slow_queries)
+
+    def test_fast_queries_are_not_logged(self):
+        with (
+            patch.object(self.app.logger, "warning") as mock_warning,
+            patch.object(self.app.logger, "info") as mock_info,
+        ):
+            self.client.get("/products")
+
+        assert not mock_warning.called
+        assert self._request_log(mock_info)["db.slow_queries"] == 0
+
+    def test_explain_analyze_sample(self):
+        slow_queries, mock_info = self._get_products(explain_rate=1.0)
+
+        plans = [
+            call.kwargs["extra"]
+            for call in mock_info.call_args_list
+            if "db.plan" in call.kwargs["extra"]
+        ]
+        assert plans
+        assert "Execution Time" in plans[0]["db.plan"]
+        assert plans[0]["http.request_id"] == "req-1"
+        # the EXPLAIN itself is not logged as a slow query
+        assert not [q for q in slow_queries if "EXPLAIN" in q["db.statement"]]
+
+    def test_explains_beyond_max_pending_are_dropped(self):
+        dropped = self.slow_query_logger.explains_dropped
+        slow_queries, mock_info = self._get_products(
+            explain_rate=1.0, explain_max_pending=0
+        )
+
+        assert slow_queries
+        assert not [
+            call
+            for call in mock_info.call_args_list
+            if "db.plan" in call.kwargs["extra"]
+        ]
+        assert self.slow_query_logger.explains_dropped - dropped == len(slow_queries)
+        assert self.slow_query_logger._explains_pending == 0
+
+    def test_explain_runs_read_only(self):
+        errors = []
+        with patch.object(
+            self.app.logger,
+            "exception",
+            side_effect=lambda *args: errors.append(sys.exc_info()[1]),
+        ):
+            self.slow_query_logger._explain_analyze(
+                "SELECT nextval(pg_get_serial_sequence('product', 'id'))", {}, {}
+            )
+
+        assert "read-only transaction" in str(errors[0])
@@ -1,4 +1,5 @@
 import time
+from unittest.mock import patch
 
 import pytest
 
@@ -89,6 +90,56 @@ class TestSubcategory:
         assert "A" in names
         assert "B" in names
 
+    def test_get_all_subcategories_pagination(self, create_subcategory):
+        for i in range(5):
+            create_subcategory(f"Subcategory{i}")
+
+        with patch("app.routes.subcategory.SubcategoryCollection._PER_PAGE", 3):
+            resp1 = self.client.get("/subcategories")
+            assert resp1.status_code == 200
+            data1 = resp1.get_json()
+            assert len(data1["subcategories"]) == 3
+            assert data1["cursor"]["prev"] is None
+            assert isinstance(data1["cursor"]["next"], str)
+
+            resp2 = self.client.get(
+                "/subcategories", query_string={"cursor": data1["cursor"]["next"]}
+            )
+            assert resp2.status_code == 200
+            data2 = resp2.get_json()
+            assert len(data2["subcategories"]) == 2
+            assert data2["cursor"]["next"] is None
+
+        names = [c["name"] for c in data1["subcategories"] + data2["subcategories"]]
+        assert names == [f"Subcategory{i}" for i in range(5)]
+
+    def test_get_all_subcategories_streamed(self, create_subcategory):
+        for i in range(5):
+            create_subcategory(f"Subcategory{i}")
+
+        with patch("app.routes.subcategory.SubcategoryCollection._PER_PAGE", 3):
+            resp = self.client.get("/subcategories", query_string={"all": "true"})
+
+        assert resp.status_code == 200
+        assert resp.is_streamed
+        assert resp.content_type == "application/json"
+        data = resp.get_json()
+        assert "cursor" not in data
+        assert [c["name"] for c in data["subcategories"]] == [
+            f"Subcategory{i}" for i in range(5)
+        ]
+        assert set(data["subcategories"][0]) == {
+            "id",
+            "name",
+            "created_at",
+            "updated_at",
+        }
+
+    def test_get_all_subcategories_streamed_empty(self):
+        resp = self.client.get("/subcategories", query_string={"all": "true"})
+        assert resp.status_code == 200
+        assert resp.get_json() == {"subcategories": []}
+
     def test_update_subcategory(self, create_authenticated_headers, create_subcategory):
         response = create_subcategory("OldSubcat")
         data = response.get_json()
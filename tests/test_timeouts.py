@@ -0,0 +1,154 @@
+import time
+from unittest.mock import patch
+
+import pytest
+from flask import make_response
+from sqlalchemy import text
+
+from app import db
+from app.models import Category, IdempotencyKey
+from app.routes.product import ProductSearch
+from tests.utils import capture_queries
+
+
+class TestRequestTimeouts:
+    @pytest.fixture(autouse=True)
+    def setup(self, app, client):
+        self.app = app
+        self.client = client
+        self.timeouts = app.extensions["request_timeouts"]
+        # requests share the test app context, start them without an open transaction
+        db.session.rollback()
+
+    def _search(self, before_search, headers=None):
+        """GET /products/search, running `before_search()` in the request first."""
+
+        def search_config(lang):
+            before_search()
+            return "english"
+
+        with patch.object(ProductSearch, "_search_config", staticmethod(search_config)):
+            return self.client.get("/products/search?q=phone", headers=headers)
+
+    @staticmethod
+    def _sleep(seconds):
+        return lambda: db.session.execute(text(f"SELECT pg_sleep({seconds})"))
+
+    def test_statement_timeout_of_endpoint(self):
+        timeouts = []
+        resp = self._search(
+            lambda: timeouts.append(
+                db.session.scalar(text("SELECT current_setting('statement_timeout')"))
+            )
+        )
+
+        assert resp.status_code == 200
+        assert timeouts == ["3s"]
+
+    def test_statement_timeout_is_cut_to_deadline(self):
+        timeouts = []
+        resp = self._search(
+            lambda: timeouts.append(
+                db.session.scalar(text("SELECT current_setting('statement_timeout')"))
+            ),
+            headers={"X-Request-Timeout": "0.5"},
+        )
+
+        assert resp.status_code == 200
+        assert 0 < int(timeouts[0].removesuffix("ms")) <= 500
+
+    def test_statement_timeout_answers_503(self):
+        with patch.dict(
+            self.timeouts.statement_timeouts, {"Product.ProductSearch": 0.1}
+        ):
+            resp = self._search(self._sleep(2))
+
+        assert resp.status_code == 503
+        assert resp.headers["Retry-After"] == "5"
+        assert resp.get_json()["message"].startswith("Request took too long")
+
+    def test_deadline_answers_504(self):
+        resp = self._search(self._sleep(2), headers={"X-Request-Timeout": "0.1"})
+
+        assert resp.status_code == 504
+        assert resp.get_json()["message"] == "Request deadline exceeded"
+
+    def test_statements_after_deadline_are_not_sent(self):
+        def slow_then_query():
+            time.sleep(0.1)
+            db.session.execute(text("SELECT 'after deadline'"))
+
+        with capture_queries() as queries:
+            resp = self._search(slow_then_query, headers={"X-Request-Timeout": "0.05"})
+
+        assert resp.status_code == 504
+        assert not [q for q in queries if "after deadline" in q.statement]
+
+    @pytest.mark.parametrize(
+        "header, expected",
+        [
+            (None, 30),
+            ("2.5", 2.5),
+            ("300", 30),
+            ("0", 30),
+            ("-1", 30),
+            ("soon", 30),
+        ],
+    )
+    def test_client_can_only_shorten_deadline(self, header, expected):
+        headers = {"X-Request-Timeout": header} if header is not None else {}
+        with self.app.test_request_context(headers=headers):
+            assert self.timeouts._timeout() == expected
+
+    def test_statements_outside_requests_have_no_timeout(self):
+        db.session.execute(text("SELECT 1"))
+        assert (
+            db.session.scalar(text("SELECT current_setting('statement_timeout')"))
+            == "0"
+        )
+
+    def _post_category(self, headers, timeout=None):
+        headers = {**headers, "Idempotency-Key": "key-1"}
+        if timeout is not None:
+            headers["X-Request-Timeout"] = timeout
+        return self.client.post("/categories", json={"name": "Name"}, headers=headers)
+
+    def test_idempotency_key_is_released_after_deadline(
+        self, create_authenticated_headers
+    ):
+        headers = create_authenticated_headers()
+        db.session.rollback()
+
+        def slow_category(**kwargs):
+            time.sleep(0.1)
+            return Category(**kwargs)
+
+        with patch("app.routes.category.Category", side_effect=slow_category):
+            resp = self._post_category(headers, timeout="0.05")
+        assert resp.status_code == 504
+        assert IdempotencyKey.query.count() == 0
+
+        db.session.rollback()
+        resp = self._post_category(headers)
+        assert resp.status_code == 201
+        assert "Idempotent-Replayed" not in resp.headers
+
+    def test_idempotent_response_is_stored_after_deadline(
+        self, create_authenticated_headers
+    ):
+        headers = create_authenticated_headers()
+        db.session.rollback()
+
+        def slow_make_response(rv):
+            response = make_response(rv)
+            time.sleep(0.1)
+            return response
+
+        with patch("app.idempotency.make_response", side_effect=slow_make_response):
+            resp1 = self._post_category(headers, timeout="0.05")
+        assert resp1.status_code == 201
+
+        db.session.rollback()
+        resp2 = self._post_category(headers)
+        assert resp2.headers["Idempotent-Replayed"] == "true"
+        assert Category.query.count() == 1
@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app import db
+from app.models import Tombstone
+
+
+class TestTombstones:
+    @pytest.fixture(autouse=True)
+    def setup(self, client, create_authenticated_headers):
+        self.client = client
+        self.headers = create_authenticated_headers()
+
+    def _create(self, entity_type, create_category, create_subcategory, create_product):
+        create = {
+            "categories": create_category,
+            "subcategories": create_subcategory,
+            "products": create_product,
+        }[entity_type]
+        args = ("Name", "desc") if entity_type == "products" else ("Name",)
+        return create(*args).get_json()["id"]
+
+    @pytest.mark.parametrize(
+        "path, entity_type",
+        [
+            ("categories", "category"),
+            ("subcategories", "subcategory"),
+            ("products", "product"),
+        ],
+    )
+    def test_delete_records_tombstone(
+        self,
+        create_category,
+        create_subcategory,
+        create_product,
+        path,
+        entity_type,
+    ):
+        id = self._create(path, create_category, create_subcategory, create_product)
+
+        resp = self.client.delete(f"/{path}/{id}", headers=self.headers)
+        assert resp.status_code == 204
+
+        tombstone = Tombstone.query.one()
+        assert (tombstone.entity_type, tombstone.entity_id) == (entity_type, id)
+        assert tombstone.deleted_at is not None
+
+    def test_failed_delete_records_no_tombstone(self):
+        resp = self.client.delete("/products/1", headers=self.headers)
+        assert resp.status_code == 404
+        assert Tombstone.query.count() == 0
+
+    def test_expired_tombstones_are_pruned(self, create_product):
+        old = datetime.now(timezone.utc) - timedelta(days=31)
+        db.session.add_all(
+            [
+                Tombstone(entity_type="product", entity_id=-1, deleted_at=old),
+                Tombstone(entity_type="category", entity_id=-1, deleted_at=old),
+            ]
+        )
+        db.session.commit()
+
+        id = create_product("Name", "desc").get_json()["id"]
+        self.client.delete(f"/products/{id}", headers=self.headers)
+
+        # only the type that was deleted is pruned
+        tombstones = db.session.execute(
+            db.select(Tombstone.entity_type, Tombstone.entity_id).order_by(
+                Tombstone.entity_type
+            )
+        ).all()
+        assert tombstones == [("category", -1), ("product", id)]
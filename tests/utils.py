@@ -1,6 +1,12 @@
+import threading
+from contextlib import contextmanager
 from datetime import datetime, timedelta
+from typing import Any, NamedTuple
 
 from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+
+from app import db
 
 
 def verify_token_error_response(response, expected_code, status_code=401):
@@ -27,3 +33,45 @@ def parse_api_datetime(value: str):
     if value.endswith("Z"):
         value = value[:-1] + "+00:00"
     return datetime.fromisoformat(value)
+
+
+class CapturedQuery(NamedTuple):
+    statement: str
+    parameters: Any
+
+
+@contextmanager
+def capture_queries():
+    """CapturedQuery of every statement the current thread executes inside the block.
+
+    Statements of background threads, like the search analytics writer, are left out.
+    """
+    queries = []
+    thread = threading.get_ident()
+
+    def before_cursor_execute(conn, cursor, statement, parameters, *args):
+        if threading.get_ident() == thread:
+            queries.append(CapturedQuery(statement, parameters))
+
+    event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield queries
+    finally:
+        event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+
+
+def explain(query):
+    """Top plan node of EXPLAIN (FORMAT JSON) for a CapturedQuery."""
+    plan = (
+        db.session.connection()
+        .exec_driver_sql(f"EXPLAIN (FORMAT JSON) {query.statement}", query.parameters)
+        .scalar()
+    )
+    return plan[0]["Plan"]
+
+
+def plan_nodes(plan):
+    """Every node of an explain() plan, depth first."""
+    yield plan
+    for child in plan.get("Plans", ()):
+        yield from plan_nodes(child)